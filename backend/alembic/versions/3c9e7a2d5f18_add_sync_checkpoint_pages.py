@@ -0,0 +1,38 @@
+"""Add sync checkpoint pages
+
+Revision ID: 3c9e7a2d5f18
+Revises: d6c2f9a4b7e1
+Create Date: 2026-10-19 17:20:41.603512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e7a2d5f18'
+down_revision: Union[str, Sequence[str], None] = 'd6c2f9a4b7e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('synccheckpoint', sa.Column('next_offset', sa.Integer(), nullable=False, server_default='0'))
+    op.create_table('synccheckpointpage',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('offset', sa.Integer(), nullable=False),
+    sa.Column('songs', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.ForeignKeyConstraint(['run_id'], ['syncrun.id'], ),
+    sa.PrimaryKeyConstraint('run_id', 'position', 'offset')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('synccheckpointpage')
+    op.drop_column('synccheckpoint', 'next_offset')
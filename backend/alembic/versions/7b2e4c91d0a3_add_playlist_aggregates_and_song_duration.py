@@ -0,0 +1,45 @@
+"""Add playlist aggregates and song duration
+
+Revision ID: 7b2e4c91d0a3
+Revises: ab5abdcff5ee
+Create Date: 2026-10-19 09:12:04.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4c91d0a3'
+down_revision: Union[str, Sequence[str], None] = 'ab5abdcff5ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('song', sa.Column('duration', sa.Integer(), nullable=True))
+    op.add_column('playlist', sa.Column('song_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('playlist', sa.Column('total_duration', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('playlist', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill song_count from the existing links; durations are filled in by the next sync
+    op.execute(
+        """
+        UPDATE playlist SET song_count = (
+            SELECT COUNT(*) FROM playlistsonglink
+            WHERE playlistsonglink.playlist_id = playlist.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('playlist', 'version')
+    op.drop_column('playlist', 'total_duration')
+    op.drop_column('playlist', 'song_count')
+    op.drop_column('song', 'duration')
@@ -0,0 +1,67 @@
+"""Add song isrc, import jobs and track matches
+
+Revision ID: a8d3f61c2e94
+Revises: f5b9e1a7c3d2
+Create Date: 2026-10-19 14:05:12.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f61c2e94'
+down_revision: Union[str, Sequence[str], None] = 'f5b9e1a7c3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('song', sa.Column('isrc', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_song_isrc'), 'song', ['isrc'], unique=False)
+    op.create_table('trackmatch',
+    sa.Column('artist_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('title_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('duration_bucket', sa.Integer(), nullable=False),
+    sa.Column('tidal_id', sa.Integer(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('artist_key', 'title_key', 'duration_bucket')
+    )
+    op.create_table('importjob',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('playlist_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('format', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('push_to_tidal', sa.Boolean(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('matched', sa.Integer(), nullable=False),
+    sa.Column('unmatched', sa.Integer(), nullable=False),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('searches', sa.Integer(), nullable=False),
+    sa.Column('cache_hits', sa.Integer(), nullable=False),
+    sa.Column('pushed', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['playlist_id'], ['playlist.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_importjob_user_id'), 'importjob', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_importjob_user_id'), table_name='importjob')
+    op.drop_table('importjob')
+    op.drop_table('trackmatch')
+    op.drop_index(op.f('ix_song_isrc'), table_name='song')
+    op.drop_column('song', 'isrc')
@@ -0,0 +1,29 @@
+"""Add song refreshed_at
+
+Revision ID: c4d81f6a2b19
+Revises: 7b2e4c91d0a3
+Create Date: 2026-10-19 14:37:52.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d81f6a2b19'
+down_revision: Union[str, Sequence[str], None] = '7b2e4c91d0a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('song', sa.Column('refreshed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('song', 'refreshed_at')
@@ -0,0 +1,71 @@
+"""Add song dedup key and playlist user index
+
+Revision ID: d6c2f9a4b7e1
+Revises: a8d3f61c2e94
+Create Date: 2026-10-19 16:42:37.114205
+
+"""
+import re
+import unicodedata
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6c2f9a4b7e1'
+down_revision: Union[str, Sequence[str], None] = 'a8d3f61c2e94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The song normalization of app.services.match_cache as of this revision,
+# copied so the backfill does not change when the app's does
+_BRACKETS = re.compile(r"[(\[][^)\]]*[)\]]")
+_FEATURING = re.compile(r"\s(?:feat\.?|ft\.?|featuring)\s.*$")
+_NON_WORD = re.compile(r"[\W_]+")
+_ARTIST_SEPARATORS = re.compile(r"\s*[,;/]\s*")
+
+
+def _normalize(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _FEATURING.sub("", _BRACKETS.sub(" ", text))
+    text = text.replace("&", " and ")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _dedup_key(artist: Optional[str], title: Optional[str]) -> Optional[str]:
+    artist = _normalize(_ARTIST_SEPARATORS.split((artist or "").strip())[0])
+    title = _normalize(title)
+    return f"{artist}|{title}" if artist and title else None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('song', sa.Column('dedup_key', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index(op.f('ix_song_dedup_key'), 'song', ['dedup_key'], unique=False)
+    op.create_index(op.f('ix_playlist_user_id'), 'playlist', ['user_id'], unique=False)
+
+    # Backfill the keys of existing songs; the normalization lives in Python
+    bind = op.get_bind()
+    song = sa.table('song', sa.column('id', sa.Integer), sa.column('title'), sa.column('artist'), sa.column('dedup_key'))
+    rows = bind.execute(sa.select(song.c.id, song.c.artist, song.c.title)).all()
+    params = [
+        {'song_id': song_id, 'dedup_key': _dedup_key(artist, title)}
+        for song_id, artist, title in rows
+    ]
+    if params:
+        bind.execute(
+            song.update().where(song.c.id == sa.bindparam('song_id')).values(dedup_key=sa.bindparam('dedup_key')),
+            params,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_playlist_user_id'), table_name='playlist')
+    op.drop_index(op.f('ix_song_dedup_key'), table_name='song')
+    op.drop_column('song', 'dedup_key')
@@ -0,0 +1,31 @@
+"""Add song checked_at
+
+Revision ID: e2a7c5d3f8b6
+Revises: c4d81f6a2b19
+Create Date: 2026-10-19 16:05:21.447390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c5d3f8b6'
+down_revision: Union[str, Sequence[str], None] = 'c4d81f6a2b19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('song', sa.Column('checked_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_song_checked_at'), 'song', ['checked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_song_checked_at'), table_name='song')
+    op.drop_column('song', 'checked_at')
@@ -0,0 +1,54 @@
+"""Add sync runs and checkpoints
+
+Revision ID: f5b9e1a7c3d2
+Revises: e2a7c5d3f8b6
+Create Date: 2026-10-19 18:22:40.118602
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5b9e1a7c3d2'
+down_revision: Union[str, Sequence[str], None] = 'e2a7c5d3f8b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('syncrun',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('sync_type', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_syncrun_user_id'), 'syncrun', ['user_id'], unique=False)
+    op.create_table('synccheckpoint',
+    sa.Column('run_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('tidal_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('description', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('applied', sa.Boolean(), nullable=False),
+    sa.Column('changed', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['run_id'], ['syncrun.id'], ),
+    sa.PrimaryKeyConstraint('run_id', 'position')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('synccheckpoint')
+    op.drop_index(op.f('ix_syncrun_user_id'), table_name='syncrun')
+    op.drop_table('syncrun')
@@ -1,29 +1,131 @@
+import hashlib
+import math
+import time
+from contextlib import contextmanager
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
+from sqlalchemy import event
 from sqlmodel import Session
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.db import get_session
+from app.core.db import engine, get_session
 from app.models.user import User
+from app.services.tidal_resilience import TidalAuthError, TidalError
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+# Verified token subjects keyed by token hash, so repeated requests with the same
+# bearer token skip signature verification. Entries never outlive the token's exp.
+_token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+# Detached snapshots of recently seen users, keyed by id
+_user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+
+def _decode_token_subject(token: str) -> str:
+    key = hashlib.sha256(token.encode()).hexdigest()
+    subject = _token_cache.get(key)
+    if subject is not None:
+        return subject
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    subject = payload.get("sub")
+    expires_at = payload.get("exp")
+    ttl = expires_at - time.time() if expires_at else None
+    _token_cache.set(key, subject, ttl)
+    return subject
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a user from the lookup cache so the next request reloads it."""
+    _user_cache.pop(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    invalidate_user(target.id)
+
 
 def get_current_user(
     session: Session = Depends(get_session), token: str = Depends(reusable_oauth2)
 ) -> User:
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        token_data = payload.get("sub")
+        token_data = _decode_token_subject(token)
     except (JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, int(token_data))
+    user_id = int(token_data)
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user = User.model_validate(user)
+    _user_cache.set(user_id, user)
     return user
+
+
+def is_admin(user: User) -> bool:
+    admins = {e.strip().lower() for e in settings.ADMIN_EMAILS.split(",") if e.strip()}
+    return user.email.lower() in admins
+
+
+def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
+        )
+    return current_user
+
+
+def authorization_is_admin(authorization: str) -> bool:
+    """Check a raw Authorization header, for middleware outside dependency injection."""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user_id = int(_decode_token_subject(token))
+    except (JWTError, ValidationError, TypeError, ValueError):
+        return False
+    user = _user_cache.get(user_id)
+    if user is None:
+        with Session(engine) as session:
+            user = session.get(User, user_id)
+            if user is None:
+                return False
+            user = User.model_validate(user)
+        _user_cache.set(user_id, user)
+    return is_admin(user)
+
+
+@contextmanager
+def tidal_errors(action: str = "Tidal request"):
+    """
+    Turn Tidal failures in the block into HTTP errors: 401 when the user has
+    no usable Tidal session, 503 (with Retry-After when known) when a retry
+    may succeed, 502 otherwise.
+    """
+    try:
+        yield
+    except TidalAuthError:
+        raise HTTPException(
+            status_code=401, detail="Tidal not connected or session expired"
+        )
+    except TidalError as e:
+        print(f"{action} aborted: {e}")
+        if not e.transient:
+            raise HTTPException(status_code=502, detail="Tidal request failed")
+        headers = None
+        if getattr(e, "retry_after", None):
+            headers = {"Retry-After": str(math.ceil(e.retry_after))}
+        raise HTTPException(
+            status_code=503,
+            detail="Tidal is unavailable, try again later",
+            headers=headers,
+        )
@@ -0,0 +1,46 @@
+import logging
+from typing import Any
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - declared, but installs may lack it
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+if settings.FAST_JSON_RESPONSES and orjson is None:
+    logger.warning(
+        "FAST_JSON_RESPONSES is on but orjson is not installed; "
+        "responses use the standard JSON encoder"
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (falls back to the stdlib encoder)."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_json_enabled() -> bool:
+    return settings.FAST_JSON_RESPONSES and orjson is not None
+
+
+# Response class for routers that opt into the fast path
+DefaultJSONResponse = FastJSONResponse if fast_json_enabled() else JSONResponse
+
+
+def json_response(content: Any) -> Any:
+    """
+    Return plain read-model dicts either as-is, to go through the route's
+    response_model validation, or already rendered when FAST_JSON_RESPONSES is
+    on. The fast path skips validation and jsonable encoding entirely, so the
+    content must already match the response model.
+    """
+    if fast_json_enabled():
+        return FastJSONResponse(content)
+    return content
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from app.api.v1 import auth, playlists, songs, sync
+from app.api.v1 import admin, auth, imports, playlists, songs, sync
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(playlists.router, prefix="/playlists", tags=["playlists"])
 api_router.include_router(songs.router, prefix="/songs", tags=["songs"])
 api_router.include_router(sync.router, prefix="/sync", tags=["sync"])
+api_router.include_router(imports.router, prefix="/imports", tags=["imports"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.api.deps import get_current_admin_user
+from app.core.config import settings
+from app.core.profiling import profiling_lock, sample_for
+from app.models.user import User
+
+router = APIRouter()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+def profile_worker(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(None, gt=0),
+    include_idle: bool = False,
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    Sample the stacks of every thread in this worker for `seconds` and return
+    them in collapsed-stack format (flamegraph.pl, speedscope, inferno).
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds must be at most {settings.PROFILE_MAX_SECONDS}",
+        )
+    if not profiling_lock.acquire(blocking=False):
+        raise HTTPException(
+            status_code=409, detail="A profile is already running on this worker"
+        )
+    try:
+        interval = (interval_ms or settings.PROFILE_INTERVAL_MS) / 1000
+        return sample_for(seconds, interval, include_idle)
+    finally:
+        profiling_lock.release()
@@ -1,52 +1,88 @@
-from typing import Any
+from typing import Any, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
 from app.core import security
-from app.core.db import get_session
+from app.core.db import engine, get_session
 from app.models.user import User
 from app.api import deps
 
 router = APIRouter()
 
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many login attempts in progress, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _get_user_by_email(email: str) -> Optional[User]:
+    with Session(engine) as session:
+        return session.exec(select(User).where(User.email == email)).first()
+
+
+def _save_user(user: User) -> User:
+    with Session(engine) as session:
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        return user
+
+
+# Async so that awaiting bcrypt on the hasher's pool doesn't hold a request
+# thread; the short database work runs in the threadpool.
 @router.post("/signup", response_model=User)
-def create_user(
+async def create_user(
     *,
-    session: Session = Depends(get_session),
     email: str,
     password: str,
 ) -> Any:
     """
     Create new user.
     """
-    user = session.exec(select(User).where(User.email == email)).first()
+    user = await run_in_threadpool(_get_user_by_email, email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system",
         )
+    try:
+        password_hash = await security.password_hasher.hash(password)
+    except security.PasswordHasherBusy:
+        raise _hasher_busy()
     user = User(
         email=email,
-        password_hash=security.get_password_hash(password),
+        password_hash=password_hash,
     )
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    return user
+    return await run_in_threadpool(_save_user, user)
 
 
 @router.post("/login")
-def login_access_token(
-    session: Session = Depends(get_session),
+async def login_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = session.exec(select(User).where(User.email == form_data.username)).first()
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    user = await run_in_threadpool(_get_user_by_email, form_data.username)
+    if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+    try:
+        verified, new_hash = await security.password_hasher.verify_and_update(
+            form_data.password, user.password_hash
+        )
+    except security.PasswordHasherBusy:
+        raise _hasher_busy()
+    if not verified:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+
+    # Transparently upgrade hashes made with a different cost factor
+    if new_hash:
+        user.password_hash = new_hash
+        await run_in_threadpool(_save_user, user)
 
     return {
         "access_token": security.create_access_token(user.id),
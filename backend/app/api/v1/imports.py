@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    UploadFile,
+)
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+from app.api.deps import get_session, get_current_user
+from app.core.config import settings
+from app.core.db import engine
+from app.models.import_job import ImportJob
+from app.models.playlist import Playlist
+from app.models.user import User
+from app.schemas import ImportJobRead
+from app.services.import_service import (
+    IMPORT_FORMATS,
+    PlaylistImporter,
+    import_format,
+)
+from app.services.playlist_service import PlaylistService
+
+router = APIRouter()
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+# Running imports, kept referenced until they finish
+_import_tasks = set()
+
+
+def _save_upload(upload: UploadFile, suffix: str) -> str:
+    """Copy the upload to a file the background job can read after the request."""
+    max_bytes = settings.IMPORT_MAX_UPLOAD_MB * 1024 * 1024
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
+        try:
+            while chunk := upload.file.read(COPY_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    break
+                f.write(chunk)
+        except Exception:
+            os.unlink(f.name)
+            raise
+    if size > max_bytes:
+        os.unlink(f.name)
+        raise HTTPException(status_code=413, detail="Import file is too large")
+    return f.name
+
+
+def _start_import(importer: PlaylistImporter) -> None:
+    """
+    Run the import as a task of its own. It is started in an empty context so
+    it outlives the request without counting towards its SQL statements,
+    metrics or trace.
+    """
+    task = contextvars.Context().run(asyncio.create_task, importer.run())
+    _import_tasks.add(task)
+    task.add_done_callback(_import_tasks.discard)
+
+
+def _create_job(
+    user_id: int,
+    filename: str,
+    format: str,
+    name: Optional[str],
+    playlist_id: Optional[int],
+    push_to_tidal: bool,
+) -> ImportJob:
+    with Session(engine) as session:
+        if playlist_id is not None:
+            playlist = session.get(Playlist, playlist_id)
+            if not playlist:
+                raise HTTPException(status_code=404, detail="Playlist not found")
+            if playlist.user_id != user_id:
+                raise HTTPException(
+                    status_code=403, detail="Not authorized to update this playlist"
+                )
+        elif push_to_tidal:
+            playlist = None
+        else:
+            playlist = PlaylistService(session).create_playlist(
+                user_id=user_id,
+                name=name or Path(filename).name.split(".")[0] or "Import",
+                description=f"Imported from {filename}",
+            )
+        # Syncs use placeholder ids ("local_tracks") for their own playlists
+        if push_to_tidal and (
+            playlist is None
+            or not playlist.tidal_id
+            or playlist.tidal_id.startswith("local_")
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="Only imports into a playlist linked to Tidal can be pushed",
+            )
+
+        job = ImportJob(
+            user_id=user_id,
+            playlist_id=playlist.id,
+            filename=filename,
+            format=format,
+            push_to_tidal=push_to_tidal,
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+@router.post("/", response_model=ImportJobRead, status_code=202)
+async def create_import(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    name: Optional[str] = Form(None),
+    playlist_id: Optional[int] = Form(None),
+    push_to_tidal: bool = Form(False),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Import a CSV or JSON Lines file (optionally gzipped) into a new playlist
+    called ``name``, or append it to ``playlist_id``. Rows are matched by
+    ``tidal_id``, ISRC, or artist and title. The import runs in the
+    background; poll ``GET /imports/{id}`` for its progress.
+    ``push_to_tidal`` also adds the songs to the playlist's Tidal playlist.
+    """
+    filename = file.filename or "import"
+    guessed_format, compressed = import_format(filename)
+    format = format or guessed_format
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid import format")
+
+    path = await run_in_threadpool(_save_upload, file, ".gz" if compressed else "")
+    try:
+        job = await run_in_threadpool(
+            _create_job,
+            current_user.id,
+            filename,
+            format,
+            name,
+            playlist_id,
+            push_to_tidal,
+        )
+    except Exception:
+        os.unlink(path)
+        raise
+    _start_import(PlaylistImporter(job.id, path, compressed))
+    return job
+
+
+@router.get("/{job_id}", response_model=ImportJobRead)
+def read_import(
+    job_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    job = session.get(ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    if job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not authorized to access this import"
+        )
+    return job
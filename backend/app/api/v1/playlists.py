@@ -1,20 +1,31 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
-from app.api.deps import get_session, get_current_user
+from app.api.deps import get_session, get_current_user, tidal_errors
+from app.api.responses import DefaultJSONResponse, json_response
 from app.models.user import User
 from app.schemas import (
+    DuplicateGroup,
     PlaylistCreate,
     PlaylistRead,
     PlaylistUpdate,
     SongCreate,
     PlaylistReadWithSongs,
     SongRead,
+    SongMove,
+    SongMoveResult,
+)
+from app.services.export_service import (
+    EXPORT_FORMATS,
+    PLAYLIST_ONLY_FORMATS,
+    export_stream,
 )
 from app.services.playlist_service import PlaylistService
 from app.services.sync_service import SyncService
+from app.services.tidal import tidal_service
 
-router = APIRouter()
+router = APIRouter(default_response_class=DefaultJSONResponse)
 
 
 @router.get("/detailed", response_model=List[PlaylistReadWithSongs])
@@ -25,11 +36,60 @@ def read_playlists_detailed(
     current_user: User = Depends(get_current_user),
 ):
     service = PlaylistService(session)
-    return service.get_playlists_with_songs(
-        user_id=current_user.id, skip=skip, limit=limit
+    return json_response(
+        service.get_playlists_with_songs_rows(
+            user_id=current_user.id, skip=skip, limit=limit
+        )
+    )
+
+
+@router.get("/duplicates", response_model=List[DuplicateGroup])
+def read_duplicates(
+    skip: int = 0,
+    limit: int = 100,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    service = PlaylistService(session)
+    return json_response(
+        service.get_duplicates(user_id=current_user.id, skip=skip, limit=limit)
     )
 
 
+def _export_response(
+    format: str, filename: str, compress: bool, **export
+) -> StreamingResponse:
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{filename}.{extension}"
+    if compress:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        export_stream(format, compress=compress, **export),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/export")
+def export_library(
+    format: str = "csv",
+    gzip: bool = False,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Stream every playlist of the user with its songs, one row per song in
+    playlist order. format: "csv" or "jsonl"; ``gzip`` compresses the file.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid export format")
+    if format in PLAYLIST_ONLY_FORMATS:
+        raise HTTPException(
+            status_code=400, detail="This format can only export a single playlist"
+        )
+    return _export_response(format, "library", gzip, user_id=current_user.id)
+
+
 @router.post("/", response_model=PlaylistRead)
 def create_playlist(
     playlist_in: PlaylistCreate,
@@ -62,6 +122,31 @@ def read_playlist(
     current_user: User = Depends(get_current_user),
 ):
     service = PlaylistService(session)
+    playlist = service.get_playlist_with_songs_row(playlist_id)
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    if playlist["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not authorized to access this playlist"
+        )
+    return json_response(playlist)
+
+
+@router.get("/{playlist_id}/export")
+def export_playlist(
+    playlist_id: int,
+    format: str = "csv",
+    gzip: bool = False,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Stream a playlist's songs in order.
+    format: "csv", "jsonl", "m3u", "xspf"; ``gzip`` compresses the file.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid export format")
+    service = PlaylistService(session)
     playlist = service.get_playlist(playlist_id)
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
@@ -69,7 +154,14 @@ def read_playlist(
         raise HTTPException(
             status_code=403, detail="Not authorized to access this playlist"
         )
-    return playlist
+
+    return _export_response(
+        format,
+        f"playlist-{playlist.id}",
+        gzip,
+        playlist_id=playlist.id,
+        playlist_name=playlist.name,
+    )
 
 
 @router.put("/{playlist_id}", response_model=PlaylistRead)
@@ -155,6 +247,26 @@ def remove_song_from_playlist(
     return service.remove_song(playlist_id, song_id)
 
 
+@router.post("/{playlist_id}/songs/move", response_model=SongMoveResult)
+def move_songs(
+    playlist_id: int,
+    move_in: SongMove,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    service = PlaylistService(session)
+    for pid in (playlist_id, move_in.target_playlist_id):
+        playlist = service.get_playlist(pid)
+        if not playlist:
+            raise HTTPException(status_code=404, detail="Playlist not found")
+        if playlist.user_id != current_user.id:
+            raise HTTPException(
+                status_code=403, detail="Not authorized to update this playlist"
+            )
+
+    return service.move_songs(playlist_id, move_in.target_playlist_id, move_in.song_ids)
+
+
 @router.put("/{playlist_id}/songs/reorder", response_model=bool)
 def reorder_playlist_songs(
     playlist_id: int,
@@ -195,5 +307,14 @@ def sync_playlist(
         )
 
     sync_service = SyncService(session)
-    sync_service.sync_playlist_songs(playlist.id, playlist.tidal_id, current_user.id)
+    with tidal_errors("Playlist sync"):
+        # Holds the Tidal login as this user until the sync is done
+        with tidal_service.logged_in_as(current_user.id, session) as logged_in:
+            if not logged_in:
+                raise HTTPException(
+                    status_code=401, detail="Tidal not connected or session expired"
+                )
+            sync_service.sync_playlist_songs(
+                playlist.id, playlist.tidal_id, current_user.id
+            )
     return True
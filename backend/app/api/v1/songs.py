@@ -1,16 +1,35 @@
+from datetime import datetime
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
 from app.api.deps import get_session, get_current_user
+from app.api.responses import DefaultJSONResponse
+from app.core.config import settings
+from app.core.db import engine
 from app.models.user import User
-from app.schemas import SongRead
+from app.schemas import (
+    SongCreate,
+    SongMatchQuery,
+    SongMatchResult,
+    SongRefresh,
+    SongRefreshResult,
+)
 from app.services.tidal import tidal_service
+from app.services.tidal_async import async_tidal_client
+from app.services.tidal_resilience import TidalAuthError
+from app.models.playlist import Playlist
 from app.models.song import Song
+from app.models.playlist_song_link import PlaylistSongLink
+from app.services.playlist_service import PlaylistService
+from app.services.match_cache import MatchCache, dedup_key, search_matches
+from app.services.song_service import SongService
+from sqlmodel import select
 
-router = APIRouter()
+router = APIRouter(default_response_class=DefaultJSONResponse)
 
 
-@router.get("/search", response_model=List[SongRead])
+@router.get("/search", response_model=List[SongCreate])
 def search_songs(
     query: str = Query(..., min_length=1),
     limit: int = 10,
@@ -37,8 +56,129 @@ def refresh_song(
         song.artist = track_data["artist"]
         song.album = track_data["album"]
         song.cover_url = track_data["cover_url"]
+        song.dedup_key = dedup_key(song.artist, song.title)
+        duration_changed = song.duration != track_data.get("duration")
+        song.duration = track_data.get("duration")
+        song.refreshed_at = datetime.utcnow()
         session.add(song)
+        if duration_changed:
+            # Keep total_duration of every playlist containing this song in step
+            playlist_ids = session.exec(
+                select(PlaylistSongLink.playlist_id).where(
+                    PlaylistSongLink.song_id == song.id
+                )
+            ).all()
+            session.flush()
+            PlaylistService(session).recalculate_aggregates(list(playlist_ids))
         session.commit()
         return True
 
     raise HTTPException(status_code=400, detail="Failed to refresh song from Tidal")
+
+
+def _stale_songs(refresh_in: SongRefresh, user_id: int):
+    with Session(engine) as session:
+        if refresh_in.playlist_id is not None:
+            playlist = session.get(Playlist, refresh_in.playlist_id)
+            if not playlist:
+                raise HTTPException(status_code=404, detail="Playlist not found")
+            if playlist.user_id != user_id:
+                raise HTTPException(
+                    status_code=403, detail="Not authorized to access this playlist"
+                )
+        return SongService(session).stale_songs(
+            refresh_in.song_ids, refresh_in.playlist_id, refresh_in.force
+        )
+
+
+def _apply_refresh(songs: List[tuple], tracks: dict) -> List[int]:
+    with Session(engine) as session:
+        return SongService(session).apply_refresh(songs, tracks)
+
+
+@router.post("/refresh", response_model=SongRefreshResult)
+async def refresh_songs(
+    refresh_in: SongRefresh,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Refresh the metadata of many songs from Tidal at once. Track lookups run
+    concurrently on the async Tidal client and all changes are written with a
+    single UPDATE; songs refreshed within SONG_REFRESH_STALE_SECONDS are
+    skipped unless ``force`` is set.
+    """
+    if refresh_in.playlist_id is None and not refresh_in.song_ids:
+        raise HTTPException(
+            status_code=400, detail="Either playlist_id or song_ids is required"
+        )
+    # Database work runs in the threadpool so the event loop keeps serving
+    songs, skipped = await run_in_threadpool(_stale_songs, refresh_in, current_user.id)
+    try:
+        tracks = await async_tidal_client().get_tracks(
+            [tidal_id for _, tidal_id, _ in songs], user_id=current_user.id
+        )
+    except TidalAuthError:
+        raise HTTPException(
+            status_code=401, detail="Tidal not connected or session expired"
+        )
+    refreshed = await run_in_threadpool(_apply_refresh, songs, tracks)
+    return SongRefreshResult(
+        refreshed=refreshed,
+        skipped=skipped,
+        not_found=[
+            song_id
+            for song_id, tidal_id, _ in songs
+            if tidal_id in tracks and tracks[tidal_id] is None
+        ],
+        failed=[song_id for song_id, tidal_id, _ in songs if tidal_id not in tracks],
+    )
+
+
+def _cached_matches(queries: list) -> dict:
+    with Session(engine) as session:
+        return MatchCache(session).lookup(queries)
+
+
+def _store_matches(matches: list) -> None:
+    with Session(engine) as session:
+        MatchCache(session).store(matches)
+        session.commit()
+
+
+@router.post("/match", response_model=List[SongMatchResult])
+async def match_songs(
+    queries_in: List[SongMatchQuery],
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Resolve free-text tracks (artist, title and optionally duration) to Tidal
+    ids. The match cache answers what it can in one query; the rest are
+    searched on Tidal concurrently, and good matches are cached.
+    """
+    if len(queries_in) > settings.MATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MATCH_MAX_QUERIES} tracks per request",
+        )
+    queries = [(q.artist, q.title, q.duration) for q in queries_in]
+    cached = await run_in_threadpool(_cached_matches, queries)
+    found = await search_matches(
+        {query for query in queries if query not in cached}, current_user.id
+    )
+    if found:
+        await run_in_threadpool(
+            _store_matches,
+            [(query, song, confidence) for query, (song, confidence) in found.items()],
+        )
+
+    results = []
+    for query_in, query in zip(queries_in, queries):
+        result = SongMatchResult(**query_in.model_dump())
+        if query in cached:
+            result.tidal_id, result.confidence = cached[query]
+            result.cached = True
+        elif query in found:
+            song, result.confidence = found[query]
+            result.tidal_id = song["tidal_id"]
+        results.append(result)
+    return results
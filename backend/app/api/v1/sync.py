@@ -1,12 +1,24 @@
+import asyncio
+import json
+import logging
+from typing import Callable, Optional
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
-from app.api.deps import get_session, get_current_user
+from starlette.concurrency import run_in_threadpool
+from app.api.deps import get_session, get_current_user, tidal_errors
+from app.core.db import engine
 from app.models.user import User
 from app.services.sync_service import SyncService
 from app.services.tidal import tidal_service
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+SYNC_TYPES = ("playlists", "tracks", "mixes")
+
 
 @router.post("/", status_code=200)
 def sync_data(
@@ -18,33 +30,128 @@ def sync_data(
     Synchronize data with Tidal.
     sync_type: "playlists", "tracks", "mixes"
     """
-    # Ensure Tidal session is loaded
-    if not tidal_service.load_session(current_user.id, session):
-        raise HTTPException(
-            status_code=401, detail="Tidal not connected or session expired"
-        )
+    return _run_sync(sync_type, session, current_user)
 
-    sync_service = SyncService(session)
-
-    result_message = ""
-    count = 0
-
-    if sync_type == "playlists":
-        synced = sync_service.sync_playlists_data(current_user.id)
-        result_message = "Playlists synchronized successfully"
-        count = len(synced)
-    elif sync_type == "tracks":
-        synced = sync_service.sync_tracks(current_user.id)
-        result_message = "Favorite tracks synchronized successfully"
-        count = 1  # One playlist created/updated
-    elif sync_type == "mixes":
-        synced = sync_service.sync_mixes(current_user.id)
-        result_message = "Mixes synchronized successfully"
-        count = 1  # One playlist created/updated
-    else:
+
+@router.post("/stream")
+async def sync_data_stream(
+    sync_type: str = "playlists",
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Run a sync like ``POST /sync/`` and stream its progress as Server-Sent
+    Events: ``playlists_fetched`` (total), then per playlist
+    ``playlist_fetched`` (tracks) and ``playlist_synced`` (rows_written,
+    changed), and finally ``done`` with the usual response, or ``error`` with
+    the status and detail ``POST /sync/`` would have answered (500 for
+    unexpected failures).
+    The sync carries on if the client goes away.
+    """
+    if sync_type not in SYNC_TYPES:
         raise HTTPException(status_code=400, detail="Invalid sync type")
+    return StreamingResponse(
+        _sync_events(sync_type, current_user),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _sync_events(sync_type: str, current_user: User):
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def progress(event: str, data: dict):
+        # Called from the sync's worker thread
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def run():
+        with Session(engine) as session:
+            return _run_sync(sync_type, session, current_user, progress)
+
+    def finished(job: asyncio.Future):
+        if not job.cancelled():
+            # Reported below, or dropped if the client left; bugs are logged
+            # either way
+            error = job.exception()
+            if error is not None and not isinstance(error, HTTPException):
+                logger.error(
+                    "Streamed %s sync of user %s failed",
+                    sync_type,
+                    current_user.id,
+                    exc_info=error,
+                )
+        events.put_nowait(None)
+
+    job = asyncio.ensure_future(run_in_threadpool(run))
+    job.add_done_callback(finished)
+    while (item := await events.get()) is not None:
+        yield _sse(*item)
+    try:
+        yield _sse("done", job.result())
+    except HTTPException as e:
+        yield _sse(
+            "error",
+            {"status": e.status_code, "detail": e.detail, "headers": e.headers or {}},
+        )
+    except Exception:
+        # The response has already started, so report it in the stream
+        yield _sse(
+            "error", {"status": 500, "detail": "Internal Server Error", "headers": {}}
+        )
+
+
+def _run_sync(
+    sync_type: str,
+    session: Session,
+    current_user: User,
+    progress: Optional[Callable[[str, dict], None]] = None,
+):
+    # The sync stopped before replacing anything with a failed fetch
+    with tidal_errors("Sync"):
+        return _sync(sync_type, session, current_user, progress)
+
+
+def _sync(
+    sync_type: str,
+    session: Session,
+    current_user: User,
+    progress: Optional[Callable[[str, dict], None]] = None,
+):
+    # Holds the Tidal login as this user until the sync is done
+    with tidal_service.logged_in_as(current_user.id, session) as logged_in:
+        if not logged_in:
+            raise HTTPException(
+                status_code=401, detail="Tidal not connected or session expired"
+            )
+
+        sync_service = SyncService(session, progress)
+
+        result_message = ""
+        count = 0
+
+        if sync_type == "playlists":
+            synced = sync_service.sync_playlists_data(current_user.id)
+            result_message = "Playlists synchronized successfully"
+            count = len(synced)
+        elif sync_type == "tracks":
+            synced = sync_service.sync_tracks(current_user.id)
+            result_message = "Favorite tracks synchronized successfully"
+            count = 1  # One playlist created/updated
+        elif sync_type == "mixes":
+            synced = sync_service.sync_mixes(current_user.id)
+            result_message = "Mixes synchronized successfully"
+            count = 1  # One playlist created/updated
+        else:
+            raise HTTPException(status_code=400, detail="Invalid sync type")
 
     return {
         "message": result_message,
         "playlists_count": count,
+        # Only these need refetching
+        "changed_playlist_ids": sync_service.changed_playlist_ids,
     }
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 import os
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -14,6 +15,147 @@ class Settings(BaseSettings):
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+    # Auth caches (per worker process)
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+    TOKEN_CACHE_TTL_SECONDS: int = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", 300))
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", 1024))
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv("USER_CACHE_TTL_SECONDS", 30))
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    # Hashing jobs allowed to wait for a worker before requests are rejected
+    PASSWORD_HASH_QUEUE_SIZE: int = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 8))
+
+    # Render playlist/song responses with orjson straight from row tuples
+    FAST_JSON_RESPONSES: bool = (
+        os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+    )
+
+    # Tidal API base URL override, e.g. a local stand-in for offline benchmarks
+    TIDAL_API_URL: Optional[str] = os.getenv("TIDAL_API_URL")
+
+    # Shared HTTP connection pool for Tidal calls
+    TIDAL_POOL_HOSTS: int = int(os.getenv("TIDAL_POOL_HOSTS", 4))
+    TIDAL_POOL_MAXSIZE: int = int(os.getenv("TIDAL_POOL_MAXSIZE", 32))
+    TIDAL_POOL_BLOCK: bool = os.getenv("TIDAL_POOL_BLOCK", "true").lower() == "true"
+    # Longest wait for a free pooled connection before failing (transiently)
+    TIDAL_POOL_TIMEOUT: float = float(os.getenv("TIDAL_POOL_TIMEOUT", 10))
+    TIDAL_HTTP_CONNECT_TIMEOUT: float = float(
+        os.getenv("TIDAL_HTTP_CONNECT_TIMEOUT", 5)
+    )
+    TIDAL_HTTP_READ_TIMEOUT: float = float(os.getenv("TIDAL_HTTP_READ_TIMEOUT", 30))
+    # Retries of transient Tidal failures (429, 5xx, timeouts) with jittered
+    # exponential backoff; a Retry-After longer than the max delay is not waited
+    TIDAL_RETRY_ATTEMPTS: int = int(os.getenv("TIDAL_RETRY_ATTEMPTS", 4))
+    TIDAL_RETRY_BASE_DELAY: float = float(os.getenv("TIDAL_RETRY_BASE_DELAY", 0.5))
+    TIDAL_RETRY_MAX_DELAY: float = float(os.getenv("TIDAL_RETRY_MAX_DELAY", 30))
+    # Consecutive transient failures that open an endpoint's circuit breaker
+    TIDAL_BREAKER_THRESHOLD: int = int(os.getenv("TIDAL_BREAKER_THRESHOLD", 5))
+    TIDAL_BREAKER_RESET_SECONDS: float = float(
+        os.getenv("TIDAL_BREAKER_RESET_SECONDS", 30)
+    )
+    # Connections the async Tidal client may open (requests beyond this queue)
+    TIDAL_ASYNC_MAX_CONNECTIONS: int = int(
+        os.getenv("TIDAL_ASYNC_MAX_CONNECTIONS", 200)
+    )
+
+    # Bulk song refresh: songs refreshed more recently than this are skipped,
+    # and at most this many track lookups are in flight per request
+    SONG_REFRESH_STALE_SECONDS: int = int(
+        os.getenv("SONG_REFRESH_STALE_SECONDS", 24 * 3600)
+    )
+    SONG_REFRESH_CONCURRENCY: int = int(os.getenv("SONG_REFRESH_CONCURRENCY", 16))
+
+    # Exports stream rows from the database this many at a time, so memory use
+    # doesn't grow with the size of the library
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+    # Imports: rows are matched and inserted this many at a time, with at most
+    # this many Tidal searches in flight for rows that don't match locally
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+    IMPORT_SEARCH_CONCURRENCY: int = int(os.getenv("IMPORT_SEARCH_CONCURRENCY", 8))
+    IMPORT_MAX_UPLOAD_MB: int = int(os.getenv("IMPORT_MAX_UPLOAD_MB", 50))
+    # Lowest confidence at which a search result (or cached match) is used
+    MATCH_MIN_CONFIDENCE: float = float(os.getenv("MATCH_MIN_CONFIDENCE", 0.75))
+    # Tidal searches in flight per POST /songs/match request, and the most
+    # tracks one request may resolve
+    MATCH_SEARCH_CONCURRENCY: int = int(os.getenv("MATCH_SEARCH_CONCURRENCY", 8))
+    MATCH_MAX_QUERIES: int = int(os.getenv("MATCH_MAX_QUERIES", 100))
+
+    # Background availability scanner: probes the least recently checked songs
+    # on its own capped budget (in addition to the shared limit); runs inside
+    # the API process when enabled, or standalone via app.services.availability
+    AVAILABILITY_SCAN_ENABLED: bool = (
+        os.getenv("AVAILABILITY_SCAN_ENABLED", "false").lower() == "true"
+    )
+    AVAILABILITY_SCAN_RATE_PER_MINUTE: int = int(
+        os.getenv("AVAILABILITY_SCAN_RATE_PER_MINUTE", 30)
+    )
+    AVAILABILITY_SCAN_BATCH_SIZE: int = int(
+        os.getenv("AVAILABILITY_SCAN_BATCH_SIZE", 50)
+    )
+    # Songs checked more recently than this aren't probed again
+    AVAILABILITY_RECHECK_HOURS: float = float(
+        os.getenv("AVAILABILITY_RECHECK_HOURS", 7 * 24)
+    )
+    # Whose Tidal login the scanner uses (default: the latest linked account)
+    AVAILABILITY_SCAN_USER_ID: Optional[int] = (
+        int(os.getenv("AVAILABILITY_SCAN_USER_ID"))
+        if os.getenv("AVAILABILITY_SCAN_USER_ID")
+        else None
+    )
+
+    # Periodic sync of every linked user's library, one user at a time, in
+    # the API process when enabled or standalone via app.services.sync_scheduler
+    SYNC_SCHEDULE_ENABLED: bool = (
+        os.getenv("SYNC_SCHEDULE_ENABLED", "false").lower() == "true"
+    )
+    SYNC_SCHEDULE_INTERVAL_MINUTES: float = float(
+        os.getenv("SYNC_SCHEDULE_INTERVAL_MINUTES", 6 * 60)
+    )
+    # Comma-separated sync types to run: playlists, tracks, mixes
+    SYNC_SCHEDULE_TYPES: str = os.getenv("SYNC_SCHEDULE_TYPES", "playlists")
+    # Each next run is moved by up to this fraction of the interval either way
+    SYNC_SCHEDULE_JITTER: float = float(os.getenv("SYNC_SCHEDULE_JITTER", 0.1))
+    # Failed syncs are retried after this, doubling per failure up to the max
+    SYNC_SCHEDULE_RETRY_MINUTES: float = float(
+        os.getenv("SYNC_SCHEDULE_RETRY_MINUTES", 15)
+    )
+    SYNC_SCHEDULE_MAX_BACKOFF_HOURS: float = float(
+        os.getenv("SYNC_SCHEDULE_MAX_BACKOFF_HOURS", 24)
+    )
+    # An interrupted playlist sync is resumed from its checkpoints if retried
+    # within this long; older runs start over, as Tidal may have moved on
+    SYNC_RESUME_MAX_AGE_MINUTES: float = float(
+        os.getenv("SYNC_RESUME_MAX_AGE_MINUTES", 60)
+    )
+
+    # Debug mode: adds X-DB-Queries / X-DB-Time-Ms headers to every response
+    DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+
+    # Log requests issuing more SQL statements than this (0 disables)
+    SQL_QUERY_BUDGET: int = int(os.getenv("SQL_QUERY_BUDGET", 50))
+    # Log a likely N+1 when one statement repeats this often in a request
+    SQL_REPEAT_THRESHOLD: int = int(os.getenv("SQL_REPEAT_THRESHOLD", 10))
+
+    # Comma-separated emails of users allowed to use admin endpoints (profiling)
+    ADMIN_EMAILS: str = os.getenv("ADMIN_EMAILS", "")
+    PROFILE_MAX_SECONDS: int = int(os.getenv("PROFILE_MAX_SECONDS", 60))
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+
+    # Tracing: "none", "console" or "file" (OTLP/JSON lines in TRACE_FILE)
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+    # Only export traces whose root span took at least this long
+    TRACE_MIN_DURATION_MS: float = float(os.getenv("TRACE_MIN_DURATION_MS", 0))
+
+    # Expose Prometheus metrics at /metrics, to admins and METRICS_TOKEN holders
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    # Static bearer token for scrapers, which can't log in as an admin
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = [
         "http://localhost:5173",
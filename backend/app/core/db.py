@@ -2,6 +2,7 @@ import logging
 from pathlib import Path
 from sqlmodel import SQLModel, create_engine, Session
 from app.core.config import settings
+from app.core import metrics, tracing
 
 # Configure logging - reduce verbosity
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +12,9 @@ logger = logging.getLogger(__name__)
 logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
 
 engine = create_engine(settings.DATABASE_URL, echo=False)
+metrics.instrument_engine(engine)
+tracing.instrument_engine(engine)
+tracing.instrument_sessions(Session)
 
 
 def init_db():
@@ -0,0 +1,488 @@
+"""
+Minimal Prometheus-compatible metrics for the API.
+
+Counters, gauges and histograms are kept in process memory and rendered in the
+Prometheus text exposition format by ``/metrics``. The API mirrors the parts
+of ``prometheus_client`` we use (``labels(...)``, ``inc``, ``observe``) so the
+metric definitions below don't depend on which backend produces the output.
+
+Note that every uvicorn worker keeps its own registry; scrape each worker (or
+run a single worker per container) to see the full picture.
+"""
+
+import collections
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Counter as TypingCounter
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(v) for v in labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Unlabelled metrics behave like their single child
+        return self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh value holder for one set of label values."""
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(name suffix, rendered labels, value) of every sample to export."""
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def samples(self):
+        for key, child in sorted(self._children.items()):
+            yield "_total", _format_labels(self.labelnames, key), child.value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def samples(self):
+        for key, child in sorted(self._children.items()):
+            yield "", _format_labels(self.labelnames, key), child.value
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for key, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                yield "_bucket", labels, cumulative
+            yield "_bucket", _format_labels(names, key + ("+Inf",)), child.count
+            labels = _format_labels(self.labelnames, key)
+            yield "_sum", labels, child.sum
+            yield "_count", labels, child.count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        """Register a callable that builds metrics at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.register(
+    Counter(
+        "http_requests",
+        "HTTP requests handled, by route template and status code",
+        ("method", "route", "status"),
+    )
+)
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ("method", "route"),
+    )
+)
+HTTP_REQUESTS_IN_PROGRESS = REGISTRY.register(
+    Gauge("http_requests_in_progress", "HTTP requests currently being handled")
+)
+
+# Database
+DB_QUERIES = REGISTRY.register(
+    Counter("db_queries", "SQL statements executed, by verb", ("verb",))
+)
+DB_QUERY_DURATION = REGISTRY.register(
+    Histogram("db_query_duration_seconds", "SQL statement execution time")
+)
+DB_QUERIES_PER_REQUEST = REGISTRY.register(
+    Histogram(
+        "db_queries_per_request",
+        "SQL statements executed while handling a request",
+        ("method", "route"),
+        buckets=COUNT_BUCKETS,
+    )
+)
+DB_TIME_PER_REQUEST = REGISTRY.register(
+    Histogram(
+        "db_time_per_request_seconds",
+        "Time spent executing SQL while handling a request",
+        ("method", "route"),
+    )
+)
+
+# Tidal
+TIDAL_CALL_DURATION = REGISTRY.register(
+    Histogram(
+        "tidal_call_duration_seconds",
+        "TidalService call latency, including rate limiter waits",
+        ("method",),
+    )
+)
+TIDAL_CALL_ERRORS = REGISTRY.register(
+    Counter("tidal_call_errors", "TidalService calls that failed", ("method",))
+)
+TIDAL_RETRIES = REGISTRY.register(
+    Counter(
+        "tidal_call_retries",
+        "Tidal calls retried after a transient failure",
+        ("method", "reason"),
+    )
+)
+TIDAL_RATE_LIMIT_WAIT = REGISTRY.register(
+    Histogram(
+        "tidal_rate_limit_wait_seconds",
+        "Time spent waiting for the client-side Tidal rate limiter",
+    )
+)
+
+# Availability scanner
+AVAILABILITY_CHECKS = REGISTRY.register(
+    Counter(
+        "song_availability_checks",
+        "Songs probed by the availability scanner, by result",
+        ("result",),
+    )
+)
+AVAILABILITY_CHANGES = REGISTRY.register(
+    Counter(
+        "song_availability_changes",
+        "Songs whose is_available flag the scanner flipped, by new state",
+        ("available",),
+    )
+)
+
+# Sync jobs
+SYNC_JOB_DURATION = REGISTRY.register(
+    Histogram(
+        "sync_job_duration_seconds",
+        "Duration of sync jobs",
+        ("job", "outcome"),
+        buckets=JOB_BUCKETS,
+    )
+)
+SYNC_ROWS_WRITTEN = REGISTRY.register(
+    Counter(
+        "sync_rows_written", "Rows inserted, updated or deleted by sync jobs", ("job",)
+    )
+)
+SYNC_PLAYLISTS_RESUMED = REGISTRY.register(
+    Counter(
+        "sync_playlists_resumed",
+        "Playlists skipped because an interrupted sync run had already synced them",
+    )
+)
+IMPORT_ROWS = REGISTRY.register(
+    Counter(
+        "import_rows",
+        "Rows of imported playlist files, by result",
+        ("result",),
+    )
+)
+MATCH_CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "match_cache_lookups",
+        "Free-text track lookups in the match cache, by result (hit, miss)",
+        ("result",),
+    )
+)
+SCHEDULED_SYNCS = REGISTRY.register(
+    Counter(
+        "scheduled_syncs",
+        "Scheduled user syncs, by outcome (success, failed, deferred, skipped)",
+        ("outcome",),
+    )
+)
+
+
+@dataclass
+class QueryStats:
+    """SQL activity within a scope (a request, a sync job). Scopes nest."""
+
+    statements: int = 0
+    duration: float = 0.0
+    rows_written: int = 0
+    parent: Optional["QueryStats"] = None
+    # Executions per SQL string, only kept when asked for (N+1 detection)
+    by_statement: Optional[TypingCounter[str]] = None
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least ``threshold`` times, most frequent first."""
+        if not self.by_statement:
+            return []
+        return [
+            (sql, count)
+            for sql, count in self.by_statement.most_common()
+            if count >= threshold
+        ]
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+@contextmanager
+def query_stats(track_statements: bool = False):
+    """Collect SQL statements executed within the block into a QueryStats."""
+    stats = QueryStats(parent=_current_stats.get())
+    if track_statements:
+        stats.by_statement = collections.Counter()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def instrument_engine(engine) -> None:
+    """Record statement counts and timings for every query run on ``engine``."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        DB_QUERIES.labels(verb).inc()
+        DB_QUERY_DURATION.observe(elapsed)
+        written = 0
+        if verb in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount > 0:
+            written = cursor.rowcount
+        stats = _current_stats.get()
+        while stats is not None:
+            stats.statements += 1
+            stats.duration += elapsed
+            stats.rows_written += written
+            if stats.by_statement is not None:
+                stats.by_statement[statement] += 1
+            stats = stats.parent
+
+
+@contextmanager
+def track_sync_job(job: str):
+    """Time a sync job and count the rows it writes."""
+    start = time.perf_counter()
+    outcome = "error"
+    with query_stats() as stats:
+        try:
+            yield stats
+            outcome = "success"
+        finally:
+            SYNC_JOB_DURATION.labels(job, outcome).observe(time.perf_counter() - start)
+            SYNC_ROWS_WRITTEN.labels(job).inc(stats.rows_written)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and SQL activity."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            with query_stats() as stats:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            # Label by route template (set by the router) to keep cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, path, status).inc()
+            HTTP_REQUEST_DURATION.labels(method, path).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(method, path).observe(stats.statements)
+            DB_TIME_PER_REQUEST.labels(method, path).observe(stats.duration)
@@ -0,0 +1,196 @@
+"""
+Statistical stack sampling for a live worker.
+
+``StackSampler`` snapshots the Python stack of every thread at a fixed
+interval and aggregates them into the "collapsed stack" format read by
+flamegraph.pl, speedscope and inferno: one ``frame;frame;frame count`` line per
+distinct stack, root first.
+
+Sampling is wall-clock: threads blocked on I/O show up too, which is what we
+want for a request that is slow because of Tidal or the database. Stacks whose
+innermost frame is a known idle wait (an empty worker pool, the event loop's
+select) are dropped unless ``include_idle`` is set.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# (file name, function) of leaf frames that mean "this thread is idle"
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+    # concurrent.futures workers block on a C-level queue get
+    ("thread.py", "_worker"),
+}
+
+PROFILE_HEADER = "x-profile"
+PROFILED_STATUS_HEADER = "x-profiled-status"
+
+# Only one profile may run per worker; concurrent profiles would sample each other
+profiling_lock = threading.Lock()
+
+
+class StackSampler:
+    def __init__(
+        self,
+        interval: float = 0.005,
+        include_idle: bool = False,
+        exclude: Iterable[int] = (),
+    ):
+        self.interval = interval
+        self.include_idle = include_idle
+        # Thread idents to leave out, e.g. the one waiting for the profile
+        self.exclude = set(exclude)
+        self.counts: "collections.Counter[str]" = collections.Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # Shorten paths to what identifies the module
+            path = code.co_filename
+            for marker in ("/site-packages/", "/backend/"):
+                if marker in path:
+                    path = path.split(marker, 1)[1]
+                    break
+            else:
+                path = os.path.basename(path)
+            # ';' separates frames in the collapsed format
+            label = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _is_idle(self, frame) -> bool:
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+    def _sample(self, names: Dict[int, str]) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident in self.exclude:
+                continue
+            if not self.include_idle and self._is_idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.counts[";".join(stack)] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        self.exclude.add(threading.get_ident())
+        names: Dict[int, str] = {}
+        names_refreshed = 0.0
+        while True:
+            now = time.monotonic()
+            if now - names_refreshed > 1.0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                names_refreshed = now
+            self._sample(names)
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.counts.most_common()
+        )
+
+
+def sample_for(seconds: float, interval: float, include_idle: bool = False) -> str:
+    """Sample every thread of this process for ``seconds``, as collapsed stacks."""
+    sampler = StackSampler(interval, include_idle, exclude=[threading.get_ident()])
+    sampler.start()
+    try:
+        time.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler.collapsed()
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single request when it carries ``X-Profile: 1`` and ``authorize``
+    accepts its Authorization header. The response body is replaced by the
+    collapsed stacks sampled while the request ran (the original status is
+    kept in ``X-Profiled-Status``).
+
+    Every thread is sampled, so run it against an otherwise idle worker for a
+    clean profile.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], bool], interval: float):
+        self.app = app
+        self.authorize = authorize
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER.encode()) not in (b"1", b"true"):
+            await self.app(scope, receive, send)
+            return
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        authorized = await run_in_threadpool(self.authorize, authorization)
+        if not authorized or not profiling_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def discard_response(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        try:
+            sampler = StackSampler(self.interval, include_idle=False).start()
+            try:
+                await self.app(scope, receive, discard_response)
+            finally:
+                sampler.stop()
+        finally:
+            profiling_lock.release()
+
+        body = sampler.collapsed().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (PROFILED_STATUS_HEADER.encode(), str(status).encode()),
+                    (b"x-profile-samples", str(sampler.samples).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,120 @@
+"""
+Per-request SQL statement budgets and N+1 detection.
+
+``QueryBudgetMiddleware`` counts and times the statements each request issues
+(via the engine hooks in ``app.core.metrics``), logs requests that go over
+``SQL_QUERY_BUDGET`` or repeat one statement ``SQL_REPEAT_THRESHOLD`` times or
+more, and in DEBUG mode reports the numbers in response headers.
+
+``assert_max_queries`` is the matching helper for tests and CI scripts.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import List
+
+from sqlalchemy import event
+
+from app.core.metrics import query_stats
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "x-db-queries"
+QUERY_TIME_HEADER = "x-db-time-ms"
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware enforcing a soft per-request SQL statement budget."""
+
+    def __init__(
+        self,
+        app,
+        budget: int,
+        repeat_threshold: int,
+        debug_headers: bool = False,
+    ):
+        self.app = app
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with query_stats(track_statements=True) as stats:
+
+            async def send_wrapper(message):
+                if self.debug_headers and message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append(
+                        (QUERY_COUNT_HEADER.encode(), str(stats.statements).encode())
+                    )
+                    headers.append(
+                        (
+                            QUERY_TIME_HEADER.encode(),
+                            f"{stats.duration * 1000:.1f}".encode(),
+                        )
+                    )
+                    message = dict(message, headers=headers)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                self._report(scope, stats)
+
+    def _report(self, scope, stats) -> None:
+        request = f"{scope['method']} {scope['path']}"
+        if self.budget and stats.statements > self.budget:
+            logger.warning(
+                "%s issued %d SQL statements (budget %d, %.1f ms in SQL)",
+                request,
+                stats.statements,
+                self.budget,
+                stats.duration * 1000,
+            )
+        if self.repeat_threshold:
+            for sql, count in stats.repeated(self.repeat_threshold)[:3]:
+                logger.warning(
+                    "Possible N+1 in %s: statement ran %d times: %s",
+                    request,
+                    count,
+                    " ".join(sql.split())[:200],
+                )
+
+
+@contextmanager
+def assert_max_queries(limit: int, engine=None):
+    """
+    Fail with AssertionError if the block issues more than ``limit`` SQL
+    statements on ``engine`` (the application engine by default).
+
+    Statements are counted on the engine from every thread, so this also works
+    around requests made through FastAPI's TestClient. Yields the list of
+    executed statements.
+    """
+    if engine is None:
+        from app.core.db import engine
+
+    statements: List[str] = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "after_cursor_execute", _record)
+
+    if len(statements) > limit:
+        listing = "\n".join(
+            f"  {i}. {' '.join(sql.split())[:200]}"
+            for i, sql in enumerate(statements, 1)
+        )
+        raise AssertionError(
+            f"Expected at most {limit} SQL statements, got {len(statements)}:\n"
+            f"{listing}"
+        )
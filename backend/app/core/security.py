@@ -1,10 +1,107 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from threading import BoundedSemaphore, Lock
+from typing import Any, Union, Optional, Tuple
 from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.metrics import REGISTRY, Counter, Gauge
+from app.core.tracing import start_span
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max rounds to the configured cost makes needs_update() flag any
+# hash created with a different cost, so it gets rehashed on the next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool is saturated."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool.
+
+    Hashing is CPU-bound, so a burst of logins would otherwise occupy the
+    server's request threadpool; callers await the result on the event loop
+    instead. At most ``workers`` hashes run at a time and at most
+    ``queue_size`` more may wait; anything beyond that is rejected
+    immediately with PasswordHasherBusy instead of queueing.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self._slots = BoundedSemaphore(self.capacity)
+        self._lock = Lock()
+        self.workers = workers
+        self.pending = 0
+        self.rejected = 0
+
+    async def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self.pending += 1
+        try:
+            # Covers queueing for a worker as well as the bcrypt work itself
+            with start_span("auth.password_hash", **{"hasher.pending": self.pending}):
+                return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._run(
+            pwd_context.verify_and_update, plain_password, hashed_password
+        )
+
+    def stats(self) -> dict:
+        """Queue depth and rejection counters, for metrics."""
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+            "queued": max(self.pending - self.workers, 0),
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE
+)
+
+
+def _password_hasher_metrics():
+    stats = password_hasher.stats()
+    for key in ("workers", "capacity", "pending", "queued"):
+        gauge = Gauge(f"password_hasher_{key}", f"Password hasher {key}")
+        gauge.set(stats[key])
+        yield gauge
+    rejected = Counter(
+        "password_hasher_rejected", "Hashing jobs rejected because the queue was full"
+    )
+    rejected.inc(stats["rejected"])
+    yield rejected
+
+
+REGISTRY.register_collector(_password_hasher_metrics)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -0,0 +1,427 @@
+"""
+Lightweight request/job tracing using OpenTelemetry's span model.
+
+Spans carry W3C trace/span ids, a parent, start/end times in nanoseconds,
+attributes and a status, and finished traces are exported as OTLP/JSON lines
+(the format written by the OpenTelemetry Collector's file exporter), so they
+can be loaded into Jaeger, Tempo etc. or read by hand.
+
+Configuration:
+- TRACE_EXPORTER: "none" (default), "console" (log an indented tree) or "file"
+- TRACE_FILE: where the file exporter appends traces
+- TRACE_SAMPLE_RATE: fraction of root spans (requests, jobs) that are traced;
+  an incoming sampled ``traceparent`` header always is
+- TRACE_MIN_DURATION_MS: only export traces at least this long
+
+Use ``start_span`` as a context manager or ``traced`` as a decorator. When a
+trace is not sampled both are close to free.
+"""
+
+import functools
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "tidal-helper-api"
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self, trace: "_Trace", name: str, parent_id: Optional[str], attributes
+    ):
+        self.trace = trace
+        self.trace_id = trace.trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.error: Optional[str] = None
+        trace.add(self)
+
+    @property
+    def sampled(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float) -> None:
+        """Accumulate a numeric attribute (e.g. time spent in a hot callback)."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        if self is self.trace.root:
+            self.trace.finish()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled traces."""
+
+    sampled = False
+    attributes: Dict[str, Any] = {}
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+
+class _Trace:
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self._lock = Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            if self.root is None:
+                self.root = span
+            self.spans.append(span)
+
+    def finish(self) -> None:
+        root = self.root
+        if root.duration_ms < settings.TRACE_MIN_DURATION_MS:
+            return
+        # Spans still open (e.g. a statement that raised) are dropped
+        spans = [span for span in self.spans if span.end_ns is not None]
+        try:
+            _exporter(spans)
+        except Exception as e:
+            logger.error(f"Failed to export trace {self.trace_id}: {e}")
+
+
+def _attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(spans: List[Span]) -> dict:
+    """Encode finished spans as an OTLP/JSON ExportTraceServiceRequest."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "app.core.tracing"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                "parentSpanId": span.parent_id or "",
+                                "name": span.name,
+                                # SERVER for request roots, INTERNAL otherwise
+                                "kind": 2 if span.name.startswith("HTTP ") else 1,
+                                "startTimeUnixNano": str(span.start_ns),
+                                "endTimeUnixNano": str(span.end_ns),
+                                "attributes": [
+                                    {"key": key, "value": _attribute_value(value)}
+                                    for key, value in span.attributes.items()
+                                ],
+                                "status": (
+                                    {"code": 2, "message": span.error}
+                                    if span.error
+                                    else {"code": 1}
+                                ),
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+_file_lock = Lock()
+
+
+def _export_file(spans: List[Span]) -> None:
+    line = json.dumps(to_otlp_json(spans), separators=(",", ":"))
+    with _file_lock, open(settings.TRACE_FILE, "a") as f:
+        f.write(line + "\n")
+
+
+def _export_console(spans: List[Span]) -> None:
+    children: Dict[Optional[str], List[Span]] = {}
+    for span in sorted(spans, key=lambda s: s.start_ns):
+        children.setdefault(span.parent_id, []).append(span)
+    root = spans[0].trace.root
+    lines = [f"trace {root.trace_id}"]
+
+    def walk(span: Span, depth: int) -> None:
+        offset = (span.start_ns - root.start_ns) / 1e6
+        attrs = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+        status = f" ERROR {span.error}" if span.error else ""
+        lines.append(
+            f"{'  ' * depth}{span.name} +{offset:.1f}ms "
+            f"{span.duration_ms:.2f}ms {attrs}{status}".rstrip()
+        )
+        for child in children.get(span.span_id, []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    logger.info("\n".join(lines))
+
+
+_EXPORTERS = {
+    "file": _export_file,
+    "console": _export_console,
+}
+
+
+def _exporter(spans: List[Span]) -> None:
+    _EXPORTERS[settings.TRACE_EXPORTER](spans)
+
+
+def tracing_enabled() -> bool:
+    return settings.TRACE_EXPORTER in _EXPORTERS
+
+
+def current_span():
+    """The active span, or a no-op span when nothing is being traced."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def start_child(name: str, **attributes):
+    """
+    Start a span under the active one without making it current, for hooks
+    that can't use a ``with`` block (the caller must call ``end()``).
+    """
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+class start_span:
+    """
+    Context manager opening a span as a child of the active one. Without an
+    active span it starts a new trace, subject to TRACE_SAMPLE_RATE unless
+    ``sampled`` forces the decision (e.g. from an incoming traceparent).
+    """
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "trace_id",
+        "parent_id",
+        "sampled",
+        "span",
+        "token",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        sampled: Optional[bool] = None,
+        **attributes,
+    ):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            if not parent.sampled:
+                self.span = NOOP_SPAN
+                return self.span
+            self.span = Span(parent.trace, self.name, parent.span_id, self.attributes)
+        else:
+            sampled = self.sampled
+            if sampled is None:
+                sampled = random.random() < settings.TRACE_SAMPLE_RATE
+            if not (sampled and tracing_enabled()):
+                # Mark the whole unsampled trace so children stay no-ops
+                self.span = NOOP_SPAN
+                self.token = _current_span.set(NOOP_SPAN)
+                return self.span
+            trace = _Trace(self.trace_id)
+            self.span = Span(trace, self.name, self.parent_id, self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.token is not None:
+            _current_span.reset(self.token)
+        if exc is not None:
+            self.span.record_error(exc)
+        self.span.end()
+        return False
+
+
+def traced(name: str):
+    """Decorator running the function inside a span called ``name``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def parse_traceparent(header: Optional[str]):
+    """Return (trace_id, parent_span_id, sampled) from a W3C traceparent header."""
+    if not header:
+        return None, None, None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None, None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None, None, None
+    return parts[1], parts[2], sampled
+
+
+def instrument_engine(engine) -> None:
+    """Record a span for every SQL statement run inside a sampled trace."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement else "SQL"
+        span = start_child(f"db.{verb}")
+        if span.sampled:
+            span.set_attribute("db.statement", " ".join(statement.split())[:500])
+            if executemany:
+                span.set_attribute("db.executemany", True)
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = conn.info["trace_spans"].pop()
+        if span.sampled and cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rowcount", cursor.rowcount)
+        span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        spans = (
+            context.connection.info.get("trace_spans") if context.connection else None
+        )
+        if spans:
+            span = spans.pop()
+            span.record_error(context.original_exception)
+            span.end()
+
+
+def instrument_sessions(session_class) -> None:
+    """Record a ``db.commit`` span (flush + COMMIT) for every Session.commit()."""
+    from sqlalchemy import event
+
+    @event.listens_for(session_class, "before_commit")
+    def _before(session):
+        session.info["trace_commit"] = start_child("db.commit")
+
+    @event.listens_for(session_class, "after_commit")
+    def _after(session):
+        span = session.info.pop("trace_commit", None)
+        if span is not None:
+            span.end()
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the root span of each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent_id, sampled = parse_traceparent(
+            headers.get(b"traceparent", b"").decode("latin-1")
+        )
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with start_span(
+            f"HTTP {scope['method']}",
+            trace_id=trace_id,
+            parent_id=parent_id,
+            sampled=sampled,
+        ) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if span.sampled:
+                    route = getattr(scope.get("route"), "path", None)
+                    span.name = f"HTTP {scope['method']} {route or scope['path']}"
+                    span.set_attribute("http.method", scope["method"])
+                    span.set_attribute("http.route", route or "unmatched")
+                    span.set_attribute("http.target", scope["path"])
+                    span.set_attribute("http.status_code", status)
+                    if status >= 500:
+                        span.error = span.error or f"HTTP {status}"
@@ -1,8 +1,17 @@
-from fastapi import FastAPI
+import asyncio
+import secrets
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from app.api.deps import authorization_is_admin
 from app.api.v1 import api_router
 from app.core.config import settings
 from app.core.db import validate_and_init_db
+from app.core.metrics import CONTENT_TYPE_LATEST, REGISTRY, MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.query_budget import QueryBudgetMiddleware
+from app.core.tracing import TracingMiddleware, tracing_enabled
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -16,8 +25,34 @@ app = FastAPI(
 async def startup_event():
     """Initialize database on application startup."""
     validate_and_init_db()
+    app.state.background_tasks = []
+    if settings.AVAILABILITY_SCAN_ENABLED:
+        from app.services.availability import AvailabilityScanner
+
+        app.state.background_tasks.append(
+            asyncio.create_task(AvailabilityScanner().run())
+        )
+    if settings.SYNC_SCHEDULE_ENABLED:
+        from app.services.sync_scheduler import SyncScheduler
+
+        app.state.background_tasks.append(asyncio.create_task(SyncScheduler().run()))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
 
 
+# Added first (so it sits inside the other middleware, CORS included) to
+# profile mostly the route
+if settings.ADMIN_EMAILS:
+    app.add_middleware(
+        ProfilingMiddleware,
+        authorize=authorization_is_admin,
+        interval=settings.PROFILE_INTERVAL_MS / 1000,
+    )
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -28,6 +63,20 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+app.add_middleware(
+    QueryBudgetMiddleware,
+    budget=settings.SQL_QUERY_BUDGET,
+    repeat_threshold=settings.SQL_REPEAT_THRESHOLD,
+    debug_headers=settings.DEBUG,
+)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Outermost, so the request span covers the other middleware too
+if tracing_enabled():
+    app.add_middleware(TracingMiddleware)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
@@ -39,3 +88,28 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+def _may_read_metrics(authorization: str) -> bool:
+    scheme, _, token = authorization.partition(" ")
+    if (
+        settings.METRICS_TOKEN
+        and scheme.lower() == "bearer"
+        and secrets.compare_digest(token, settings.METRICS_TOKEN)
+    ):
+        return True
+    return authorization_is_admin(authorization)
+
+
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(authorization: Optional[str] = Header(None)):
+        """Prometheus scrape endpoint (per worker process)."""
+        if not _may_read_metrics(authorization or ""):
+            raise HTTPException(
+                status_code=401,
+                detail="Not authorized to read metrics",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
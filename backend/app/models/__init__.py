@@ -3,5 +3,19 @@ from .tidal_token import TidalToken
 from .song import Song
 from .playlist import Playlist
 from .playlist_song_link import PlaylistSongLink
+from .sync_run import SyncRun, SyncCheckpoint, SyncCheckpointPage
+from .track_match import TrackMatch
+from .import_job import ImportJob
 
-__all__ = ["User", "TidalToken", "Song", "Playlist", "PlaylistSongLink"]
+__all__ = [
+    "User",
+    "TidalToken",
+    "Song",
+    "Playlist",
+    "PlaylistSongLink",
+    "SyncRun",
+    "SyncCheckpoint",
+    "SyncCheckpointPage",
+    "TrackMatch",
+    "ImportJob",
+]
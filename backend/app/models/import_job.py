@@ -0,0 +1,30 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class ImportJob(SQLModel, table=True):
+    """A playlist import from an uploaded file, run in the background."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    playlist_id: int = Field(foreign_key="playlist.id")
+    filename: str
+    format: str
+    push_to_tidal: bool = Field(default=False)
+    # "pending", then "running" until "completed" or "failed"
+    status: str = Field(default="pending")
+    error: Optional[str] = None
+    # Rows read so far: added to the playlist, not found on Tidal, or skipped
+    # as already in the playlist (or repeated in the file)
+    processed: int = Field(default=0)
+    matched: int = Field(default=0)
+    unmatched: int = Field(default=0)
+    skipped: int = Field(default=0)
+    # Tidal searches made, and rows resolved from the match cache instead
+    searches: int = Field(default=0)
+    cache_hits: int = Field(default=0)
+    pushed: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
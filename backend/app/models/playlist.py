@@ -9,13 +9,17 @@ from .playlist_song_link import PlaylistSongLink
 
 class Playlist(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="user.id")
+    user_id: int = Field(foreign_key="user.id", index=True)
     tidal_id: Optional[str] = Field(default=None, index=True)
     name: str
     description: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_synced_at: Optional[datetime] = Field(default=None)
+    # Denormalized aggregates, kept up to date on every write to the playlist
+    song_count: int = Field(default=0)
+    total_duration: int = Field(default=0)
+    version: int = Field(default=0)
 
     songs: List["Song"] = Relationship(
         back_populates="playlists", link_model=PlaylistSongLink
@@ -1,4 +1,5 @@
 from typing import Optional, List, TYPE_CHECKING
+from datetime import datetime
 from sqlmodel import Field, SQLModel, Relationship
 
 if TYPE_CHECKING:
@@ -9,11 +10,21 @@ from .playlist_song_link import PlaylistSongLink
 class Song(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     tidal_id: int = Field(unique=True, index=True)
+    # International Standard Recording Code, for matching imported rows
+    isrc: Optional[str] = Field(default=None, index=True)
     title: str
     artist: str
     album: str
     cover_url: Optional[str] = None
+    # Normalized "artist|title" shared by releases of the same song, for
+    # duplicate detection; set wherever title or artist are written
+    dedup_key: Optional[str] = Field(default=None, index=True)
+    duration: Optional[int] = None
     is_available: bool = Field(default=True)
+    # Last metadata refresh from Tidal; refreshes skip songs newer than the window
+    refreshed_at: Optional[datetime] = Field(default=None)
+    # Last availability probe by the background scanner
+    checked_at: Optional[datetime] = Field(default=None, index=True)
 
     playlists: List["Playlist"] = Relationship(
         back_populates="songs", link_model=PlaylistSongLink
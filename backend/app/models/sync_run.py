@@ -0,0 +1,44 @@
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class SyncRun(SQLModel, table=True):
+    """A sync job's progress, kept so an interrupted run can be resumed."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    sync_type: str
+    # "running" until finished ("completed") or given up as too old ("abandoned")
+    status: str = Field(default="running")
+    total: int = Field(default=0)
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped on every checkpoint
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+
+class SyncCheckpoint(SQLModel, table=True):
+    """One Tidal playlist of a run, as fetched when the run started."""
+
+    run_id: int = Field(foreign_key="syncrun.id", primary_key=True)
+    position: int = Field(primary_key=True)
+    tidal_id: str
+    name: str
+    description: Optional[str] = None
+    # Songs synced and committed; a resumed run skips these
+    applied: bool = Field(default=False)
+    changed: bool = Field(default=False)
+    # Items of a long playlist fetched so far (see SyncCheckpointPage); a
+    # resumed run fetches the rest from here
+    next_offset: int = Field(default=0)
+
+
+class SyncCheckpointPage(SQLModel, table=True):
+    """A page of a checkpointed playlist's tracks, fetched before the run stopped."""
+
+    run_id: int = Field(foreign_key="syncrun.id", primary_key=True)
+    position: int = Field(primary_key=True)
+    offset: int = Field(primary_key=True)
+    # The page's song dicts, as a JSON list
+    songs: str
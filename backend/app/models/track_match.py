@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class TrackMatch(SQLModel, table=True):
+    """
+    A resolved free-text track: normalized artist and title, and the bucket of
+    the matched track's duration, mapped to the Tidal track chosen for them.
+    """
+
+    artist_key: str = Field(primary_key=True)
+    title_key: str = Field(primary_key=True)
+    duration_bucket: int = Field(primary_key=True)
+    tidal_id: int
+    # 1.0 for an exact match; lookups ignore entries below their threshold
+    confidence: float
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -24,6 +24,9 @@ class PlaylistRead(PlaylistBase):
     created_at: datetime
     updated_at: datetime
     last_synced_at: Optional[datetime] = None
+    song_count: int = 0
+    total_duration: int = 0
+    version: int = 0
 
 
 class SongBase(SQLModel):
@@ -32,6 +35,7 @@ class SongBase(SQLModel):
     artist: str
     album: str
     cover_url: Optional[str] = None
+    duration: Optional[int] = None
 
 
 class SongCreate(SongBase):
@@ -44,3 +48,88 @@ class SongRead(SongBase):
 
 class PlaylistReadWithSongs(PlaylistRead):
     songs: List[SongRead] = []
+
+
+class DuplicateSong(SongRead):
+    # The user's playlists holding this song
+    playlist_ids: List[int] = []
+
+
+class DuplicateGroup(SQLModel):
+    # Releases of one song (same normalized artist and title, about as long)
+    # across the user's playlists
+    songs: List[DuplicateSong] = []
+    # More than one Tidal release, rather than one song in several playlists
+    near_duplicates: bool = False
+
+
+class SongMove(SQLModel):
+    song_ids: List[int]
+    target_playlist_id: int
+
+
+class SongMoveResult(SQLModel):
+    # Added to the target and removed from the source
+    moved: List[int] = []
+    # Already in the target, only removed from the source
+    already_in_target: List[int] = []
+    # False if a linked Tidal playlist couldn't be updated
+    tidal_synced: bool = True
+
+
+class SongRefresh(SQLModel):
+    # Songs of this playlist, the listed songs, or the listed songs of the playlist
+    playlist_id: Optional[int] = None
+    song_ids: List[int] = []
+    # Also refresh songs refreshed within SONG_REFRESH_STALE_SECONDS
+    force: bool = False
+
+
+class SongRefreshResult(SQLModel):
+    refreshed: List[int] = []
+    # Refreshed recently enough to be left alone
+    skipped: int = 0
+    # No longer on Tidal
+    not_found: List[int] = []
+    # Tidal lookup failed; try again later
+    failed: List[int] = []
+
+
+class ImportJobRead(SQLModel):
+    id: int
+    playlist_id: int
+    filename: str
+    format: str
+    push_to_tidal: bool
+    # "pending", "running", "completed" or "failed" (see error)
+    status: str
+    error: Optional[str] = None
+    processed: int = 0
+    # Added to the playlist
+    matched: int = 0
+    # Not found locally or on Tidal
+    unmatched: int = 0
+    # Already in the playlist, or repeated in the file
+    skipped: int = 0
+    searches: int = 0
+    cache_hits: int = 0
+    # Added to the linked Tidal playlist
+    pushed: int = 0
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class SongMatchQuery(SQLModel):
+    artist: str
+    title: str
+    # Seconds; narrows the match to tracks of about this length
+    duration: Optional[int] = None
+
+
+class SongMatchResult(SongMatchQuery):
+    # None if no track matched well enough
+    tidal_id: Optional[int] = None
+    confidence: float = 0.0
+    # Answered from the match cache, without a Tidal search
+    cached: bool = False
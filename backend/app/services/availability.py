@@ -0,0 +1,178 @@
+"""
+Background scanner that keeps ``Song.is_available`` current.
+
+Syncs only ever mark songs available, so a track Tidal pulls stays "available"
+until the next full resync notices. The scanner walks the song catalog in
+batches of ``AVAILABILITY_SCAN_BATCH_SIZE``, least recently checked first,
+looks each track up on the async Tidal client and writes ``is_available`` and
+``checked_at`` for the whole batch with one UPDATE. A track is unavailable
+when Tidal no longer has it or it isn't ``streamReady``.
+
+Lookups wait for the scanner's own limiter, spaced evenly at
+``AVAILABILITY_SCAN_RATE_PER_MINUTE``, before drawing on the shared Tidal
+budget. The scan therefore costs at most that many calls per minute and never
+crowds out user requests, and a catalog of N songs is rechecked every N / rate
+minutes, or every ``AVAILABILITY_RECHECK_HOURS`` if that is longer.
+
+Set ``AVAILABILITY_SCAN_ENABLED=true`` to run it inside the API (every worker
+runs its own scanner, so enable it on one), or run it as its own process::
+
+    python -m app.services.availability [--once]
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, or_, select, update
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import AVAILABILITY_CHANGES, AVAILABILITY_CHECKS
+from app.models.song import Song
+from app.models.tidal_token import TidalToken
+from app.services.tidal import RateLimiter
+from app.services.tidal_async import async_tidal_client
+from app.services.tidal_resilience import TidalAuthError
+
+logger = logging.getLogger(__name__)
+
+# Pause when no song is due or a whole batch failed (e.g. Tidal is down)
+IDLE_SECONDS = 300
+# Lookups in flight; the limiter, not this, sets the pace
+SCAN_CONCURRENCY = 4
+
+
+def is_track_available(track: Optional[dict]) -> bool:
+    return track is not None and track.get("streamReady", True) is not False
+
+
+class AvailabilityScanner:
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        rate_per_minute: Optional[int] = None,
+        recheck_hours: Optional[float] = None,
+        user_id: Optional[int] = None,
+    ):
+        self.batch_size = batch_size or settings.AVAILABILITY_SCAN_BATCH_SIZE
+        rate = rate_per_minute or settings.AVAILABILITY_SCAN_RATE_PER_MINUTE
+        # One call per slot rather than bursts of a minute's worth
+        self.limiter = RateLimiter(1, 60.0 / rate)
+        if recheck_hours is None:
+            recheck_hours = settings.AVAILABILITY_RECHECK_HOURS
+        self.recheck = timedelta(hours=recheck_hours)
+        self.user_id = user_id or settings.AVAILABILITY_SCAN_USER_ID
+
+    def _scan_user(self) -> Optional[int]:
+        """The user whose Tidal login the lookups go through."""
+        if self.user_id:
+            return self.user_id
+        with Session(engine) as session:
+            return session.exec(
+                select(TidalToken.user_id).order_by(TidalToken.created_at.desc())
+            ).first()
+
+    def _due_songs(self) -> List[tuple]:
+        cutoff = datetime.utcnow() - self.recheck
+        with Session(engine) as session:
+            return session.exec(
+                select(Song.id, Song.tidal_id, Song.is_available)
+                .where(or_(Song.checked_at.is_(None), Song.checked_at < cutoff))
+                .order_by(Song.checked_at.asc().nulls_first(), Song.id)
+                .limit(self.batch_size)
+            ).all()
+
+    def _save(self, songs: List[tuple], tracks: Dict[int, Optional[dict]]) -> dict:
+        now = datetime.utcnow()
+        counts = {"available": 0, "unavailable": 0, "failed": 0, "changed": 0}
+        rows = []
+        for song_id, tidal_id, was_available in songs:
+            if tidal_id not in tracks:
+                # An isolated failure is checked again next cycle rather than
+                # blocking the head of the queue; a fully failed batch isn't saved
+                counts["failed"] += 1
+                available = was_available
+            else:
+                available = is_track_available(tracks[tidal_id])
+                counts["available" if available else "unavailable"] += 1
+                if available != was_available:
+                    counts["changed"] += 1
+                    AVAILABILITY_CHANGES.labels(str(available).lower()).inc()
+            rows.append({"id": song_id, "is_available": available, "checked_at": now})
+        for result in ("available", "unavailable", "failed"):
+            AVAILABILITY_CHECKS.labels(result).inc(counts[result])
+        if counts["failed"] == len(songs):
+            return counts
+
+        with Session(engine) as session:
+            # ORM bulk UPDATE by primary key: a single executemany statement
+            session.exec(update(Song), params=rows)
+            session.commit()
+        return counts
+
+    async def scan_batch(self) -> Optional[dict]:
+        """
+        Check the next batch of due songs and return counts of available,
+        unavailable, failed and changed songs, or None if no song is due.
+        """
+        songs = await run_in_threadpool(self._due_songs)
+        if not songs:
+            return None
+        user_id = await run_in_threadpool(self._scan_user)
+        if user_id is None:
+            raise TidalAuthError("No linked Tidal account to check songs with")
+        tracks = await async_tidal_client().fetch_tracks(
+            [tidal_id for _, tidal_id, _ in songs],
+            user_id=user_id,
+            concurrency=SCAN_CONCURRENCY,
+            limiter=self.limiter,
+        )
+        counts = await run_in_threadpool(self._save, songs, tracks)
+        logger.info("Availability scan: %s", counts)
+        return counts
+
+    async def run(self) -> None:
+        """Scan batch after batch until cancelled, idling when nothing is due."""
+        while True:
+            try:
+                counts = await self.scan_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Availability scan failed: %s", e)
+                counts = None
+            if counts is None or not counts["available"] + counts["unavailable"]:
+                await asyncio.sleep(IDLE_SECONDS)
+
+
+async def _main(args: argparse.Namespace) -> None:
+    scanner = AvailabilityScanner(
+        batch_size=args.batch_size, rate_per_minute=args.rate_per_minute
+    )
+    try:
+        if args.once:
+            print(await scanner.scan_batch())
+        else:
+            await scanner.run()
+    finally:
+        await async_tidal_client().aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check songs' availability on Tidal in the background"
+    )
+    parser.add_argument("--once", action="store_true", help="Scan a single batch")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--rate-per-minute", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Streaming exports of a playlist or a whole library.
+
+Rows come from one SELECT read ``EXPORT_BATCH_SIZE`` rows at a time
+(``yield_per``, a server-side cursor where the driver has one). Each batch is
+formatted into one chunk of output and, with ``compress``, fed through a
+streaming gzip compressor. Nothing holds more than a batch, so memory use is
+the same for 100 links or 100,000.
+
+The export opens its own session: a StreamingResponse body runs after the
+request's dependencies, including its session, have been closed.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.playlist import Playlist
+from app.models.playlist_song_link import PlaylistSongLink
+from app.models.song import Song
+
+# Format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "m3u": ("audio/x-mpegurl", "m3u8"),
+    "xspf": ("application/xspf+xml", "xspf"),
+}
+# Formats that describe exactly one playlist
+PLAYLIST_ONLY_FORMATS = ("m3u", "xspf")
+
+EXPORT_COLUMNS = (
+    "playlist_id",
+    "playlist_name",
+    "position",
+    "tidal_id",
+    "title",
+    "artist",
+    "album",
+    "duration",
+    "is_available",
+    "added_at",
+)
+
+
+def track_url(tidal_id: int) -> str:
+    return f"https://tidal.com/browse/track/{tidal_id}"
+
+
+def _one_line(value: Optional[str]) -> str:
+    return " ".join((value or "").split())
+
+
+def _rows(
+    user_id: Optional[int] = None, playlist_id: Optional[int] = None
+) -> Iterator[List[dict]]:
+    """Export rows in playlist and song order, a batch at a time."""
+    statement = (
+        select(
+            Playlist.id,
+            Playlist.name,
+            PlaylistSongLink.order,
+            Song.tidal_id,
+            Song.title,
+            Song.artist,
+            Song.album,
+            Song.duration,
+            Song.is_available,
+            PlaylistSongLink.added_at,
+        )
+        .join(PlaylistSongLink, PlaylistSongLink.playlist_id == Playlist.id)
+        .join(Song, Song.id == PlaylistSongLink.song_id)
+        .order_by(Playlist.id, PlaylistSongLink.order)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+    )
+    if playlist_id is not None:
+        statement = statement.where(Playlist.id == playlist_id)
+    if user_id is not None:
+        statement = statement.where(Playlist.user_id == user_id)
+    with Session(engine) as session:
+        for batch in session.exec(statement).partitions():
+            yield [dict(zip(EXPORT_COLUMNS, row)) for row in batch]
+
+
+def _csv(batches: Iterable[List[dict]], playlist_name: str) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl(batches: Iterable[List[dict]], playlist_name: str) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in batch)
+
+
+def _m3u(batches: Iterable[List[dict]], playlist_name: str) -> Iterator[str]:
+    yield f"#EXTM3U\n#PLAYLIST:{_one_line(playlist_name)}\n"
+    for batch in batches:
+        yield "".join(
+            f"#EXTINF:{row['duration'] if row['duration'] is not None else -1},"
+            f"{_one_line(row['artist'])} - {_one_line(row['title'])}\n"
+            f"{track_url(row['tidal_id'])}\n"
+            for row in batch
+        )
+
+
+def _xspf_track(row: dict) -> str:
+    duration = ""
+    if row["duration"] is not None:
+        # XSPF durations are in milliseconds
+        duration = f"<duration>{row['duration'] * 1000}</duration>"
+    return (
+        "<track>"
+        f"<location>{track_url(row['tidal_id'])}</location>"
+        f"<title>{escape(row['title'])}</title>"
+        f"<creator>{escape(row['artist'])}</creator>"
+        f"<album>{escape(row['album'])}</album>"
+        f"{duration}"
+        "</track>\n"
+    )
+
+
+def _xspf(batches: Iterable[List[dict]], playlist_name: str) -> Iterator[str]:
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<playlist version="1" xmlns="http://xspf.org/ns/0/">\n'
+        f"<title>{escape(playlist_name)}</title>\n<trackList>\n"
+    )
+    for batch in batches:
+        yield "".join(_xspf_track(row) for row in batch)
+    yield "</trackList>\n</playlist>\n"
+
+
+FORMATTERS: Dict[str, Callable[[Iterable[List[dict]], str], Iterator[str]]] = {
+    "csv": _csv,
+    "jsonl": _jsonl,
+    "m3u": _m3u,
+    "xspf": _xspf,
+}
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(
+    format: str,
+    user_id: Optional[int] = None,
+    playlist_id: Optional[int] = None,
+    playlist_name: str = "",
+    compress: bool = False,
+) -> Iterator[bytes]:
+    """
+    Encoded export of one playlist (``playlist_id``) or all playlists of
+    ``user_id``, as an iterator of chunks for a StreamingResponse. Ownership
+    must have been checked by the caller.
+    """
+    chunks = (
+        chunk.encode()
+        for chunk in FORMATTERS[format](_rows(user_id, playlist_id), playlist_name)
+        if chunk
+    )
+    return _gzip(chunks) if compress else chunks
@@ -0,0 +1,407 @@
+"""
+Bulk playlist imports from CSV or JSON Lines files.
+
+An import runs in the background on a file saved from the upload. It reads
+the file a batch of ``IMPORT_BATCH_SIZE`` rows at a time, so memory use
+doesn't depend on the size of the file. Each batch is resolved to Tidal
+tracks in order of cost:
+
+1. songs already stored, by ``tidal_id`` or ISRC, and the match cache for
+   rows that only give an artist and title (one query each for the batch);
+2. track lookups for ``tidal_id`` values not stored yet, and Tidal searches
+   for the remaining rows, on the async client with at most
+   ``IMPORT_SEARCH_CONCURRENCY`` calls in flight. Good search matches are
+   added to the match cache;
+3. new songs and the playlist's links are inserted in bulk and the batch is
+   committed with the job's progress.
+
+Rows are appended to the playlist in file order. Songs already in it, and
+rows repeating an earlier one, are skipped. With ``push_to_tidal`` each
+batch's songs are also added to the linked Tidal playlist.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from sqlmodel import Session, func, insert, or_, select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import IMPORT_ROWS
+from app.models.import_job import ImportJob
+from app.models.playlist import Playlist
+from app.models.playlist_song_link import PlaylistSongLink
+from app.models.song import Song
+from app.services.match_cache import (
+    MatchCache,
+    MatchQuery,
+    dedup_key,
+    search_matches,
+)
+from app.services.playlist_service import PlaylistService
+from app.services.tidal_async import async_tidal_client
+
+logger = logging.getLogger(__name__)
+
+# Format -> file extensions it's recognized by
+IMPORT_FORMATS = {"csv": (".csv",), "jsonl": (".jsonl", ".ndjson")}
+
+# Column names (lowercased) of the fields an import reads, including those
+# used by common exports from other services
+COLUMNS = {
+    "tidal_id": "tidal_id",
+    "tidal id": "tidal_id",
+    "isrc": "isrc",
+    "title": "title",
+    "track": "title",
+    "track name": "title",
+    "name": "title",
+    "artist": "artist",
+    "artists": "artist",
+    "artist name": "artist",
+    "artist name(s)": "artist",
+    "album": "album",
+    "album name": "album",
+    "duration": "duration",
+    "duration_ms": "duration_ms",
+    "duration (ms)": "duration_ms",
+}
+
+
+def import_format(filename: str) -> Tuple[Optional[str], bool]:
+    """The format a file name suggests, and whether it's gzip-compressed."""
+    name = filename.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[: -len(".gz")]
+    for format, extensions in IMPORT_FORMATS.items():
+        if name.endswith(extensions):
+            return format, compressed
+    return None, compressed
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(float(value)) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value) -> Optional[str]:
+    value = str(value).strip() if value is not None else ""
+    return value or None
+
+
+def _row(record: dict) -> dict:
+    fields = {}
+    for column, value in record.items():
+        field = COLUMNS.get(str(column).strip().lower())
+        if field and field not in fields:
+            fields[field] = value
+    duration = _int(fields.get("duration"))
+    if duration is None and _int(fields.get("duration_ms")) is not None:
+        duration = round(_int(fields["duration_ms"]) / 1000)
+    return {
+        "tidal_id": _int(fields.get("tidal_id")),
+        "isrc": _text(fields.get("isrc")),
+        "title": _text(fields.get("title")),
+        "artist": _text(fields.get("artist")),
+        "album": _text(fields.get("album")),
+        "duration": duration,
+    }
+
+
+def _open(path: str, compressed: bool) -> TextIO:
+    # utf-8-sig: spreadsheet apps often start CSV files with a BOM
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def read_rows(path: str, format: str, compressed: bool = False) -> Iterator[dict]:
+    """Rows of an import file, read lazily."""
+    with _open(path, compressed) as f:
+        if format == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            if isinstance(record, dict):
+                yield _row(record)
+
+
+def _query(row: dict) -> Optional[MatchQuery]:
+    if row["artist"] and row["title"]:
+        return (row["artist"], row["title"], row["duration"])
+    return None
+
+
+class PlaylistImporter:
+    def __init__(self, job_id: int, path: str, compressed: bool = False):
+        self.job_id = job_id
+        self.path = path
+        self.compressed = compressed
+
+    async def run(self) -> None:
+        """Import the whole file; the job records the outcome."""
+        try:
+            await self._run()
+        except Exception as e:
+            logger.warning("Import %s failed: %s", self.job_id, e)
+            await run_in_threadpool(self._finish, "failed", str(e))
+        finally:
+            os.unlink(self.path)
+
+    async def _run(self) -> None:
+        job = await run_in_threadpool(self._start)
+        tidal_playlist_id = job["tidal_playlist_id"] if job["push_to_tidal"] else None
+        rows = read_rows(self.path, job["format"], self.compressed)
+        while True:
+            batch = await run_in_threadpool(
+                list, islice(rows, settings.IMPORT_BATCH_SIZE)
+            )
+            if not batch:
+                break
+            resolved, known, counts = await run_in_threadpool(self._match_local, batch)
+            songs, matches = await self._match_remote(
+                batch, resolved, known, job["user_id"], counts
+            )
+            added = await run_in_threadpool(
+                self._save_batch,
+                job["playlist_id"],
+                batch,
+                resolved,
+                songs,
+                matches,
+                counts,
+            )
+            if tidal_playlist_id and added:
+                pushed = await async_tidal_client().add_song_to_playlist(
+                    tidal_playlist_id, added, job["user_id"]
+                )
+                if pushed:
+                    await run_in_threadpool(self._record, {"pushed": len(added)})
+        await run_in_threadpool(self._finish, "completed")
+
+    # Job bookkeeping
+
+    def _start(self) -> dict:
+        with Session(engine) as session:
+            job = session.get(ImportJob, self.job_id)
+            playlist = session.get(Playlist, job.playlist_id)
+            job.status = "running"
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            return {
+                "user_id": job.user_id,
+                "playlist_id": job.playlist_id,
+                "format": job.format,
+                "push_to_tidal": job.push_to_tidal,
+                "tidal_playlist_id": playlist.tidal_id,
+            }
+
+    def _update_job(self, session: Session, counts: dict) -> None:
+        job = session.get(ImportJob, self.job_id)
+        for field, count in counts.items():
+            setattr(job, field, getattr(job, field) + count)
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+
+    def _record(self, counts: dict) -> None:
+        with Session(engine) as session:
+            self._update_job(session, counts)
+            session.commit()
+
+    def _finish(self, status: str, error: Optional[str] = None) -> None:
+        with Session(engine) as session:
+            job = session.get(ImportJob, self.job_id)
+            job.status = status
+            job.error = error
+            job.finished_at = job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+
+    # Matching
+
+    def _match_local(
+        self, batch: List[dict]
+    ) -> Tuple[List[Optional[int]], Set[int], dict]:
+        """
+        Tidal ids of the batch's rows as far as they resolve without Tidal,
+        the ids of those already stored, and initial counts for the batch.
+        """
+        tidal_ids = {row["tidal_id"] for row in batch if row["tidal_id"]}
+        isrcs = {row["isrc"] for row in batch if row["isrc"]}
+        known: Set[int] = set()
+        by_isrc: Dict[str, int] = {}
+        with Session(engine) as session:
+            if tidal_ids or isrcs:
+                for tidal_id, isrc in session.exec(
+                    select(Song.tidal_id, Song.isrc).where(
+                        or_(Song.tidal_id.in_(tidal_ids), Song.isrc.in_(isrcs))
+                    )
+                ):
+                    known.add(tidal_id)
+                    if isrc:
+                        by_isrc.setdefault(isrc, tidal_id)
+            queries = [
+                _query(row)
+                for row in batch
+                if not row["tidal_id"] and row["isrc"] not in by_isrc
+            ]
+            cached = MatchCache(session).lookup(query for query in queries if query)
+
+        resolved = []
+        cache_hits = 0
+        for row in batch:
+            tidal_id = row["tidal_id"] or by_isrc.get(row["isrc"])
+            if tidal_id is None and _query(row) in cached:
+                tidal_id = cached[_query(row)][0]
+                cache_hits += 1
+            resolved.append(tidal_id)
+        return resolved, known, {"cache_hits": cache_hits, "searches": 0}
+
+    async def _match_remote(
+        self,
+        batch: List[dict],
+        resolved: List[Optional[int]],
+        known: Set[int],
+        user_id: int,
+        counts: dict,
+    ) -> Tuple[Dict[int, dict], list]:
+        """
+        Look up unknown ids and search for unresolved rows, filling in
+        ``resolved``. Returns the new songs by Tidal id and the search matches
+        to cache.
+        """
+        client = async_tidal_client()
+        # Cached matches may point at songs stored since, or never stored
+        unknown = {tidal_id for tidal_id in resolved if tidal_id} - known
+        songs: Dict[int, dict] = {}
+        if unknown:
+            tracks = await client.get_tracks(
+                list(unknown), user_id, settings.IMPORT_SEARCH_CONCURRENCY
+            )
+            songs = {tidal_id: song for tidal_id, song in tracks.items() if song}
+
+        pending = {
+            _query(row)
+            for row, tidal_id in zip(batch, resolved)
+            if tidal_id is None and _query(row)
+        }
+        found = await search_matches(
+            pending, user_id, settings.IMPORT_SEARCH_CONCURRENCY
+        )
+        counts["searches"] += len(pending)
+        matches = []
+        by_query = {}
+        for query, (song, confidence) in found.items():
+            by_query[query] = song["tidal_id"]
+            songs[song["tidal_id"]] = song
+            matches.append((query, song, confidence))
+        for index, row in enumerate(batch):
+            if resolved[index] is None and _query(row) in by_query:
+                resolved[index] = by_query[_query(row)]
+        return songs, matches
+
+    # Writing
+
+    def _save_batch(
+        self,
+        playlist_id: int,
+        batch: List[dict],
+        resolved: List[Optional[int]],
+        songs: Dict[int, dict],
+        matches: list,
+        counts: dict,
+    ) -> List[int]:
+        """
+        Insert the batch's new songs and links, update the playlist's
+        aggregates and the job's progress, and commit. Returns the Tidal ids
+        of the songs added to the playlist.
+        """
+        with Session(engine) as session:
+            MatchCache(session).store(matches)
+
+            tidal_ids = {tidal_id for tidal_id in resolved if tidal_id}
+            stored = dict(
+                session.exec(
+                    select(Song.tidal_id, Song.id).where(Song.tidal_id.in_(tidal_ids))
+                ).all()
+            )
+            new_songs = [
+                dict(
+                    song,
+                    dedup_key=dedup_key(song["artist"], song["title"]),
+                    is_available=True,
+                )
+                for tidal_id, song in songs.items()
+                if tidal_id not in stored
+            ]
+            if new_songs:
+                # ORM bulk INSERT: one executemany statement, then their ids
+                session.exec(insert(Song), params=new_songs)
+                stored.update(
+                    session.exec(
+                        select(Song.tidal_id, Song.id).where(
+                            Song.tidal_id.in_([song["tidal_id"] for song in new_songs])
+                        )
+                    ).all()
+                )
+
+            linked = set(
+                session.exec(
+                    select(PlaylistSongLink.song_id).where(
+                        PlaylistSongLink.playlist_id == playlist_id,
+                        PlaylistSongLink.song_id.in_(stored.values()),
+                    )
+                ).all()
+            )
+            order = session.exec(
+                select(func.max(PlaylistSongLink.order)).where(
+                    PlaylistSongLink.playlist_id == playlist_id
+                )
+            ).one()
+            order = -1 if order is None else order
+
+            now = datetime.utcnow()
+            links = []
+            added = []
+            counts.update(processed=len(batch), matched=0, unmatched=0, skipped=0)
+            for tidal_id in resolved:
+                song_id = stored.get(tidal_id)
+                if song_id is None:
+                    counts["unmatched"] += 1
+                    continue
+                if song_id in linked:
+                    counts["skipped"] += 1
+                    continue
+                counts["matched"] += 1
+                linked.add(song_id)
+                order += 1
+                links.append(
+                    {
+                        "playlist_id": playlist_id,
+                        "song_id": song_id,
+                        "order": order,
+                        "added_at": now,
+                    }
+                )
+                added.append(tidal_id)
+            if links:
+                session.exec(insert(PlaylistSongLink), params=links)
+                PlaylistService(session).recalculate_aggregates([playlist_id])
+            self._update_job(session, counts)
+            session.commit()
+
+        for result in ("matched", "unmatched", "skipped"):
+            IMPORT_ROWS.labels(result).inc(counts[result])
+        return added
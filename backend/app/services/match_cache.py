@@ -0,0 +1,222 @@
+"""
+Persistent cache of free-text track matches.
+
+Resolving an (artist, title) pair to a Tidal track costs a rate-limited
+search, so every match is kept in ``TrackMatch`` under normalized keys and the
+bucket of the matched track's duration, with the match's confidence. Syncs
+add every track they see with full confidence, since Tidal itself paired that
+artist and title with the id.
+
+Callers resolve a whole batch at once: ``lookup`` answers what it can in one
+SELECT, ``search_matches`` searches Tidal for the rest, and ``store`` keeps
+the good results.
+"""
+
+import asyncio
+import re
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlmodel import Session, insert, select, update
+
+from app.core.config import settings
+from app.core.metrics import MATCH_CACHE_LOOKUPS
+from app.models.track_match import TrackMatch
+from app.services.tidal_async import async_tidal_client
+
+# Width of a duration bucket; lookups also accept the neighbouring buckets
+DURATION_BUCKET_SECONDS = 10
+# Durations further apart than this make a candidate doubtful
+DURATION_TOLERANCE_SECONDS = 5
+
+_BRACKETS = re.compile(r"[(\[][^)\]]*[)\]]")
+_FEATURING = re.compile(r"\s(?:feat\.?|ft\.?|featuring)\s.*$")
+_NON_WORD = re.compile(r"[\W_]+")
+_ARTIST_SEPARATORS = re.compile(r"\s*[,;/]\s*")
+
+# Results considered per Tidal search
+SEARCH_LIMIT = 5
+
+# (artist, title, duration in seconds or None)
+MatchQuery = Tuple[str, str, Optional[int]]
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    Lowercase ``text`` without accents, bracketed parts ("(Remastered)"),
+    featured artists or punctuation.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _FEATURING.sub("", _BRACKETS.sub(" ", text))
+    text = text.replace("&", " and ")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def artist_key(artist: Optional[str]) -> str:
+    """Normalized primary artist of a (possibly comma-separated) artist list."""
+    return normalize(_ARTIST_SEPARATORS.split((artist or "").strip())[0])
+
+
+def dedup_key(artist: Optional[str], title: Optional[str]) -> Optional[str]:
+    """
+    Key shared by every release of a song (``Song.dedup_key``): its normalized
+    primary artist and title. None if either normalizes to nothing.
+    """
+    artist, title = artist_key(artist), normalize(title)
+    return f"{artist}|{title}" if artist and title else None
+
+
+def duration_bucket(duration: Optional[int]) -> int:
+    return duration // DURATION_BUCKET_SECONDS if duration else -1
+
+
+def match_confidence(query: MatchQuery, song: dict) -> float:
+    """How likely ``song`` (a Tidal song dict) is the track ``query`` means."""
+    artist, title, duration = query
+    if not normalize(title) or normalize(title) != normalize(song.get("title")):
+        return 0.0
+    wanted, found = artist_key(artist), normalize(song.get("artist"))
+    if wanted == found:
+        confidence = 1.0
+    elif wanted and found and (wanted in found or found in wanted):
+        confidence = 0.8
+    else:
+        return 0.0
+    found_duration = song.get("duration")
+    if duration and found_duration:
+        if abs(duration - found_duration) > DURATION_TOLERANCE_SECONDS:
+            confidence *= 0.5
+    return confidence
+
+
+class MatchCache:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def lookup(
+        self, queries: Iterable[MatchQuery]
+    ) -> Dict[MatchQuery, Tuple[int, float]]:
+        """
+        Tidal id and confidence of the cached match for each of ``queries``
+        that has one, with one SELECT. A query with a duration only matches
+        entries in its duration bucket or a neighbouring one; the most
+        confident entry wins.
+        """
+        keys = {query: (artist_key(query[0]), normalize(query[1])) for query in queries}
+        keys = {query: key for query, key in keys.items() if all(key)}
+        if not keys:
+            return {}
+        rows = self.session.exec(
+            select(TrackMatch).where(
+                TrackMatch.artist_key.in_({key[0] for key in keys.values()}),
+                TrackMatch.title_key.in_({key[1] for key in keys.values()}),
+                TrackMatch.confidence >= settings.MATCH_MIN_CONFIDENCE,
+            )
+        ).all()
+        entries: Dict[Tuple[str, str], List[TrackMatch]] = {}
+        for row in rows:
+            entries.setdefault((row.artist_key, row.title_key), []).append(row)
+
+        matches = {}
+        for query, key in keys.items():
+            candidates = entries.get(key, [])
+            if query[2]:
+                bucket = duration_bucket(query[2])
+                candidates = [
+                    row for row in candidates if abs(row.duration_bucket - bucket) <= 1
+                ]
+            if candidates:
+                best = max(candidates, key=lambda row: row.confidence)
+                matches[query] = (best.tidal_id, best.confidence)
+        MATCH_CACHE_LOOKUPS.labels("hit").inc(len(matches))
+        MATCH_CACHE_LOOKUPS.labels("miss").inc(len(keys) - len(matches))
+        return matches
+
+    def store(self, matches: Iterable[Tuple[MatchQuery, dict, float]]) -> None:
+        """
+        Remember (query, matched song dict, confidence) matches. An entry is
+        only replaced by a more confident match, so tracks released more than
+        once don't flip between ids. The caller commits.
+        """
+        rows = {}
+        for query, song, confidence in matches:
+            key = (
+                artist_key(query[0]),
+                normalize(query[1]),
+                duration_bucket(song.get("duration")),
+            )
+            if all(key[:2]) and confidence > rows.get(key, {}).get("confidence", -1):
+                rows[key] = {
+                    "artist_key": key[0],
+                    "title_key": key[1],
+                    "duration_bucket": key[2],
+                    "tidal_id": song["tidal_id"],
+                    "confidence": confidence,
+                    "updated_at": datetime.utcnow(),
+                }
+        if not rows:
+            return
+
+        existing = {
+            (artist, title, bucket): confidence
+            for artist, title, bucket, confidence in self.session.exec(
+                select(
+                    TrackMatch.artist_key,
+                    TrackMatch.title_key,
+                    TrackMatch.duration_bucket,
+                    TrackMatch.confidence,
+                ).where(
+                    TrackMatch.artist_key.in_({key[0] for key in rows}),
+                    TrackMatch.title_key.in_({key[1] for key in rows}),
+                )
+            )
+        }
+        new = [row for key, row in rows.items() if key not in existing]
+        replaced = [
+            row
+            for key, row in rows.items()
+            if key in existing and row["confidence"] > existing[key]
+        ]
+        # ORM bulk INSERT / UPDATE by primary key: one executemany statement each
+        if new:
+            self.session.exec(insert(TrackMatch), params=new)
+        if replaced:
+            self.session.exec(update(TrackMatch), params=replaced)
+
+    def remember_songs(self, songs: Iterable[dict]) -> None:
+        """Cache Tidal song dicts as exact matches for their own artist and title."""
+        self.store(
+            ((song["artist"], song["title"], song.get("duration")), song, 1.0)
+            for song in songs
+        )
+
+
+async def search_matches(
+    queries: Iterable[MatchQuery], user_id: int, concurrency: Optional[int] = None
+) -> Dict[MatchQuery, Tuple[dict, float]]:
+    """
+    Search Tidal for each query, with at most ``concurrency`` (default
+    ``MATCH_SEARCH_CONCURRENCY``) searches in flight, and return the best
+    result and its confidence for those with a result at least
+    ``MATCH_MIN_CONFIDENCE`` sure.
+    """
+    client = async_tidal_client()
+    semaphore = asyncio.Semaphore(concurrency or settings.MATCH_SEARCH_CONCURRENCY)
+
+    async def search(query: MatchQuery) -> Tuple[float, Optional[dict]]:
+        async with semaphore:
+            results = await client.search_tracks(
+                f"{query[0]} {query[1]}", SEARCH_LIMIT, user_id
+            )
+        scored = [(match_confidence(query, song), song) for song in results]
+        return max(scored, key=lambda scored: scored[0], default=(0.0, None))
+
+    queries = list(queries)
+    found = await asyncio.gather(*(search(query) for query in queries))
+    return {
+        query: (song, confidence)
+        for query, (confidence, song) in zip(queries, found)
+        if confidence >= settings.MATCH_MIN_CONFIDENCE
+    }
@@ -1,13 +1,46 @@
-from typing import List, Optional
-from sqlmodel import Session, select, func
+from typing import Dict, List, Optional
+from sqlmodel import Session, select, func, update, delete
 from datetime import datetime
 from app.models.playlist import Playlist
 from app.models.song import Song
 from app.models.playlist_song_link import PlaylistSongLink
+from app.schemas import PlaylistRead, SongRead
+from app.services.match_cache import DURATION_TOLERANCE_SECONDS, dedup_key
 
 
 from sqlalchemy.orm import selectinload
 
+# Columns backing the read schemas, so read models can be built from row tuples
+PLAYLIST_READ_COLUMNS = [getattr(Playlist, name) for name in PlaylistRead.model_fields]
+SONG_READ_COLUMNS = [getattr(Song, name) for name in SongRead.model_fields]
+
+
+def _split_by_duration(songs: List[dict]) -> List[List[dict]]:
+    """
+    Group song dicts whose durations are within DURATION_TOLERANCE_SECONDS
+    of their shortest song. Songs of unknown length join the first group.
+    """
+    timed = sorted(
+        (song for song in songs if song["duration"]), key=lambda s: s["duration"]
+    )
+    groups: List[List[dict]] = []
+    for song in timed:
+        if (
+            groups
+            and song["duration"] - groups[-1][0]["duration"]
+            <= DURATION_TOLERANCE_SECONDS
+        ):
+            groups[-1].append(song)
+        else:
+            groups.append([song])
+    untimed = [song for song in songs if not song["duration"]]
+    if untimed:
+        if groups:
+            groups[0].extend(untimed)
+        else:
+            groups.append(untimed)
+    return groups
+
 
 class PlaylistService:
     def __init__(self, session: Session):
@@ -45,9 +78,140 @@ class PlaylistService:
         )
         return self.session.exec(statement).all()
 
+    def get_playlists_with_songs_rows(
+        self, user_id: int, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        """
+        Same data as get_playlists_with_songs, built as plain dicts straight
+        from row tuples (two queries, no ORM instances). Songs are in playlist
+        order.
+        """
+        statement = (
+            select(*PLAYLIST_READ_COLUMNS)
+            .where(Playlist.user_id == user_id)
+            .order_by(Playlist.id)
+            .offset(skip)
+            .limit(limit)
+        )
+        return self._rows_with_songs(self.session.exec(statement).all())
+
+    def get_playlist_with_songs_row(self, playlist_id: int) -> Optional[dict]:
+        statement = select(*PLAYLIST_READ_COLUMNS).where(Playlist.id == playlist_id)
+        playlists = self._rows_with_songs(self.session.exec(statement).all())
+        return playlists[0] if playlists else None
+
+    def _rows_with_songs(self, playlist_rows) -> List[dict]:
+        playlist_keys = list(PlaylistRead.model_fields)
+        playlists: Dict[int, dict] = {}
+        for row in playlist_rows:
+            playlist = dict(zip(playlist_keys, row))
+            playlist["songs"] = []
+            playlists[playlist["id"]] = playlist
+        if not playlists:
+            return []
+
+        song_keys = list(SongRead.model_fields)
+        statement = (
+            select(PlaylistSongLink.playlist_id, *SONG_READ_COLUMNS)
+            .join(Song, Song.id == PlaylistSongLink.song_id)
+            .where(PlaylistSongLink.playlist_id.in_(list(playlists)))
+            .order_by(PlaylistSongLink.playlist_id, PlaylistSongLink.order)
+        )
+        for playlist_id, *song in self.session.exec(statement):
+            playlists[playlist_id]["songs"].append(dict(zip(song_keys, song)))
+        return list(playlists.values())
+
+    def get_duplicates(
+        self, user_id: int, skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        """
+        Songs that are in several of the user's playlists, and releases of
+        the same song under different Tidal ids, as DuplicateGroup dicts.
+
+        One query over the user's links: the page of ``dedup_key`` values
+        linked more than once (in key order) and every link of their songs.
+        Songs sharing a key are then split where their durations are more
+        than DURATION_TOLERANCE_SECONDS apart, so a page can hold fewer
+        groups than ``limit``.
+        """
+
+        def user_links(*columns):
+            return (
+                select(*columns)
+                .join(PlaylistSongLink, PlaylistSongLink.song_id == Song.id)
+                .join(Playlist, Playlist.id == PlaylistSongLink.playlist_id)
+                .where(Playlist.user_id == user_id, Song.dedup_key.is_not(None))
+            )
+
+        keys = (
+            user_links(Song.dedup_key)
+            .group_by(Song.dedup_key)
+            .having(func.count() > 1)
+            .order_by(Song.dedup_key)
+            .offset(skip)
+            .limit(limit)
+        )
+        statement = (
+            user_links(Song.dedup_key, PlaylistSongLink.playlist_id, *SONG_READ_COLUMNS)
+            .where(Song.dedup_key.in_(keys))
+            .order_by(Song.dedup_key, Song.id, PlaylistSongLink.playlist_id)
+        )
+
+        song_keys = list(SongRead.model_fields)
+        by_key: Dict[str, Dict[int, dict]] = {}
+        for key, playlist_id, *row in self.session.exec(statement):
+            song = dict(zip(song_keys, row), playlist_ids=[])
+            songs = by_key.setdefault(key, {})
+            songs.setdefault(song["id"], song)["playlist_ids"].append(playlist_id)
+
+        groups = []
+        for songs in by_key.values():
+            for group in _split_by_duration(list(songs.values())):
+                if len(group) > 1 or len(group[0]["playlist_ids"]) > 1:
+                    groups.append({"songs": group, "near_duplicates": len(group) > 1})
+        return groups
+
     def get_playlist(self, playlist_id: int) -> Optional[Playlist]:
         return self.session.get(Playlist, playlist_id)
 
+    def _touch(self, playlist: Playlist) -> None:
+        """Mark a playlist as changed; committed together with the change itself."""
+        playlist.version += 1
+        playlist.updated_at = datetime.utcnow()
+        self.session.add(playlist)
+
+    def recalculate_aggregates(self, playlist_ids: List[int]) -> None:
+        """
+        Recompute song_count and total_duration from the link table.
+
+        Used when a change can't be applied incrementally, e.g. a song's
+        duration changed and every playlist containing it is affected.
+        The caller is responsible for committing.
+        """
+        if not playlist_ids:
+            return
+        song_count = (
+            select(func.count(PlaylistSongLink.song_id))
+            .where(PlaylistSongLink.playlist_id == Playlist.id)
+            .scalar_subquery()
+        )
+        total_duration = (
+            select(func.coalesce(func.sum(Song.duration), 0))
+            .join(PlaylistSongLink, PlaylistSongLink.song_id == Song.id)
+            .where(PlaylistSongLink.playlist_id == Playlist.id)
+            .scalar_subquery()
+        )
+        statement = (
+            update(Playlist)
+            .where(Playlist.id.in_(playlist_ids))
+            .values(
+                song_count=song_count,
+                total_duration=total_duration,
+                version=Playlist.version + 1,
+            )
+        )
+        self.session.exec(statement)
+
     def update_playlist(
         self,
         playlist_id: int,
@@ -61,8 +225,7 @@ class PlaylistService:
             playlist.name = name
         if description is not None:
             playlist.description = description
-        playlist.updated_at = datetime.utcnow()
-        self.session.add(playlist)
+        self._touch(playlist)
         self.session.commit()
         self.session.refresh(playlist)
 
@@ -99,10 +262,16 @@ class PlaylistService:
         song = self.session.exec(statement).first()
 
         if not song:
-            song = Song(**song_data)
+            song = Song(
+                **song_data,
+                dedup_key=dedup_key(song_data["artist"], song_data["title"]),
+            )
             self.session.add(song)
             self.session.commit()
             self.session.refresh(song)
+        elif song.duration is None and song_data.get("duration") is not None:
+            song.duration = song_data["duration"]
+            self.session.add(song)
 
         # Check if song is already in playlist
         link_statement = select(PlaylistSongLink).where(
@@ -124,6 +293,9 @@ class PlaylistService:
             playlist_id=playlist_id, song_id=song.id, order=new_order
         )
         self.session.add(link)
+        playlist.song_count += 1
+        playlist.total_duration += song.duration or 0
+        self._touch(playlist)
         self.session.commit()
 
         # Sync to Tidal if playlist is linked
@@ -153,6 +325,13 @@ class PlaylistService:
         song = self.session.get(Song, song_id)
 
         self.session.delete(link)
+        if playlist:
+            playlist.song_count = max(playlist.song_count - 1, 0)
+            if song and song.duration:
+                playlist.total_duration = max(
+                    playlist.total_duration - song.duration, 0
+                )
+            self._touch(playlist)
         self.session.commit()
 
         # Sync to Tidal if playlist is linked
@@ -168,15 +347,126 @@ class PlaylistService:
 
         return True
 
+    def move_songs(
+        self, source_id: int, target_id: int, song_ids: List[int]
+    ) -> Optional[dict]:
+        """
+        Move songs from one playlist to another in a single transaction.
+
+        Songs are appended to the target in their source order; songs already
+        in the target are only removed from the source. Linked Tidal playlists
+        get one batched add and one batched remove after the commit.
+        Returns None if either playlist doesn't exist.
+        """
+        source = self.get_playlist(source_id)
+        target = self.get_playlist(target_id)
+        if not source or not target:
+            return None
+
+        statement = (
+            select(PlaylistSongLink.song_id, Song.tidal_id, Song.duration)
+            .join(Song, Song.id == PlaylistSongLink.song_id)
+            .where(
+                PlaylistSongLink.playlist_id == source_id,
+                PlaylistSongLink.song_id.in_(song_ids),
+            )
+            .order_by(PlaylistSongLink.order)
+        )
+        rows = self.session.exec(statement).all()
+        if not rows or source_id == target_id:
+            return {"moved": [], "already_in_target": [], "tidal_synced": True}
+        found_ids = [song_id for song_id, _, _ in rows]
+
+        in_target = set(
+            self.session.exec(
+                select(PlaylistSongLink.song_id).where(
+                    PlaylistSongLink.playlist_id == target_id,
+                    PlaylistSongLink.song_id.in_(found_ids),
+                )
+            ).all()
+        )
+        to_add = [row for row in rows if row[0] not in in_target]
+
+        if to_add:
+            max_order = self.session.exec(
+                select(func.max(PlaylistSongLink.order)).where(
+                    PlaylistSongLink.playlist_id == target_id
+                )
+            ).one()
+            first_order = (max_order or 0) + 1
+            self.session.add_all(
+                PlaylistSongLink(
+                    playlist_id=target_id, song_id=song_id, order=first_order + i
+                )
+                for i, (song_id, _, _) in enumerate(to_add)
+            )
+            target.song_count += len(to_add)
+            target.total_duration += sum(duration or 0 for _, _, duration in to_add)
+            self._touch(target)
+
+        self.session.exec(
+            delete(PlaylistSongLink).where(
+                PlaylistSongLink.playlist_id == source_id,
+                PlaylistSongLink.song_id.in_(found_ids),
+            )
+        )
+        source.song_count = max(source.song_count - len(rows), 0)
+        source.total_duration = max(
+            source.total_duration - sum(duration or 0 for _, _, duration in rows), 0
+        )
+        self._touch(source)
+        self.session.commit()
+
+        # Sync to Tidal if the playlists are linked
+        tidal_synced = True
+        if target.tidal_id or source.tidal_id:
+            from app.services.tidal import tidal_service
+
+            added_tidal_ids = [tidal_id for _, tidal_id, _ in to_add if tidal_id]
+            if target.tidal_id and added_tidal_ids:
+                tidal_synced = tidal_service.add_song_to_playlist(
+                    target.tidal_id,
+                    added_tidal_ids,
+                    user_id=target.user_id,
+                    session=self.session,
+                )
+            removed_tidal_ids = [tidal_id for _, tidal_id, _ in rows if tidal_id]
+            if source.tidal_id and removed_tidal_ids:
+                tidal_synced = (
+                    tidal_service.remove_songs_from_playlist(
+                        source.tidal_id,
+                        removed_tidal_ids,
+                        user_id=source.user_id,
+                        session=self.session,
+                    )
+                    and tidal_synced
+                )
+
+        return {
+            "moved": [song_id for song_id, _, _ in to_add],
+            "already_in_target": [
+                song_id for song_id, _, _ in rows if song_id in in_target
+            ],
+            "tidal_synced": tidal_synced,
+        }
+
     def reorder_songs(self, playlist_id: int, song_ids: List[int]) -> bool:
+        changed = False
+        # One query for every link instead of one per song
+        statement = select(PlaylistSongLink).where(
+            PlaylistSongLink.playlist_id == playlist_id,
+            PlaylistSongLink.song_id.in_(song_ids),
+        )
+        links = {link.song_id: link for link in self.session.exec(statement)}
         for index, song_id in enumerate(song_ids):
-            statement = select(PlaylistSongLink).where(
-                PlaylistSongLink.playlist_id == playlist_id,
-                PlaylistSongLink.song_id == song_id,
-            )
-            link = self.session.exec(statement).first()
-            if link:
+            link = links.get(song_id)
+            if link and link.order != index:
                 link.order = index
                 self.session.add(link)
+                changed = True
+        if changed:
+            playlist = self.get_playlist(playlist_id)
+            if playlist:
+                self._touch(playlist)
         self.session.commit()
         return True
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session, select, update
+from app.core.config import settings
+from app.models.song import Song
+from app.models.playlist_song_link import PlaylistSongLink
+from app.services.match_cache import dedup_key
+from app.services.playlist_service import PlaylistService
+
+# Song columns a refresh copies from Tidal's track metadata
+REFRESH_FIELDS = ("title", "artist", "album", "cover_url", "duration", "isrc")
+
+
+class SongService:
+    def __init__(self, session: Session):
+        self.session = session
+
+    def stale_songs(
+        self,
+        song_ids: Optional[List[int]] = None,
+        playlist_id: Optional[int] = None,
+        force: bool = False,
+    ) -> Tuple[List[tuple], int]:
+        """
+        (id, tidal_id, duration) of the selected songs that are due a refresh,
+        and how many were skipped for having been refreshed within
+        SONG_REFRESH_STALE_SECONDS. Songs are selected by id, by playlist, or
+        both (songs of the playlist among the ids).
+        """
+        statement = select(Song.id, Song.tidal_id, Song.duration, Song.refreshed_at)
+        if playlist_id is not None:
+            statement = statement.join(
+                PlaylistSongLink, PlaylistSongLink.song_id == Song.id
+            ).where(PlaylistSongLink.playlist_id == playlist_id)
+        if song_ids:
+            statement = statement.where(Song.id.in_(song_ids))
+        rows = self.session.exec(statement).all()
+
+        cutoff = datetime.utcnow() - timedelta(
+            seconds=settings.SONG_REFRESH_STALE_SECONDS
+        )
+        stale = [
+            (song_id, tidal_id, duration)
+            for song_id, tidal_id, duration, refreshed_at in rows
+            if force or refreshed_at is None or refreshed_at < cutoff
+        ]
+        return stale, len(rows) - len(stale)
+
+    def apply_refresh(
+        self, songs: List[tuple], tracks: Dict[int, Optional[dict]]
+    ) -> List[int]:
+        """
+        Write fetched track metadata to ``songs`` ((id, tidal_id, duration)
+        rows from ``stale_songs``) with one executemany UPDATE, then fix the
+        aggregates of playlists holding songs whose duration changed.
+        Songs without a fetched track are left alone. Commits; returns the ids
+        of the updated songs.
+        """
+        now = datetime.utcnow()
+        rows = []
+        duration_changed = []
+        for song_id, tidal_id, duration in songs:
+            track = tracks.get(tidal_id)
+            if not track:
+                continue
+            row = {field: track.get(field) for field in REFRESH_FIELDS}
+            row.update(
+                id=song_id,
+                dedup_key=dedup_key(row["artist"], row["title"]),
+                refreshed_at=now,
+            )
+            rows.append(row)
+            if row["duration"] != duration:
+                duration_changed.append(song_id)
+        if not rows:
+            return []
+
+        # ORM bulk UPDATE by primary key: a single executemany statement
+        self.session.exec(update(Song), params=rows)
+        if duration_changed:
+            playlist_ids = self.session.exec(
+                select(PlaylistSongLink.playlist_id)
+                .where(PlaylistSongLink.song_id.in_(duration_changed))
+                .distinct()
+            ).all()
+            PlaylistService(self.session).recalculate_aggregates(list(playlist_ids))
+        self.session.commit()
+        return [row["id"] for row in rows]
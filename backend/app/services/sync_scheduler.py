@@ -0,0 +1,267 @@
+"""
+Periodic background sync of every user with a linked Tidal account.
+
+Each user is synced every ``SYNC_SCHEDULE_INTERVAL_MINUTES`` with the sync
+types in ``SYNC_SCHEDULE_TYPES``, using the same ``SyncService`` jobs as
+``POST /sync/``. Users are kept in a queue ordered by due time:
+
+- a user's first run is counted from their last sync (any playlist's
+  ``last_synced_at``); users never synced, or overdue when the scheduler
+  starts, are spread at random over the first interval so a restart doesn't
+  sync everyone at once;
+- every next run is moved by up to ``SYNC_SCHEDULE_JITTER`` of the interval,
+  so users synced together drift apart instead of staying bunched;
+- syncs run one at a time, earliest due first, which keeps the load flat and
+  is round-robin when the scheduler falls behind. ``TidalService`` holds a
+  single Tidal login per process, so each sync holds it as its user for the
+  whole run (``tidal_service.logged_in_as``), queueing behind manual syncs in
+  the same process and vice versa. Their calls go through the shared Tidal
+  rate limit like any request;
+- a user whose sync fails is retried after ``SYNC_SCHEDULE_RETRY_MINUTES``,
+  doubling with every consecutive failure up to
+  ``SYNC_SCHEDULE_MAX_BACKOFF_HOURS``;
+- a transient Tidal failure (outage, rate limiting, open circuit) isn't the
+  user's fault: the whole scheduler pauses and the user keeps their place;
+- a user who synced by hand since being queued is pushed back instead.
+
+Set ``SYNC_SCHEDULE_ENABLED=true`` to run it inside the API (every worker runs
+its own scheduler, so enable it on one), or run it as its own process::
+
+    python -m app.services.sync_scheduler
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import timezone
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, func, select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import SCHEDULED_SYNCS
+from app.models.playlist import Playlist
+from app.models.tidal_token import TidalToken
+from app.services.sync_service import SyncService
+from app.services.tidal import tidal_service
+from app.services.tidal_resilience import TidalAuthError, TidalError
+
+logger = logging.getLogger(__name__)
+
+SYNC_JOBS = {
+    "playlists": "sync_playlists_data",
+    "tracks": "sync_tracks",
+    "mixes": "sync_mixes",
+}
+
+# How often the set of linked users is reloaded
+REFRESH_SECONDS = 300
+# Shortest pause after a transient Tidal failure without a Retry-After
+MIN_PAUSE_SECONDS = 60
+
+
+@dataclass(order=True)
+class _Entry:
+    due: float
+    user_id: int = field(compare=False)
+    failures: int = field(default=0, compare=False)
+
+
+def _last_synced(session: Session, user_ids: List[int]) -> Dict[int, float]:
+    rows = session.exec(
+        select(Playlist.user_id, func.max(Playlist.last_synced_at))
+        .where(Playlist.user_id.in_(user_ids))
+        .group_by(Playlist.user_id)
+    ).all()
+    # Stored as naive UTC
+    return {
+        user_id: last_synced.replace(tzinfo=timezone.utc).timestamp()
+        for user_id, last_synced in rows
+        if last_synced is not None
+    }
+
+
+class SyncScheduler:
+    def __init__(
+        self,
+        interval_minutes: Optional[float] = None,
+        sync_types: Optional[List[str]] = None,
+        jitter: Optional[float] = None,
+    ):
+        self.interval = 60 * (
+            interval_minutes or settings.SYNC_SCHEDULE_INTERVAL_MINUTES
+        )
+        if sync_types is None:
+            sync_types = [
+                sync_type.strip()
+                for sync_type in settings.SYNC_SCHEDULE_TYPES.split(",")
+                if sync_type.strip()
+            ]
+        unknown = set(sync_types) - set(SYNC_JOBS)
+        if unknown:
+            raise ValueError(f"Unknown sync types: {', '.join(sorted(unknown))}")
+        self.sync_types = sync_types
+        self.jitter = settings.SYNC_SCHEDULE_JITTER if jitter is None else jitter
+        self.retry = 60 * settings.SYNC_SCHEDULE_RETRY_MINUTES
+        self.max_backoff = 3600 * settings.SYNC_SCHEDULE_MAX_BACKOFF_HOURS
+        self._queue: List[_Entry] = []
+        self._entries: Dict[int, _Entry] = {}
+        self._refreshed_at = 0.0
+
+    # Scheduling
+
+    def _next_due(self, after: float) -> float:
+        spread = self.interval * self.jitter
+        return after + self.interval + random.uniform(-spread, spread)
+
+    def _schedule(self, entry: _Entry, due: float) -> None:
+        entry.due = due
+        # Replaces any queued copy; stale copies are skipped when popped
+        self._entries[entry.user_id] = entry
+        heapq.heappush(self._queue, entry)
+
+    def _load_users(self) -> Dict[int, float]:
+        """Linked users and when they last synced (0 if never)."""
+        with Session(engine) as session:
+            user_ids = list(set(session.exec(select(TidalToken.user_id)).all()))
+            last_synced = _last_synced(session, user_ids) if user_ids else {}
+        return {user_id: last_synced.get(user_id, 0.0) for user_id in user_ids}
+
+    def refresh_users(self, users: Dict[int, float]) -> None:
+        """Queue newly linked users and drop unlinked ones."""
+        now = time.time()
+        for user_id in set(self._entries) - set(users):
+            del self._entries[user_id]
+        for user_id, last_synced in users.items():
+            if user_id in self._entries:
+                continue
+            due = self._next_due(last_synced)
+            if due <= now:
+                due = now + random.uniform(0, self.interval)
+            self._schedule(_Entry(due, user_id), due)
+
+    def _head(self) -> Optional[_Entry]:
+        """The entry due first, after discarding stale copies."""
+        while self._queue:
+            entry = self._queue[0]
+            if self._entries.get(entry.user_id) is entry:
+                return entry
+            heapq.heappop(self._queue)
+        return None
+
+    def _pop_due(self, now: float) -> Optional[_Entry]:
+        entry = self._head()
+        if entry is None or entry.due > now:
+            return None
+        return heapq.heappop(self._queue)
+
+    def _seconds_until_next(self, now: float) -> float:
+        entry = self._head()
+        if entry is None:
+            return REFRESH_SECONDS
+        return max(entry.due - now, 0.0)
+
+    # Running
+
+    def _sync_user(self, user_id: int) -> Optional[float]:
+        """
+        Run the user's sync jobs. If they synced by hand since being queued,
+        skip them and return when that was.
+        """
+        with Session(engine) as session:
+            last_synced = _last_synced(session, [user_id]).get(user_id, 0.0)
+            if last_synced > time.time() - self.interval * (1 - self.jitter):
+                return last_synced
+            # Shared with manual syncs, which run in request threads
+            with tidal_service.logged_in_as(user_id, session) as logged_in:
+                if not logged_in:
+                    raise TidalAuthError("Tidal not connected or session expired")
+                sync_service = SyncService(session)
+                for sync_type in self.sync_types:
+                    getattr(sync_service, SYNC_JOBS[sync_type])(user_id)
+        return None
+
+    async def run_due(self) -> Optional[float]:
+        """
+        Sync the user who is due first, if any, and reschedule them.
+        Returns how long to pause the scheduler after a transient failure.
+        """
+        now = time.time()
+        entry = self._pop_due(now)
+        if entry is None:
+            return None
+        try:
+            synced_by_hand = await run_in_threadpool(self._sync_user, entry.user_id)
+        except TidalError as e:
+            if e.transient:
+                # Tidal is struggling for everyone: keep the user's place
+                SCHEDULED_SYNCS.labels("deferred").inc()
+                self._schedule(entry, now)
+                pause = max(getattr(e, "retry_after", None) or 0, MIN_PAUSE_SECONDS)
+                logger.warning("Scheduled syncs paused for %.0fs: %s", pause, e)
+                return pause
+            self._failed(entry, e)
+            return None
+        except Exception as e:
+            self._failed(entry, e)
+            return None
+        if synced_by_hand is None:
+            SCHEDULED_SYNCS.labels("success").inc()
+            entry.failures = 0
+            self._schedule(entry, self._next_due(time.time()))
+        else:
+            SCHEDULED_SYNCS.labels("skipped").inc()
+            self._schedule(entry, self._next_due(synced_by_hand))
+        return None
+
+    def _failed(self, entry: _Entry, error: Exception) -> None:
+        SCHEDULED_SYNCS.labels("failed").inc()
+        entry.failures += 1
+        delay = min(self.retry * 2 ** (entry.failures - 1), self.max_backoff)
+        logger.warning(
+            "Scheduled sync of user %s failed (%d in a row), retrying in %.0fs: %s",
+            entry.user_id,
+            entry.failures,
+            delay,
+            error,
+        )
+        self._schedule(entry, time.time() + delay)
+
+    async def run(self) -> None:
+        """Sync users as they fall due until cancelled."""
+        while True:
+            now = time.time()
+            if now - self._refreshed_at >= REFRESH_SECONDS:
+                try:
+                    self.refresh_users(await run_in_threadpool(self._load_users))
+                    self._refreshed_at = now
+                except Exception as e:
+                    logger.warning("Loading users to sync failed: %s", e)
+            pause = await self.run_due()
+            if pause is None:
+                pause = min(
+                    self._seconds_until_next(time.time()),
+                    max(self._refreshed_at + REFRESH_SECONDS - time.time(), 0.0),
+                )
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    scheduler = SyncScheduler()
+    logger.info(
+        "Syncing %s every %.0f minutes",
+        ", ".join(scheduler.sync_types),
+        scheduler.interval / 60,
+    )
+    asyncio.run(scheduler.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,84 @@
-from sqlmodel import Session, select
+import json
+from typing import Callable, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete, select
+from app.core.config import settings
+from app.core.metrics import SYNC_PLAYLISTS_RESUMED, query_stats, track_sync_job
+from app.core.tracing import traced
 from app.models.playlist import Playlist
 from app.models.song import Song
 from app.models.playlist_song_link import PlaylistSongLink
+from app.models.sync_run import SyncCheckpoint, SyncCheckpointPage, SyncRun
+from app.services.match_cache import MatchCache, dedup_key
+from app.services.playlist_service import PlaylistService
 from app.services.tidal import tidal_service
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class SyncService:
-    def __init__(self, session: Session):
+    def __init__(
+        self, session: Session, progress: Optional[Callable[[str, dict], None]] = None
+    ):
         self.session = session
+        # Called as progress(event, data) as syncs run, e.g. to stream progress
+        self.progress = progress
+        # Playlists whose songs, order or details changed, in sync order
+        self.changed_playlist_ids: List[int] = []
+
+    def _emit(self, event: str, **data) -> None:
+        if self.progress is not None:
+            self.progress(event, data)
 
+    def _mark_changed(self, playlist_id: int) -> None:
+        if playlist_id not in self.changed_playlist_ids:
+            self.changed_playlist_ids.append(playlist_id)
+
+    @traced("sync.playlists")
+    @track_sync_job("playlists")
     def sync_playlists_data(self, user_id: int):
-        # 1. Fetch playlists from Tidal
-        tidal_playlists = tidal_service.get_user_playlists(user_id, self.session)
+        # 1. Pick up an interrupted run, or fetch playlists from Tidal and start one
+        run = self._resume_run(user_id, "playlists")
+        if run is None:
+            tidal_playlists = tidal_service.get_user_playlists(user_id, self.session)
+            run = self._start_run(user_id, "playlists", tidal_playlists)
+        checkpoints = self.session.exec(
+            select(SyncCheckpoint)
+            .where(SyncCheckpoint.run_id == run.id)
+            .order_by(SyncCheckpoint.position)
+        ).all()
+        resumed = sum(checkpoint.applied for checkpoint in checkpoints)
+        if resumed:
+            SYNC_PLAYLISTS_RESUMED.inc(resumed)
+        self._emit("playlists_fetched", total=len(checkpoints), resumed=resumed)
 
         synced_playlists = []
 
-        for t_pl in tidal_playlists:
+        for checkpoint in checkpoints:
+            t_pl = {
+                "tidal_id": checkpoint.tidal_id,
+                "name": checkpoint.name,
+                "description": checkpoint.description,
+            }
             # Check if playlist exists locally by tidal_id
             stmt = select(Playlist).where(
                 Playlist.tidal_id == t_pl["tidal_id"], Playlist.user_id == user_id
             )
             local_pl = self.session.exec(stmt).first()
 
+            if local_pl and checkpoint.changed:
+                # Found changed before the run was interrupted
+                self._mark_changed(local_pl.id)
+            if checkpoint.applied and local_pl:
+                # Synced before the run was interrupted
+                synced_playlists.append(local_pl)
+                continue
+
             if local_pl:
+                if (local_pl.name, local_pl.description) != (
+                    t_pl["name"],
+                    t_pl["description"],
+                ):
+                    self._mark_changed(local_pl.id)
                 # Update metadata
                 local_pl.name = t_pl["name"]
                 local_pl.description = t_pl["description"]
@@ -42,73 +97,159 @@ class SyncService:
                 self.session.add(local_pl)
                 self.session.commit()  # Commit to get ID
                 self.session.refresh(local_pl)
+                self._mark_changed(local_pl.id)
 
             synced_playlists.append(local_pl)
 
             # Sync songs for this playlist
-            self.sync_playlist_songs(local_pl.id, t_pl["tidal_id"], user_id)
+            self.sync_playlist_songs(
+                local_pl.id, t_pl["tidal_id"], user_id, run, checkpoint
+            )
+            self._checkpoint(run, checkpoint, local_pl.id in self.changed_playlist_ids)
 
-        self.session.commit()
+        self._finish_run(run)
         return synced_playlists
 
-    def sync_playlist_songs(
-        self, local_playlist_id: int, tidal_playlist_id: str, user_id: int
-    ):
-        # 1. Fetch songs from Tidal
-        tidal_songs = tidal_service.get_playlist_tracks(
-            tidal_playlist_id, user_id, self.session
+    # Sync runs are checkpointed per playlist, and long playlists per page of
+    # tracks, so a run interrupted by a worker restart or a Tidal failure is
+    # resumed without refetching the playlist list, the playlists already
+    # synced or the pages already fetched.
+
+    def _resume_run(self, user_id: int, sync_type: str) -> Optional[SyncRun]:
+        run = self.session.exec(
+            select(SyncRun)
+            .where(
+                SyncRun.user_id == user_id,
+                SyncRun.sync_type == sync_type,
+                SyncRun.status == "running",
+            )
+            .order_by(SyncRun.id.desc())
+        ).first()
+        if run is None:
+            return None
+        max_age = timedelta(minutes=settings.SYNC_RESUME_MAX_AGE_MINUTES)
+        if run.updated_at < datetime.utcnow() - max_age:
+            self._finish_run(run, "abandoned")
+            return None
+        return run
+
+    def _start_run(
+        self, user_id: int, sync_type: str, tidal_playlists: List[dict]
+    ) -> SyncRun:
+        run = SyncRun(user_id=user_id, sync_type=sync_type, total=len(tidal_playlists))
+        self.session.add(run)
+        self.session.flush()
+        self.session.add_all(
+            SyncCheckpoint(
+                run_id=run.id,
+                position=position,
+                tidal_id=t_pl["tidal_id"],
+                name=t_pl["name"],
+                description=t_pl["description"],
+            )
+            for position, t_pl in enumerate(tidal_playlists)
         )
-
-        # 2. Get all existing links for this playlist
-        stmt = select(PlaylistSongLink).where(
-            PlaylistSongLink.playlist_id == local_playlist_id
+        self.session.commit()
+        return run
+
+    def _checkpoint_page(
+        self,
+        run: SyncRun,
+        checkpoint: SyncCheckpoint,
+        local_playlist_id: int,
+        songs: List[dict],
+        next_offset: int,
+    ):
+        """Keep a fetched page of the checkpoint's playlist and where to go on."""
+        self.session.add(
+            SyncCheckpointPage(
+                run_id=run.id,
+                position=checkpoint.position,
+                offset=checkpoint.next_offset,
+                songs=json.dumps(songs),
+            )
         )
-        existing_links = self.session.exec(stmt).all()
-
-        # Remove all existing links for this playlist to ensure order and content match Tidal
-        for link in existing_links:
-            self.session.delete(link)
+        checkpoint.next_offset = next_offset
+        checkpoint.changed = local_playlist_id in self.changed_playlist_ids
+        run.updated_at = datetime.utcnow()
+        self.session.add(checkpoint)
+        self.session.add(run)
+        self.session.commit()
 
-        self.session.commit()  # Commit deletion
+    def _fetched_songs(self, checkpoint: SyncCheckpoint) -> List[dict]:
+        """Songs of the pages fetched for the checkpoint's playlist so far."""
+        if not checkpoint.next_offset:
+            return []
+        pages = self.session.exec(
+            select(SyncCheckpointPage.songs)
+            .where(
+                SyncCheckpointPage.run_id == checkpoint.run_id,
+                SyncCheckpointPage.position == checkpoint.position,
+            )
+            .order_by(SyncCheckpointPage.offset)
+        ).all()
+        return [song for page in pages for song in json.loads(page)]
+
+    def _checkpoint(self, run: SyncRun, checkpoint: SyncCheckpoint, changed: bool):
+        if checkpoint.next_offset:
+            self.session.exec(
+                delete(SyncCheckpointPage).where(
+                    SyncCheckpointPage.run_id == run.id,
+                    SyncCheckpointPage.position == checkpoint.position,
+                )
+            )
+        checkpoint.applied = True
+        checkpoint.changed = changed
+        run.updated_at = datetime.utcnow()
+        self.session.add(checkpoint)
+        self.session.add(run)
+        self.session.commit()
 
-        added_song_ids = set()
-        for index, t_song in enumerate(tidal_songs):
-            # Check if song exists in Song table
-            stmt = select(Song).where(Song.tidal_id == t_song["tidal_id"])
-            local_song = self.session.exec(stmt).first()
+    def _finish_run(self, run: SyncRun, status: str = "completed") -> None:
+        """Close the run; its checkpoints are no longer needed."""
+        self.session.exec(
+            delete(SyncCheckpointPage).where(SyncCheckpointPage.run_id == run.id)
+        )
+        self.session.exec(delete(SyncCheckpoint).where(SyncCheckpoint.run_id == run.id))
+        run.status = status
+        run.finished_at = datetime.utcnow()
+        self.session.add(run)
+        self.session.commit()
 
-            if not local_song:
-                # Create song
-                local_song = Song(
-                    tidal_id=t_song["tidal_id"],
-                    title=t_song["title"],
-                    artist=t_song["artist"],
-                    album=t_song["album"],
-                    cover_url=t_song["cover_url"],
-                    is_available=True,
+    @traced("sync.playlist_songs")
+    def sync_playlist_songs(
+        self,
+        local_playlist_id: int,
+        tidal_playlist_id: str,
+        user_id: int,
+        run: Optional[SyncRun] = None,
+        checkpoint: Optional[SyncCheckpoint] = None,
+    ):
+        # 1. Fetch songs from Tidal (raises on failure, before any link is
+        # touched). With a checkpoint, each page of a long playlist is kept as
+        # it arrives and an interrupted fetch carries on where it stopped.
+        tidal_songs, offset, on_page = [], 0, None
+        if checkpoint is not None:
+            tidal_songs = self._fetched_songs(checkpoint)
+            offset = checkpoint.next_offset
+
+            def on_page(songs: List[dict], next_offset: int):
+                self._checkpoint_page(
+                    run, checkpoint, local_playlist_id, songs, next_offset
                 )
-                self.session.add(local_song)
-                self.session.commit()
-                self.session.refresh(local_song)
-            else:
-                # Update song metadata if needed
-                local_song.title = t_song["title"]
-                local_song.artist = t_song["artist"]
-                local_song.album = t_song["album"]
-                local_song.cover_url = t_song["cover_url"]
-                local_song.is_available = True
-                self.session.add(local_song)
 
-            # Create link
-            if local_song.id not in added_song_ids:
-                link = PlaylistSongLink(
-                    playlist_id=local_playlist_id, song_id=local_song.id, order=index
-                )
-                self.session.add(link)
-                added_song_ids.add(local_song.id)
+        tidal_songs += tidal_service.get_playlist_tracks(
+            tidal_playlist_id, user_id, self.session, offset=offset, on_page=on_page
+        )
 
-        self.session.commit()
+        self._emit(
+            "playlist_fetched", playlist_id=local_playlist_id, tracks=len(tidal_songs)
+        )
+        # 2. Replace the playlist's songs with Tidal's, in Tidal's order
+        return self._sync_songs_to_playlist(local_playlist_id, tidal_songs)
 
+    @traced("sync.tracks")
+    @track_sync_job("tracks")
     def sync_tracks(self, user_id: int):
         # 1. Fetch favorite tracks from Tidal
         tidal_tracks = tidal_service.get_favorite_tracks(user_id, self.session)
@@ -143,6 +284,8 @@ class SyncService:
         self._sync_songs_to_playlist(local_pl.id, tidal_tracks)
         return local_pl
 
+    @traced("sync.mixes")
+    @track_sync_job("mixes")
     def sync_mixes(self, user_id: int):
         # 1. Fetch mixes from Tidal
         tidal_mixes = tidal_service.get_mixes(user_id, self.session)
@@ -197,17 +340,39 @@ class SyncService:
         self._sync_songs_to_playlist(local_pl.id, list(unique_tracks))
         return local_pl
 
+    @traced("sync.songs_to_playlist")
     def _sync_songs_to_playlist(self, local_playlist_id: int, songs_data: list):
+        with query_stats() as stats:
+            changed = self._replace_playlist_songs(local_playlist_id, songs_data)
+        if changed:
+            self._mark_changed(local_playlist_id)
+        self._emit(
+            "playlist_synced",
+            playlist_id=local_playlist_id,
+            rows_written=stats.rows_written,
+            changed=changed,
+        )
+        return changed
+
+    def _replace_playlist_songs(self, local_playlist_id: int, songs_data: list):
+        """Rebuild the playlist's links; True if its songs, order or metadata changed."""
         # Remove all existing links for this playlist
         stmt = select(PlaylistSongLink).where(
             PlaylistSongLink.playlist_id == local_playlist_id
         )
         existing_links = self.session.exec(stmt).all()
+        previous_song_ids = [
+            link.song_id for link in sorted(existing_links, key=lambda l: l.order)
+        ]
         for link in existing_links:
             self.session.delete(link)
         self.session.commit()
 
         added_song_ids = set()
+        linked_song_ids = []
+        total_duration = 0
+        songs_changed = False
+        duration_changed = []
         for index, t_song in enumerate(songs_data):
             # Check if song exists in Song table
             stmt = select(Song).where(Song.tidal_id == t_song["tidal_id"])
@@ -220,17 +385,19 @@ class SyncService:
                     artist=t_song["artist"],
                     album=t_song["album"],
                     cover_url=t_song.get("cover_url"),
+                    duration=t_song.get("duration"),
+                    isrc=t_song.get("isrc"),
+                    dedup_key=dedup_key(t_song["artist"], t_song["title"]),
                     is_available=True,
                 )
                 self.session.add(local_song)
                 self.session.commit()
                 self.session.refresh(local_song)
             else:
-                local_song.title = t_song["title"]
-                local_song.artist = t_song["artist"]
-                local_song.album = t_song["album"]
-                local_song.cover_url = t_song.get("cover_url")
-                local_song.is_available = True
+                previous_duration = local_song.duration
+                songs_changed |= self._update_song(local_song, t_song)
+                if local_song.duration != previous_duration:
+                    duration_changed.append(local_song.id)
                 self.session.add(local_song)
 
             if local_song.id not in added_song_ids:
@@ -239,5 +406,76 @@ class SyncService:
                 )
                 self.session.add(link)
                 added_song_ids.add(local_song.id)
+                linked_song_ids.append(local_song.id)
+                total_duration += local_song.duration or 0
 
+        self._update_aggregates(
+            local_playlist_id, previous_song_ids, linked_song_ids, total_duration
+        )
+        if duration_changed:
+            self._recalculate_other_playlists(local_playlist_id, duration_changed)
+        self._remember_matches(songs_data)
         self.session.commit()
+        return songs_changed or linked_song_ids != previous_song_ids
+
+    def _recalculate_other_playlists(self, local_playlist_id: int, song_ids: list):
+        """Fix the aggregates of other playlists holding songs whose duration changed."""
+        playlist_ids = self.session.exec(
+            select(PlaylistSongLink.playlist_id)
+            .where(
+                PlaylistSongLink.song_id.in_(song_ids),
+                PlaylistSongLink.playlist_id != local_playlist_id,
+            )
+            .distinct()
+        ).all()
+        PlaylistService(self.session).recalculate_aggregates(list(playlist_ids))
+
+    def _remember_matches(self, songs_data: list):
+        """Feed the match cache the (artist, title) -> id pairs Tidal returned."""
+        try:
+            # In a savepoint, so a race with another sync can't fail this one
+            with self.session.begin_nested():
+                MatchCache(self.session).remember_songs(songs_data)
+        except IntegrityError:
+            pass
+
+    def _update_song(self, local_song: Song, t_song: dict) -> bool:
+        """Copy Tidal's metadata onto a stored song; True if any of it changed."""
+        values = {
+            "title": t_song["title"],
+            "artist": t_song["artist"],
+            "album": t_song["album"],
+            "cover_url": t_song.get("cover_url"),
+            "duration": t_song.get("duration"),
+            "is_available": True,
+        }
+        changed = False
+        for field, value in values.items():
+            if getattr(local_song, field) != value:
+                setattr(local_song, field, value)
+                changed = True
+        # Backfilled without counting as a change: they aren't shown anywhere
+        if t_song.get("isrc") and local_song.isrc != t_song["isrc"]:
+            local_song.isrc = t_song["isrc"]
+        key = dedup_key(local_song.artist, local_song.title)
+        if local_song.dedup_key != key:
+            local_song.dedup_key = key
+        return changed
+
+    def _update_aggregates(
+        self,
+        local_playlist_id: int,
+        previous_song_ids: list,
+        song_ids: list,
+        total_duration: int,
+    ):
+        """Store the playlist's denormalized aggregates after its links were rebuilt."""
+        playlist = self.session.get(Playlist, local_playlist_id)
+        if not playlist:
+            return
+        playlist.song_count = len(song_ids)
+        playlist.total_duration = total_duration
+        # Only bump the version when content or order actually changed
+        if song_ids != previous_song_ids:
+            playlist.version += 1
+        self.session.add(playlist)
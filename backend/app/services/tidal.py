@@ -1,28 +1,97 @@
-import tidalapi
 from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.metrics import (
+    TIDAL_CALL_DURATION,
+    TIDAL_CALL_ERRORS,
+    TIDAL_RATE_LIMIT_WAIT,
+)
+from app.core.tracing import current_span, start_span
 from app.models.tidal_token import TidalToken
-
+from app.services.tidal_http import shared_http_session
+from app.services.tidal_resilience import (
+    TidalAuthError,
+    TidalError,
+    call_with_retry,
+)
+
+import functools
 import time
-from threading import Lock
+from contextlib import contextmanager
+from threading import Lock, RLock
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import tidalapi
+
+# tidalapi (and requests underneath it) is imported lazily so that importing the
+# API routers stays cheap; the first Tidal call pays for it instead.
+_tidalapi_lock = Lock()
+
+
+def _patch_tidalapi(tidalapi_module):
+    # Monkeypatch tidalapi.Session.parse_track to handle errors gracefully
+    # This prevents the entire sync from failing if one track fails to parse
+    try:
+        if not getattr(tidalapi_module.Session, "_patched_parse_track", False):
+            _original_parse_track = tidalapi_module.Session.parse_track
+
+            def _safe_parse_track(self, obj, album=None):
+                # Called once per track, so time it on the enclosing span
+                # rather than opening a span per track
+                span = current_span()
+                start = time.perf_counter()
+                try:
+                    return _original_parse_track(self, obj, album)
+                except Exception as e:
+                    print(f"[HandleError] Error parsing track: {e}")
+                    span.add("tidal.parse_track.errors", 1)
+                    return None
+                finally:
+                    span.add("tidal.parse_track.count", 1)
+                    span.add(
+                        "tidal.parse_track.ms", (time.perf_counter() - start) * 1000
+                    )
 
-# Monkeypatch tidalapi.Session.parse_track to handle errors gracefully
-# This prevents the entire sync from failing if one track fails to parse
-try:
-    if not getattr(tidalapi.Session, "_patched_parse_track", False):
-        _original_parse_track = tidalapi.Session.parse_track
+            tidalapi_module.Session.parse_track = _safe_parse_track
+            tidalapi_module.Session._patched_parse_track = True
+            print("Successfully monkeypatched tidalapi.Session.parse_track")
 
-        def _safe_parse_track(self, obj, album=None):
-            try:
-                return _original_parse_track(self, obj, album)
-            except Exception as e:
-                print(f"[HandleError] Error parsing track: {e}")
-                return None
+        requests_class = tidalapi_module.request.Requests
+        if not getattr(requests_class, "_traced_basic_request", False):
+            _original_basic_request = requests_class.basic_request
+
+            def _traced_basic_request(self, method, path, *args, **kwargs):
+                with start_span(
+                    "tidal.http", **{"http.method": method, "http.target": path}
+                ) as span:
+                    response = _original_basic_request(
+                        self, method, path, *args, **kwargs
+                    )
+                    span.set_attribute("http.status_code", response.status_code)
+                    return response
+
+            requests_class.basic_request = _traced_basic_request
+            requests_class._traced_basic_request = True
+    except Exception as e:
+        print(f"Failed to monkeypatch tidalapi: {e}")
 
-        tidalapi.Session.parse_track = _safe_parse_track
-        tidalapi.Session._patched_parse_track = True
-        print("Successfully monkeypatched tidalapi.Session.parse_track")
-except Exception as e:
-    print(f"Failed to monkeypatch tidalapi: {e}")
+
+def _import_tidalapi():
+    """Import tidalapi on first use and apply our patches exactly once."""
+    with _tidalapi_lock:
+        import tidalapi
+
+        _patch_tidalapi(tidalapi)
+    return tidalapi
+
+
+def _point_session_at(session: "tidalapi.Session", base_url: str) -> None:
+    """Send a session's API traffic to another host (e.g. a local stand-in)."""
+    base_url = base_url.rstrip("/")
+    session.config.api_v1_location = f"{base_url}/v1/"
+    session.config.api_v2_location = f"{base_url}/v2/"
+    session.config.openapi_v2_location = f"{base_url}/openapi/v2/"
+    session.config.api_oauth2_token = f"{base_url}/v1/oauth2/token"
 
 
 class RateLimiter:
@@ -32,33 +101,88 @@ class RateLimiter:
         self.calls = []
         self.lock = Lock()
 
-    def wait(self):
+    def reserve(self) -> float:
+        """
+        Claim the next free call slot and return how long to wait for it.
+        Slots are claimed without sleeping, so threads and asyncio tasks can
+        share one budget.
+        """
         with self.lock:
             now = time.time()
             self.calls = [t for t in self.calls if now - t < self.period]
+            slot = now
             if len(self.calls) >= self.max_calls:
-                sleep_time = self.period - (now - self.calls[0])
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                self.calls = [t for t in self.calls if time.time() - t < self.period]
-            self.calls.append(time.time())
+                slot = max(now, self.calls[-self.max_calls] + self.period)
+            self.calls.append(slot)
+            return slot - now
+
+    def wait(self):
+        with start_span("tidal.rate_limit_wait"), TIDAL_RATE_LIMIT_WAIT.time():
+            delay = self.reserve()
+            if delay > 0:
+                time.sleep(delay)
 
 
 rate_limiter = RateLimiter(5, 1.0)
 
+# Largest page Tidal serves for playlist items
+PLAYLIST_PAGE_SIZE = 100
+
+
+def cover_url(cover_id: str, width: int = 320, height: int = 320) -> str:
+    if not cover_id:
+        return None
+    if cover_id.startswith("http"):
+        return cover_id
+    # Replace hyphens with slashes
+    path = cover_id.replace("-", "/")
+    return f"https://resources.tidal.com/images/{path}/{width}x{height}.jpg"
+
+
+def _observed(method):
+    """
+    Record latency and a trace span for a TidalService method under its name.
+    Methods that swallow their errors count them in TIDAL_CALL_ERRORS themselves.
+    """
+    histogram = TIDAL_CALL_DURATION.labels(method.__name__)
+    errors = TIDAL_CALL_ERRORS.labels(method.__name__)
+
+    span_name = f"tidal.{method.__name__}"
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with start_span(span_name), histogram.time():
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+
+    return wrapper
+
 
 class TidalService:
     def __init__(self):
-        self.session = tidalapi.Session()
+        self._session = None
+        self._session_lock = Lock()
+        # Held by whoever runs a multi-call job as one user (see logged_in_as)
+        self._login_lock = RLock()
+
+    @property
+    def session(self) -> "tidalapi.Session":
+        """The tidalapi session, created on first access."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = _import_tidalapi().Session()
+                    session.request_session = shared_http_session()
+                    if settings.TIDAL_API_URL:
+                        _point_session_at(session, settings.TIDAL_API_URL)
+                    self._session = session
+        return self._session
 
     def _get_cover_url(self, cover_id: str, width: int = 320, height: int = 320) -> str:
-        if not cover_id:
-            return None
-        if cover_id.startswith("http"):
-            return cover_id
-        # Replace hyphens with slashes
-        path = cover_id.replace("-", "/")
-        return f"https://resources.tidal.com/images/{path}/{width}x{height}.jpg"
+        return cover_url(cover_id, width, height)
 
     def start_oauth_login(self):
         login, _ = self.session.login_oauth()
@@ -103,247 +227,207 @@ class TidalService:
             return True
         return False
 
+    @_observed
     def load_session(self, user_id: int, session: Session):
         token_record = session.exec(
             select(TidalToken).where(TidalToken.user_id == user_id)
         ).first()
 
         if token_record:
-            restored_session = self.session.load_oauth_session(
-                token_record.token_type,
-                token_record.access_token,
-                token_record.refresh_token,
-                token_record.expiry_time,
-            )
-            return restored_session
+            try:
+                return call_with_retry(
+                    "load_session",
+                    lambda: self.session.load_oauth_session(
+                        token_record.token_type,
+                        token_record.access_token,
+                        token_record.refresh_token,
+                        token_record.expiry_time,
+                    ),
+                    before_attempt=rate_limiter.wait,
+                )
+            except TidalAuthError as e:
+                print(f"Tidal login expired: {e}")
+                return False
         return False
 
+    @contextmanager
+    def logged_in_as(self, user_id: int, session: Session) -> Iterator[bool]:
+        """
+        Switch the shared Tidal login to ``user_id`` and keep it for the whole
+        block, yielding whether their session could be loaded. The service
+        holds one login per process, and calls accept whichever is current, so
+        jobs that must not run as another user (syncs) wait for each other.
+        """
+        with self._login_lock:
+            yield bool(self.load_session(user_id, session))
+
+    def _ensure_login(self, user_id: int = None, session: Session = None) -> bool:
+        if self.session.check_login():
+            return True
+        if user_id and session:
+            return bool(self.load_session(user_id, session))
+        return False
+
+    def _require_login(self, user_id: int = None, session: Session = None) -> None:
+        # Reads feed syncs, which must not mistake "not logged in" for "empty"
+        if not self._ensure_login(user_id, session):
+            raise TidalAuthError("Tidal not connected or session expired")
+
+    def _song_dict(self, track) -> dict:
+        # Handle cover URL safely
+        cover_url = None
+        if hasattr(track.album, "cover") and track.album.cover:
+            cover_url = self._get_cover_url(str(track.album.cover))
+
+        return {
+            "tidal_id": track.id,
+            "title": track.name,
+            "artist": track.artist.name,
+            "album": track.album.name,
+            "cover_url": cover_url,
+            "duration": track.duration,
+            "isrc": getattr(track, "isrc", None),
+        }
+
+    @_observed
     def search_tracks(
         self, query: str, limit: int = 10, user_id: int = None, session: Session = None
     ):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return []
-            else:
-                return []
+        if not self._ensure_login(user_id, session):
+            return []
 
-        rate_limiter.wait()
         # tidalapi search returns a dictionary with keys based on models requested
         # We assume 'tracks' is the key for Track model results
-        try:
+        def search():
+            tidalapi = _import_tidalapi()
             results = self.session.search(
                 query, models=[tidalapi.media.Track], limit=limit
             )
-            tracks = results["tracks"]
-
-            song_results = []
-            for track in tracks:
-                if track is None:
-                    continue
-                    # Handle cover URL safely
-                    cover_url = None
-                    if hasattr(track.album, "cover") and track.album.cover:
-                        cover_url = self._get_cover_url(str(track.album.cover))
-
-                song_results.append(
-                    {
-                        "tidal_id": track.id,
-                        "title": track.name,
-                        "artist": track.artist.name,
-                        "album": track.album.name,
-                        "cover_url": cover_url,
-                    }
-                )
-            return song_results
-        except Exception as e:
+            return [self._song_dict(t) for t in results["tracks"] if t is not None]
+
+        try:
+            return call_with_retry(
+                "search_tracks", search, before_attempt=rate_limiter.wait
+            )
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("search_tracks").inc()
             print(f"Error searching tracks: {e}")
             return []
 
+    @_observed
     def get_track(self, tidal_id: int, user_id: int = None, session: Session = None):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return None
-            else:
-                return None
+        if not self._ensure_login(user_id, session):
+            return None
 
-        rate_limiter.wait()
-        try:
+        def fetch():
             track = self.session.track(tidal_id)
             if track is None:
                 return None
             # Map to Song dict
-            cover_url = None
-            if hasattr(track.album, "cover") and track.album.cover:
-                cover_url = self._get_cover_url(str(track.album.cover))
-
-            return {
-                "tidal_id": track.id,
-                "title": track.name,
-                "artist": track.artist.name,
-                "album": track.album.name,
-                "cover_url": cover_url,
-            }
-        except Exception as e:
+            return self._song_dict(track)
+
+        try:
+            return call_with_retry("get_track", fetch, before_attempt=rate_limiter.wait)
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("get_track").inc()
             print(f"Error fetching track: {e}")
             return None
 
-    def get_user_playlists(self, user_id: int = None, session: Session = None):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return []
-            else:
-                return []
+    # The reads below feed syncs, which replace local data with what they
+    # return. They raise TidalError instead of returning an empty list so a
+    # failed fetch aborts the sync rather than wiping the playlist.
+
+    def _playlists(self) -> list:
+        user = self.session.user
+        return [
+            {
+                "tidal_id": pl.id,
+                "name": pl.name,
+                "description": pl.description,
+                # "image": pl.image, # tidalapi might not expose image directly or differently
+            }
+            for pl in user.playlists()
+        ]
 
-        rate_limiter.wait()
-        try:
-            user = self.session.user
-            playlists = user.playlists()
-
-            playlist_results = []
-            for pl in playlists:
-                playlist_results.append(
-                    {
-                        "tidal_id": pl.id,
-                        "name": pl.name,
-                        "description": pl.description,
-                        # "image": pl.image, # tidalapi might not expose image directly or differently
-                    }
-                )
-            return playlist_results
-        except Exception as e:
-            print(f"Error fetching playlists: {e}")
-            return []
+    @_observed
+    def get_user_playlists(self, user_id: int = None, session: Session = None):
+        self._require_login(user_id, session)
+        return call_with_retry(
+            "get_user_playlists", self._playlists, before_attempt=rate_limiter.wait
+        )
 
+    @_observed
     def get_playlist_tracks(
-        self, playlist_id: str, user_id: int = None, session: Session = None
+        self,
+        playlist_id: str,
+        user_id: int = None,
+        session: Session = None,
+        offset: int = 0,
+        on_page: Optional[Callable[[List[dict], int], None]] = None,
     ):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return []
-            else:
-                return []
-
-        rate_limiter.wait()
-        try:
-            playlist = self.session.playlist(playlist_id)
-            tracks = playlist.tracks()
-
-            song_results = []
-            for track in tracks:
-                if track is None:
-                    continue
-                # Handle cover URL safely
-                cover_url = None
-                if hasattr(track.album, "cover") and track.album.cover:
-                    cover_url = self._get_cover_url(str(track.album.cover))
-
-                song_results.append(
-                    {
-                        "tidal_id": track.id,
-                        "title": track.name,
-                        "artist": track.artist.name,
-                        "album": track.album.name,
-                        "cover_url": cover_url,
-                        "duration": track.duration,
-                    }
-                )
-            return song_results
-        except Exception as e:
-            print(f"Error fetching playlist tracks: {e}")
-            return []
-
+        """
+        The playlist's tracks from ``offset`` on, fetched PLAYLIST_PAGE_SIZE at
+        a time (Tidal serves one page per request). Each page is retried on
+        its own. ``on_page(songs, next_offset)`` is called after every page
+        but the last, so callers can checkpoint a long fetch and resume it
+        from ``next_offset``.
+        """
+        self._require_login(user_id, session)
+        playlist = call_with_retry(
+            "get_playlist_tracks",
+            functools.partial(self.session.playlist, playlist_id),
+            before_attempt=rate_limiter.wait,
+        )
+        songs = []
+        while offset < playlist.num_tracks:
+            page = call_with_retry(
+                "get_playlist_tracks",
+                functools.partial(
+                    playlist.tracks, limit=PLAYLIST_PAGE_SIZE, offset=offset
+                ),
+                before_attempt=rate_limiter.wait,
+            )
+            if not page:
+                break
+            # Tracks that fail to parse are None but still take up a position
+            offset += len(page)
+            page_songs = [self._song_dict(t) for t in page if t is not None]
+            songs.extend(page_songs)
+            if on_page is not None and offset < playlist.num_tracks:
+                on_page(page_songs, offset)
+        return songs
+
+    @_observed
     def get_favorite_tracks(self, user_id: int = None, session: Session = None):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return []
-            else:
-                return []
+        self._require_login(user_id, session)
 
-        rate_limiter.wait()
-        try:
+        def fetch():
             user = self.session.user
             # tidalapi < 0.7 might use user.favorites.tracks()
             # tidalapi >= 0.7 might use user.favorites.tracks()
             # We'll try the standard way
             tracks = user.favorites.tracks()
+            return [self._song_dict(t) for t in tracks if t is not None]
 
-            song_results = []
-            for track in tracks:
-                if track is None:
-                    continue
-                # Handle cover URL safely
-                cover_url = None
-                if hasattr(track.album, "cover") and track.album.cover:
-                    cover_url = self._get_cover_url(str(track.album.cover))
-
-                song_results.append(
-                    {
-                        "tidal_id": track.id,
-                        "title": track.name,
-                        "artist": track.artist.name,
-                        "album": track.album.name,
-                        "cover_url": cover_url,
-                        "duration": track.duration,
-                    }
-                )
-            return song_results
-        except Exception as e:
-            print(f"Error fetching favorite tracks: {e}")
-            return []
+        return call_with_retry(
+            "get_favorite_tracks", fetch, before_attempt=rate_limiter.wait
+        )
 
+    @_observed
     def get_mixes(self, user_id: int = None, session: Session = None):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return []
-            else:
-                return []
-
-        rate_limiter.wait()
-        try:
-            # Tidal "Mixes" are often just playlists generated by Tidal.
-            # They might be in user.playlists() or a specific endpoint.
-            # For now, let's assume they are in playlists but we might want to filter them?
-            # Or maybe there is a specific page for "My Mixes".
-            # Since the user specifically asked for "Mixes", and Tidal has "My Mixes",
-            # we might need to look for a specific method.
-            # If not found, we can try to find playlists with "Mix" in the title as a fallback
-            # or just return all playlists and let the user decide?
-            # No, the user wants a "Sync Mixes" button.
-            # Let's try to fetch all playlists and filter for those that look like mixes
-            # OR check if tidalapi has a mixes method.
-            # I'll implement a search/filter approach for now as a safe bet if I can't verify the API.
-            # But wait, `tidalapi` might have `get_mixes`.
-            # Let's try to inspect `dir(self.session)` or `dir(self.session.user)` in a separate script first?
-            # No, I'll just implement a best-effort approach.
-            # I will fetch all playlists and filter by description or name containing "Mix" or created by "Tidal".
-
-            user = self.session.user
-            playlists = user.playlists()
-
-            mix_results = []
-            for pl in playlists:
-                # Heuristic: Tidal mixes usually have "Mix" in the title or description
-                # and are often created by "Tidal" (though creator might not be exposed easily).
-                # Let's check if "Mix" is in the title.
-                if "Mix" in pl.name or "Radio" in pl.name:
-                    mix_results.append(
-                        {
-                            "tidal_id": pl.id,
-                            "name": pl.name,
-                            "description": pl.description,
-                        }
-                    )
-            return mix_results
-        except Exception as e:
-            print(f"Error fetching mixes: {e}")
-            return []
-
+        self._require_login(user_id, session)
+        # Tidal "Mixes" are often just playlists generated by Tidal.
+        # They might be in user.playlists() or a specific endpoint.
+        # I will fetch all playlists and filter by description or name containing "Mix" or created by "Tidal".
+        playlists = call_with_retry(
+            "get_user_playlists", self._playlists, before_attempt=rate_limiter.wait
+        )
+        # Heuristic: Tidal mixes usually have "Mix" in the title or description
+        # and are often created by "Tidal" (though creator might not be exposed easily).
+        # Let's check if "Mix" is in the title.
+        return [pl for pl in playlists if "Mix" in pl["name"] or "Radio" in pl["name"]]
+
+    @_observed
     def add_song_to_playlist(
         self,
         playlist_id: str,
@@ -351,22 +435,25 @@ class TidalService:
         user_id: int = None,
         session: Session = None,
     ):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return False
-            else:
-                return False
+        if not self._ensure_login(user_id, session):
+            return False
 
-        rate_limiter.wait()
-        try:
+        # Duplicates are skipped, so repeating the add after a failure is safe
+        def add():
             playlist = self.session.playlist(playlist_id)
             playlist.add(song_ids)
+
+        try:
+            call_with_retry(
+                "add_song_to_playlist", add, before_attempt=rate_limiter.wait
+            )
             return True
-        except Exception as e:
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("add_song_to_playlist").inc()
             print(f"Error adding song to playlist: {e}")
             return False
 
+    @_observed
     def remove_song_from_playlist(
         self,
         playlist_id: str,
@@ -374,22 +461,72 @@ class TidalService:
         user_id: int = None,
         session: Session = None,
     ):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return False
-            else:
-                return False
+        if not self._ensure_login(user_id, session):
+            return False
 
-        rate_limiter.wait()
-        try:
+        def remove():
             playlist = self.session.playlist(playlist_id)
             playlist.remove_by_id(int(song_id))
+
+        try:
+            # Removal is by position: repeating it after a timeout could remove
+            # the next track, so only a 429 (nothing done yet) is retried
+            call_with_retry(
+                "remove_song_from_playlist",
+                remove,
+                before_attempt=rate_limiter.wait,
+                idempotent=False,
+            )
             return True
-        except Exception as e:
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("remove_song_from_playlist").inc()
             print(f"Error removing song from playlist: {e}")
             return False
 
+    @_observed
+    def remove_songs_from_playlist(
+        self,
+        playlist_id: str,
+        song_ids: list,
+        user_id: int = None,
+        session: Session = None,
+    ):
+        """Remove the first occurrence of each track with a single Tidal call."""
+        if not self._ensure_login(user_id, session):
+            return False
+
+        def remove():
+            playlist = self.session.playlist(playlist_id)
+            remaining = {int(song_id) for song_id in song_ids}
+            indices = []
+            offset = 0
+            while remaining and offset < playlist.num_tracks:
+                page = playlist.tracks(limit=PLAYLIST_PAGE_SIZE, offset=offset)
+                if not page:
+                    break
+                for position, track in enumerate(page, start=offset):
+                    if track is not None and track.id in remaining:
+                        indices.append(position)
+                        remaining.discard(track.id)
+                offset += len(page)
+            if indices:
+                playlist.remove_by_indices(indices)
+
+        try:
+            # Removal is by position, so only a 429 (nothing done yet) is retried
+            call_with_retry(
+                "remove_songs_from_playlist",
+                remove,
+                before_attempt=rate_limiter.wait,
+                idempotent=False,
+            )
+            return True
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("remove_songs_from_playlist").inc()
+            print(f"Error removing songs from playlist: {e}")
+            return False
+
+    @_observed
     def edit_playlist(
         self,
         playlist_id: str,
@@ -398,20 +535,19 @@ class TidalService:
         user_id: int = None,
         session: Session = None,
     ):
-        if not self.session.check_login():
-            if user_id and session:
-                if not self.load_session(user_id, session):
-                    return False
-            else:
-                return False
+        if not self._ensure_login(user_id, session):
+            return False
 
-        rate_limiter.wait()
-        try:
+        def edit():
             playlist = self.session.playlist(playlist_id)
             if name:
                 playlist.edit(title=name, description=description)
+
+        try:
+            call_with_retry("edit_playlist", edit, before_attempt=rate_limiter.wait)
             return True
-        except Exception as e:
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("edit_playlist").inc()
             print(f"Error editing playlist: {e}")
             return False
 
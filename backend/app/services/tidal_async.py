@@ -0,0 +1,605 @@
+"""
+asyncio-native client for the Tidal endpoints we use.
+
+``TidalService`` goes through tidalapi and blocks a thread for every call, so
+fanning out over hundreds of playlists needs hundreds of threads.
+``AsyncTidalClient`` speaks to the same v1 API over one shared
+``httpx.AsyncClient`` per event loop, so a single worker can keep hundreds of
+requests in flight. It returns the same dicts as ``TidalService`` and handles
+errors the same way: each HTTP call is retried and circuit-broken by
+``tidal_resilience``, reads that feed syncs raise ``TidalError``, and the
+others log and return ``[]``/``None``/``False``.
+
+Calls draw from the same ``rate_limiter`` budget as ``TidalService``; waiting
+for a slot sleeps the task, not the thread. Paged endpoints fetch the first
+page, then the remaining pages concurrently.
+
+httpx is imported on first use; HTTP/2 is negotiated when ``h2`` is installed.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import (
+    TIDAL_CALL_DURATION,
+    TIDAL_CALL_ERRORS,
+    TIDAL_RATE_LIMIT_WAIT,
+)
+from app.core.tracing import start_span
+from app.services.tidal import RateLimiter, _import_tidalapi, cover_url, rate_limiter
+from app.services.tidal_resilience import (
+    TidalAuthError,
+    TidalError,
+    TidalNotFoundError,
+    _retry_after,
+    call_with_retry_async,
+    error_for_status,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+TIDAL_API_URL = "https://api.tidal.com"
+TIDAL_AUTH_URL = "https://auth.tidal.com"
+
+# httpx logs every request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Largest page Tidal serves for playlist items and favorites
+PAGE_SIZE = 100
+
+
+@dataclass
+class _Credentials:
+    token_type: str
+    access_token: str
+    refresh_token: Optional[str]
+    expiry_time: datetime
+    session_id: Optional[str] = None
+    country_code: Optional[str] = None
+    tidal_user_id: Optional[int] = None
+
+
+def song_from_track(track: dict) -> Optional[dict]:
+    """Map a Tidal track object to the song dict ``TidalService`` returns."""
+    try:
+        artist = track.get("artist") or track["artists"][0]
+        album = track.get("album") or {}
+        return {
+            "tidal_id": track["id"],
+            "title": track["title"],
+            "artist": artist["name"],
+            "album": album.get("title"),
+            "cover_url": cover_url(str(album["cover"])) if album.get("cover") else None,
+            "duration": track.get("duration"),
+            "isrc": track.get("isrc"),
+        }
+    except (KeyError, IndexError, TypeError) as e:
+        print(f"[HandleError] Error parsing track: {e}")
+        return None
+
+
+def playlist_from_json(playlist: dict) -> dict:
+    return {
+        "tidal_id": playlist["uuid"],
+        "name": playlist["title"],
+        "description": playlist.get("description"),
+    }
+
+
+def _load_token(user_id: int) -> Optional[_Credentials]:
+    from sqlmodel import Session, select
+
+    from app.core.db import engine
+    from app.models.tidal_token import TidalToken
+
+    with Session(engine) as session:
+        record = session.exec(
+            select(TidalToken).where(TidalToken.user_id == user_id)
+        ).first()
+        if record is None:
+            return None
+        return _Credentials(
+            record.token_type,
+            record.access_token,
+            record.refresh_token,
+            record.expiry_time,
+        )
+
+
+def _store_token(user_id: int, credentials: _Credentials) -> None:
+    from sqlmodel import Session, select
+
+    from app.core.db import engine
+    from app.models.tidal_token import TidalToken
+
+    with Session(engine) as session:
+        record = session.exec(
+            select(TidalToken).where(TidalToken.user_id == user_id)
+        ).first()
+        if record is None:
+            return
+        record.access_token = credentials.access_token
+        record.refresh_token = credentials.refresh_token
+        record.expiry_time = credentials.expiry_time
+        session.add(record)
+        session.commit()
+
+
+def _observed(method):
+    """Async counterpart of ``tidal._observed``; metrics are labelled async_<name>."""
+    name = f"async_{method.__name__}"
+    histogram = TIDAL_CALL_DURATION.labels(name)
+    errors = TIDAL_CALL_ERRORS.labels(name)
+    span_name = f"tidal.{name}"
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with start_span(span_name):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+class AsyncTidalClient:
+    def __init__(self, base_url: Optional[str] = None):
+        base_url = (base_url or settings.TIDAL_API_URL or TIDAL_API_URL).rstrip("/")
+        self.api_url = f"{base_url}/v1/"
+        auth_url = TIDAL_AUTH_URL if base_url == TIDAL_API_URL else base_url
+        self.token_url = f"{auth_url}/v1/oauth2/token"
+        self._http: Optional["httpx.AsyncClient"] = None
+        self._credentials: Dict[int, _Credentials] = {}
+        self._login_locks: Dict[int, asyncio.Lock] = {}
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        if self._http is None:
+            try:
+                import httpx
+            except ImportError as e:
+                raise RuntimeError(
+                    "AsyncTidalClient needs httpx (pip install httpx)"
+                ) from e
+            try:
+                import h2  # noqa: F401
+
+                http2 = True
+            except ImportError:
+                http2 = False
+            self._http = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.TIDAL_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.TIDAL_POOL_MAXSIZE,
+                ),
+                # No pool timeout: requests queue for a connection instead
+                timeout=httpx.Timeout(
+                    connect=settings.TIDAL_HTTP_CONNECT_TIMEOUT,
+                    read=settings.TIDAL_HTTP_READ_TIMEOUT,
+                    write=settings.TIDAL_HTTP_READ_TIMEOUT,
+                    pool=None,
+                ),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _rate_limit(self) -> None:
+        with start_span("tidal.rate_limit_wait"):
+            start = time.perf_counter()
+            delay = rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            TIDAL_RATE_LIMIT_WAIT.observe(time.perf_counter() - start)
+
+    async def _login(
+        self, user_id: int, reload: bool = False
+    ) -> Optional[_Credentials]:
+        """Credentials for ``user_id``, with the Tidal session looked up once."""
+        credentials = self._credentials.get(user_id)
+        if credentials is not None and not reload:
+            return credentials
+        lock = self._login_locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            current = self._credentials.get(user_id)
+            if current is not None and current is not credentials:
+                return current
+            credentials = await run_in_threadpool(_load_token, user_id)
+            if credentials is None:
+                self._credentials.pop(user_id, None)
+                return None
+            if credentials.expiry_time <= datetime.utcnow():
+                if not await self._refresh(user_id, credentials):
+                    return None
+            response = await self._send("GET", "sessions", credentials)
+            if response.status_code == 401 and await self._refresh(
+                user_id, credentials
+            ):
+                response = await self._send("GET", "sessions", credentials)
+            if response.status_code in (401, 403):
+                print(f"Error loading Tidal session: HTTP {response.status_code}")
+                return None
+            if response.status_code != 200:
+                raise error_for_status(response.status_code, "Loading Tidal session")
+            info = response.json()
+            credentials.session_id = info["sessionId"]
+            credentials.country_code = info["countryCode"]
+            credentials.tidal_user_id = info["userId"]
+            self._credentials[user_id] = credentials
+            return credentials
+
+    async def _refresh(self, user_id: int, credentials: _Credentials) -> bool:
+        """Exchange the refresh token for a new access token and store it."""
+        if not credentials.refresh_token:
+            return False
+        # Only for the client id/secret the tokens were issued to
+        config = _import_tidalapi().Config()
+        await self._rate_limit()
+        response = await self.http.post(
+            self.token_url,
+            data={
+                "grant_type": "refresh_token",
+                "refresh_token": credentials.refresh_token,
+                "client_id": config.client_id,
+                "client_secret": config.client_secret,
+            },
+        )
+        if response.status_code != 200:
+            print("The Tidal refresh token has expired, a new login is required.")
+            return False
+        token = response.json()
+        credentials.access_token = token["access_token"]
+        credentials.refresh_token = token.get(
+            "refresh_token", credentials.refresh_token
+        )
+        credentials.expiry_time = datetime.utcnow() + timedelta(
+            seconds=token.get("expires_in", 0)
+        )
+        await run_in_threadpool(_store_token, user_id, credentials)
+        return True
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        credentials: _Credentials,
+        params: Optional[dict] = None,
+        data: Optional[dict] = None,
+        headers: Optional[dict] = None,
+    ) -> "httpx.Response":
+        await self._rate_limit()
+        request_params = {"limit": 1000}
+        if credentials.session_id:
+            request_params["sessionId"] = credentials.session_id
+            request_params["countryCode"] = credentials.country_code
+        request_params.update(params or {})
+        request_headers = {
+            "authorization": f"{credentials.token_type} {credentials.access_token}"
+        }
+        request_headers.update(headers or {})
+        with start_span(
+            "tidal.http", **{"http.method": method, "http.target": path}
+        ) as span:
+            response = await self.http.request(
+                method,
+                self.api_url + path,
+                params=request_params,
+                data=data,
+                headers=request_headers,
+            )
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    async def _request(
+        self,
+        user_id: int,
+        endpoint: str,
+        method: str,
+        path: str,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> "httpx.Response":
+        """One API call, retried and circuit-broken under ``endpoint``."""
+
+        async def attempt():
+            credentials = await self._login(user_id)
+            if credentials is None:
+                raise TidalAuthError("Tidal not connected or session expired")
+            response = await self._send(method, path, credentials, **kwargs)
+            if response.status_code == 401:
+                # Token expired or replaced by a new login: reload and retry once
+                credentials = await self._login(user_id, reload=True)
+                if credentials is None:
+                    raise TidalAuthError("Tidal login expired", 401)
+                response = await self._send(method, path, credentials, **kwargs)
+            if response.status_code >= 400:
+                try:
+                    message = response.json().get("userMessage", response.text)
+                except ValueError:
+                    message = response.text
+                raise error_for_status(
+                    response.status_code,
+                    f"{method} {path}: {message}",
+                    _retry_after(response.headers),
+                )
+            return response
+
+        return await call_with_retry_async(endpoint, attempt, idempotent=idempotent)
+
+    async def _get_json(self, user_id: int, endpoint: str, path: str, **params):
+        response = await self._request(user_id, endpoint, "GET", path, params=params)
+        return response.json()
+
+    async def _get_all(self, user_id: int, endpoint: str, path: str) -> list:
+        """Every item of a paged endpoint; pages after the first run concurrently."""
+        first = await self._get_json(user_id, endpoint, path, limit=PAGE_SIZE, offset=0)
+        items = list(first.get("items", []))
+        total = first.get("totalNumberOfItems", len(items))
+        # The server may serve smaller pages than asked for
+        page_size = len(items) or PAGE_SIZE
+        pages = await asyncio.gather(
+            *(
+                self._get_json(user_id, endpoint, path, limit=page_size, offset=offset)
+                for offset in range(len(items), total, page_size)
+            )
+        )
+        for page in pages:
+            items.extend(page.get("items", []))
+        return items
+
+    async def _playlist_etag(
+        self, user_id: int, endpoint: str, playlist_id: str
+    ) -> Optional[str]:
+        response = await self._request(
+            user_id, endpoint, "GET", f"playlists/{playlist_id}"
+        )
+        return response.headers.get("etag")
+
+    async def _tidal_user_id(self, user_id: int) -> int:
+        credentials = await self._login(user_id)
+        if credentials is None:
+            raise TidalAuthError("Tidal not connected or session expired")
+        return credentials.tidal_user_id
+
+    @_observed
+    async def search_tracks(self, query: str, limit: int = 10, user_id: int = None):
+        try:
+            results = await self._get_json(
+                user_id,
+                "search_tracks",
+                "search",
+                query=query,
+                types="TRACKS",
+                limit=limit,
+            )
+            tracks = results.get("tracks", {}).get("items", [])
+            return [song for song in map(song_from_track, tracks) if song]
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("async_search_tracks").inc()
+            print(f"Error searching tracks: {e}")
+            return []
+
+    @_observed
+    async def get_track(self, tidal_id: int, user_id: int = None):
+        try:
+            track = await self._get_json(user_id, "get_track", f"tracks/{tidal_id}")
+            return song_from_track(track)
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("async_get_track").inc()
+            print(f"Error fetching track: {e}")
+            return None
+
+    @_observed
+    async def fetch_tracks(
+        self,
+        tidal_ids: List[int],
+        user_id: int = None,
+        concurrency: int = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> Dict[int, Optional[dict]]:
+        """
+        Tidal track objects for many ids, keyed by id. The v1 API has no
+        multi-id track lookup, so tracks are fetched one by one with at most
+        ``concurrency`` (default ``SONG_REFRESH_CONCURRENCY``) requests in
+        flight. Background callers pass a ``limiter`` of their own, which each
+        lookup waits for before drawing on the shared budget.
+
+        Tracks Tidal doesn't have map to None; lookups that fail otherwise are
+        left out. Raises ``TidalAuthError`` if the login isn't usable.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.SONG_REFRESH_CONCURRENCY)
+
+        async def fetch(tidal_id: int) -> Optional[dict]:
+            async with semaphore:
+                if limiter is not None:
+                    delay = limiter.reserve()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                try:
+                    return await self._get_json(
+                        user_id, "get_track", f"tracks/{tidal_id}"
+                    )
+                except TidalNotFoundError:
+                    return None
+
+        results = await asyncio.gather(
+            *(fetch(tidal_id) for tidal_id in tidal_ids), return_exceptions=True
+        )
+        tracks = {}
+        for tidal_id, result in zip(tidal_ids, results):
+            if isinstance(result, TidalAuthError):
+                raise result
+            if isinstance(result, TidalError):
+                print(f"Error fetching track {tidal_id}: {result}")
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            tracks[tidal_id] = result
+        return tracks
+
+    @_observed
+    async def get_tracks(
+        self, tidal_ids: List[int], user_id: int = None, concurrency: int = None
+    ) -> Dict[int, Optional[dict]]:
+        """Songs for many Tidal ids; see ``fetch_tracks``."""
+        tracks = await self.fetch_tracks(tidal_ids, user_id, concurrency)
+        return {
+            tidal_id: song_from_track(track) if track else None
+            for tidal_id, track in tracks.items()
+        }
+
+    # As in TidalService, reads that feed syncs raise TidalError rather than
+    # returning an empty list, so a failed fetch can't wipe local data.
+
+    async def _playlists(self, user_id: int) -> List[dict]:
+        tidal_user_id = await self._tidal_user_id(user_id)
+        items = await self._get_all(
+            user_id, "get_user_playlists", f"users/{tidal_user_id}/playlists"
+        )
+        return [playlist_from_json(playlist) for playlist in items]
+
+    @_observed
+    async def get_user_playlists(self, user_id: int = None):
+        return await self._playlists(user_id)
+
+    @_observed
+    async def get_playlist_tracks(self, playlist_id: str, user_id: int = None):
+        tracks = await self._get_all(
+            user_id, "get_playlist_tracks", f"playlists/{playlist_id}/tracks"
+        )
+        return [song for song in map(song_from_track, tracks) if song]
+
+    @_observed
+    async def get_favorite_tracks(self, user_id: int = None):
+        tidal_user_id = await self._tidal_user_id(user_id)
+        items = await self._get_all(
+            user_id, "get_favorite_tracks", f"users/{tidal_user_id}/favorites/tracks"
+        )
+        tracks = [item.get("item") for item in items]
+        return [song for song in map(song_from_track, tracks) if song]
+
+    @_observed
+    async def get_mixes(self, user_id: int = None):
+        # Same heuristic as TidalService.get_mixes
+        playlists = await self._playlists(user_id)
+        return [
+            playlist
+            for playlist in playlists
+            if "Mix" in playlist["name"] or "Radio" in playlist["name"]
+        ]
+
+    @_observed
+    async def add_song_to_playlist(
+        self, playlist_id: str, song_ids: list, user_id: int = None
+    ):
+        endpoint = "add_song_to_playlist"
+        try:
+            etag = await self._playlist_etag(user_id, endpoint, playlist_id)
+            # Duplicates are skipped, so repeating the add after a failure is safe
+            await self._request(
+                user_id,
+                endpoint,
+                "POST",
+                f"playlists/{playlist_id}/items",
+                data={
+                    "onArtifactNotFound": "SKIP",
+                    "trackIds": ",".join(str(song_id) for song_id in song_ids),
+                    "onDupes": "SKIP",
+                },
+                headers={"If-None-Match": etag} if etag else None,
+            )
+            return True
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("async_add_song_to_playlist").inc()
+            print(f"Error adding song to playlist: {e}")
+            return False
+
+    @_observed
+    async def remove_song_from_playlist(
+        self, playlist_id: str, song_id: int, user_id: int = None
+    ):
+        endpoint = "remove_song_from_playlist"
+        try:
+            tracks, etag = await asyncio.gather(
+                self._get_all(user_id, endpoint, f"playlists/{playlist_id}/tracks"),
+                self._playlist_etag(user_id, endpoint, playlist_id),
+            )
+            track_ids = [track["id"] for track in tracks]
+            if int(song_id) not in track_ids:
+                return False
+            # Removal is by position, so only a 429 (nothing done yet) is retried
+            await self._request(
+                user_id,
+                endpoint,
+                "DELETE",
+                f"playlists/{playlist_id}/items/{track_ids.index(int(song_id))}",
+                idempotent=False,
+                headers={"If-None-Match": etag} if etag else None,
+            )
+            return True
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("async_remove_song_from_playlist").inc()
+            print(f"Error removing song from playlist: {e}")
+            return False
+
+    @_observed
+    async def edit_playlist(
+        self,
+        playlist_id: str,
+        name: str = None,
+        description: str = None,
+        user_id: int = None,
+    ):
+        endpoint = "edit_playlist"
+        try:
+            if name:
+                etag = await self._playlist_etag(user_id, endpoint, playlist_id)
+                await self._request(
+                    user_id,
+                    endpoint,
+                    "POST",
+                    f"playlists/{playlist_id}",
+                    data={"title": name, "description": description or ""},
+                    headers={"If-None-Match": etag} if etag else None,
+                )
+            return True
+        except TidalError as e:
+            TIDAL_CALL_ERRORS.labels("async_edit_playlist").inc()
+            print(f"Error editing playlist: {e}")
+            return False
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncTidalClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def async_tidal_client() -> AsyncTidalClient:
+    """
+    The shared client of the running event loop (one per uvicorn worker).
+    httpx connections belong to the loop that opened them, hence one per loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncTidalClient()
+    return client
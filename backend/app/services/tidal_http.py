@@ -0,0 +1,146 @@
+"""
+Shared HTTP connection pool for Tidal traffic.
+
+tidalapi gives every Session its own ``requests.Session`` with the default
+adapter: at most 10 pooled connections per host, no timeout, and extra
+connections opened and thrown away under load. Every tidalapi Session we
+create uses this one tuned session instead, so connections (and their TLS
+handshakes) are reused across users and calls.
+
+requests only speaks HTTP/1.1, so HTTP/2 is not available on this path;
+pooled keep-alive connections give most of the benefit for our request mix.
+"""
+
+from threading import Lock
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY, Counter, Gauge
+
+if TYPE_CHECKING:
+    import requests
+
+_shared_session: Optional["requests.Session"] = None
+_shared_session_lock = Lock()
+
+
+def _build_session() -> "requests.Session":
+    # Imported here: requests is kept off the API's import path
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _BoundedWait:
+        """
+        Pool mixin bounding the wait for a free connection. requests never
+        passes ``pool_timeout``, so a blocking pool would otherwise wait
+        forever; urllib3 raises EmptyPoolError instead, which call_with_retry
+        treats as a transient failure.
+        """
+
+        def urlopen(self, *args, **kwargs):
+            if kwargs.get("pool_timeout") is None:
+                kwargs["pool_timeout"] = settings.TIDAL_POOL_TIMEOUT
+            return super().urlopen(*args, **kwargs)
+
+    class _HTTPPool(_BoundedWait, HTTPConnectionPool):
+        pass
+
+    class _HTTPSPool(_BoundedWait, HTTPSConnectionPool):
+        pass
+
+    class _TimeoutAdapter(HTTPAdapter):
+        """HTTPAdapter applying a default timeout, which requests lacks."""
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": _HTTPPool,
+                "https": _HTTPSPool,
+            }
+
+        def send(self, request, timeout=None, **kwargs):
+            if timeout is None:
+                timeout = (
+                    settings.TIDAL_HTTP_CONNECT_TIMEOUT,
+                    settings.TIDAL_HTTP_READ_TIMEOUT,
+                )
+            return super().send(request, timeout=timeout, **kwargs)
+
+    adapter = _TimeoutAdapter(
+        pool_connections=settings.TIDAL_POOL_HOSTS,
+        pool_maxsize=settings.TIDAL_POOL_MAXSIZE,
+        # Wait (up to TIDAL_POOL_TIMEOUT) for a free connection rather than
+        # opening one we'd discard
+        pool_block=settings.TIDAL_POOL_BLOCK,
+        max_retries=0,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def shared_http_session() -> "requests.Session":
+    """The process-wide requests.Session used for all Tidal calls."""
+    global _shared_session
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = _build_session()
+    return _shared_session
+
+
+def pool_stats() -> list:
+    """Per-host connection pool usage of the shared session."""
+    if _shared_session is None:
+        return []
+    stats = []
+    adapter = _shared_session.get_adapter("https://")
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None or pool.pool is None:
+            continue
+        # The queue holds idle connections plus placeholders for ones not yet
+        # opened, so whatever is missing from it is checked out
+        in_use = pool.pool.maxsize - pool.pool.qsize()
+        stats.append(
+            {
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "in_use": in_use,
+                "max": pool.pool.maxsize,
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+        )
+    return stats
+
+
+def _pool_metrics():
+    in_use = Gauge(
+        "tidal_http_pool_in_use",
+        "Connections checked out of the Tidal HTTP pool",
+        ("host",),
+    )
+    size = Gauge(
+        "tidal_http_pool_max", "Size of the Tidal HTTP pool per host", ("host",)
+    )
+    opened = Counter(
+        "tidal_http_connections_opened",
+        "Connections opened to Tidal (low relative to requests means reuse)",
+        ("host",),
+    )
+    requests_made = Counter(
+        "tidal_http_pool_requests", "Requests sent through the pool", ("host",)
+    )
+    for stat in pool_stats():
+        in_use.labels(stat["host"]).set(stat["in_use"])
+        size.labels(stat["host"]).set(stat["max"])
+        opened.labels(stat["host"]).inc(stat["connections"])
+        requests_made.labels(stat["host"]).inc(stat["requests"])
+    return [in_use, size, opened, requests_made]
+
+
+REGISTRY.register_collector(_pool_metrics)
@@ -0,0 +1,306 @@
+"""
+Retries, backoff and circuit breaking for Tidal calls.
+
+Failures are classified into ``TidalError`` subclasses:
+
+- ``TidalRateLimitedError`` (429) and ``TidalUnavailableError`` (5xx, 408,
+  timeouts, connection failures) are transient and retried with full-jitter
+  exponential backoff, waiting at least as long as the server's Retry-After;
+- ``TidalAuthError`` (401/403, expired or missing login), ``TidalNotFoundError``
+  (404) and ``TidalRequestError`` (anything else) are not retried.
+
+Every endpoint has a ``CircuitBreaker``: after ``TIDAL_BREAKER_THRESHOLD``
+consecutive transient failures it opens and calls fail fast with
+``CircuitOpenError`` for ``TIDAL_BREAKER_RESET_SECONDS``, after which a single
+probe call decides whether it closes again. This keeps a Tidal incident from
+turning into a retry storm from every sync.
+
+Calls that aren't safe to repeat (removing a playlist item by index) pass
+``idempotent=False`` and are only retried after a 429, which Tidal sends before
+doing any work.
+"""
+
+import asyncio
+import itertools
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY, TIDAL_RETRIES, Gauge
+
+
+class TidalError(Exception):
+    """A Tidal call failed; ``transient`` errors may succeed if retried."""
+
+    transient = False
+    reason = "error"
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class TidalUnavailableError(TidalError):
+    transient = True
+    reason = "unavailable"
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message, status)
+        self.retry_after = retry_after
+
+
+class TidalRateLimitedError(TidalUnavailableError):
+    reason = "rate_limited"
+
+
+class CircuitOpenError(TidalUnavailableError):
+    reason = "circuit_open"
+
+
+class TidalAuthError(TidalError):
+    reason = "auth"
+
+
+class TidalNotFoundError(TidalError):
+    reason = "not_found"
+
+
+class TidalRequestError(TidalError):
+    reason = "request"
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _response_of(error: BaseException):
+    """The HTTP response behind an error (tidalapi chains its own to HTTPError)."""
+    while error is not None:
+        response = getattr(error, "response", None)
+        if response is not None and hasattr(response, "status_code"):
+            return response
+        error = error.__cause__
+    return None
+
+
+def error_for_status(
+    status: int, message: str, retry_after: Optional[float] = None
+) -> TidalError:
+    if status == 429:
+        return TidalRateLimitedError(message, status, retry_after)
+    if status >= 500 or status == 408:
+        return TidalUnavailableError(message, status, retry_after)
+    if status in (401, 403):
+        return TidalAuthError(message, status)
+    if status == 404:
+        return TidalNotFoundError(message, status)
+    return TidalRequestError(message, status)
+
+
+def classify(error: BaseException) -> TidalError:
+    """Map an exception from tidalapi, requests or httpx to a ``TidalError``."""
+    if isinstance(error, TidalError):
+        return error
+    message = f"{type(error).__name__}: {error}"
+    response = _response_of(error)
+    if response is not None:
+        return error_for_status(
+            response.status_code, message, _retry_after(response.headers)
+        )
+    name = type(error).__name__
+    if name == "TooManyRequests":
+        retry_after = getattr(error, "retry_after", -1)
+        return TidalRateLimitedError(
+            message, 429, retry_after if retry_after >= 0 else None
+        )
+    if name == "AuthenticationError":
+        return TidalAuthError(message)
+    if name == "ObjectNotFound":
+        return TidalNotFoundError(message, 404)
+    # Connection failures and timeouts (requests, urllib3 and httpx all raise
+    # their own types, none of which carry a response)
+    module = type(error).__module__.split(".", 1)[0]
+    if module in ("requests", "urllib3", "httpx", "httpcore") or isinstance(
+        error, (ConnectionError, TimeoutError)
+    ):
+        return TidalUnavailableError(message)
+    return TidalRequestError(message)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = Lock()
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(
+                f"Tidal {self.name} is failing, not calling it for now",
+                retry_after=max(remaining, 0.0) or None,
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = Lock()
+
+
+def circuit_breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(
+                endpoint,
+                CircuitBreaker(
+                    endpoint,
+                    settings.TIDAL_BREAKER_THRESHOLD,
+                    settings.TIDAL_BREAKER_RESET_SECONDS,
+                ),
+            )
+    return breaker
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry."""
+    ceiling = min(
+        settings.TIDAL_RETRY_MAX_DELAY, settings.TIDAL_RETRY_BASE_DELAY * 2**attempt
+    )
+    return random.uniform(0, ceiling)
+
+
+def _retry_delay(error: TidalError, attempt: int, idempotent: bool) -> Optional[float]:
+    """Seconds to wait before retrying, or None to give up."""
+    if not error.transient or isinstance(error, CircuitOpenError):
+        return None
+    if not idempotent and not isinstance(error, TidalRateLimitedError):
+        return None
+    if attempt + 1 >= settings.TIDAL_RETRY_ATTEMPTS:
+        return None
+    delay = backoff_delay(attempt)
+    if error.retry_after is not None:
+        if error.retry_after > settings.TIDAL_RETRY_MAX_DELAY:
+            return None
+        delay = max(delay, error.retry_after)
+    return delay
+
+
+def _record(breaker: CircuitBreaker, error: TidalError) -> None:
+    # Only outages count against the breaker; a 404 means Tidal is answering
+    if error.transient:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def call_with_retry(
+    endpoint: str,
+    func: Callable,
+    before_attempt: Optional[Callable[[], None]] = None,
+    idempotent: bool = True,
+):
+    """
+    Run ``func`` (one logical Tidal call), retrying transient failures.
+    Raises the classified ``TidalError`` once retries are exhausted.
+    """
+    breaker = circuit_breaker(endpoint)
+    for attempt in itertools.count():
+        breaker.before_call()
+        if before_attempt is not None:
+            before_attempt()
+        try:
+            result = func()
+        except Exception as e:
+            error = classify(e)
+            _record(breaker, error)
+            delay = _retry_delay(error, attempt, idempotent)
+            if delay is None:
+                raise error from e
+            TIDAL_RETRIES.labels(endpoint, error.reason).inc()
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_with_retry_async(endpoint: str, func: Callable, idempotent: bool = True):
+    """``call_with_retry`` for coroutine functions; backoff sleeps the task."""
+    breaker = circuit_breaker(endpoint)
+    for attempt in itertools.count():
+        breaker.before_call()
+        try:
+            result = await func()
+        except Exception as e:
+            error = classify(e)
+            _record(breaker, error)
+            delay = _retry_delay(error, attempt, idempotent)
+            if delay is None:
+                raise error from e
+            TIDAL_RETRIES.labels(endpoint, error.reason).inc()
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def _breaker_metrics():
+    state = Gauge(
+        "tidal_circuit_open",
+        "1 while the circuit breaker of a Tidal endpoint is open or half-open",
+        ("endpoint",),
+    )
+    for name, breaker in list(_breakers.items()):
+        state.labels(name).set(0 if breaker.state == CircuitBreaker.CLOSED else 1)
+    return [state]
+
+
+REGISTRY.register_collector(_breaker_metrics)
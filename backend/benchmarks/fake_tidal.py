@@ -0,0 +1,662 @@
+"""
+Offline stand-in for the parts of the Tidal API that TidalService uses.
+
+Serves a synthetic (or fixture-backed) library over HTTP in the response
+shapes tidalapi expects, with configurable latency, page size caps, injected
+429s and a request rate limit. Point the backend at it with:
+
+    TIDAL_API_URL=http://127.0.0.1:8765
+
+Any bearer token is accepted; tokens of the form ``fake-<n>`` log in as user
+``n``. There is no device-login flow (tidalapi hard-codes that URL), so seed a
+TidalToken row directly (see ``seed_tidal_token``).
+
+Usage:
+    poetry run python -m benchmarks.fake_tidal --playlists 10000 \\
+        --tracks-per-playlist 100 --catalog-size 1000000 --latency-ms 40
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_USER_ID = 1000
+EPOCH = datetime(2024, 1, 1)
+
+
+def playlist_uuid(index: int) -> str:
+    return f"00000000-0000-4000-8000-{index:012d}"
+
+
+class Library(ABC):
+    """
+    A user's Tidal library. Subclasses provide the base content; playlist edits
+    made through the API are kept as overrides on top of it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._track_overrides: Dict[str, List[int]] = {}
+        self._meta_overrides: Dict[str, dict] = {}
+        self._versions: Counter = Counter()
+
+    # Base content, implemented by subclasses
+    @abstractmethod
+    def playlist_count(self) -> int:
+        """Number of playlists in the library."""
+
+    @abstractmethod
+    def _playlist_meta(self, index: int) -> dict:
+        """Title and description of playlist ``index``, before edits."""
+
+    @abstractmethod
+    def _playlist_track_ids(self, index: int) -> List[int]:
+        """Track ids of playlist ``index`` in order, before edits."""
+
+    @abstractmethod
+    def track(self, track_id: int) -> Optional[dict]:
+        """Track JSON as Tidal returns it, or None if there is no such track."""
+
+    def track_duration(self, track_id: int) -> int:
+        return (self.track(track_id) or {}).get("duration", 0)
+
+    @abstractmethod
+    def favorite_track_ids(self) -> List[int]:
+        """Track ids of the user's favorites."""
+
+    @abstractmethod
+    def search(self, query: str, limit: int) -> List[int]:
+        """Ids of up to ``limit`` tracks matching ``query``."""
+
+    # Shared behaviour
+    def playlist_index(self, uuid_: str) -> Optional[int]:
+        match = re.fullmatch(r"00000000-0000-4000-8000-(\d{12})", uuid_)
+        if not match:
+            return None
+        index = int(match.group(1))
+        return index if index < self.playlist_count() else None
+
+    def playlist_track_ids(self, index: int) -> List[int]:
+        uuid_ = playlist_uuid(index)
+        with self._lock:
+            if uuid_ in self._track_overrides:
+                return list(self._track_overrides[uuid_])
+        return self._playlist_track_ids(index)
+
+    def playlist(self, index: int, user_id: int) -> dict:
+        uuid_ = playlist_uuid(index)
+        meta = dict(self._playlist_meta(index))
+        meta.update(self._meta_overrides.get(uuid_, {}))
+        track_ids = self.playlist_track_ids(index)
+        created = EPOCH + timedelta(days=index % 365)
+        return {
+            "uuid": uuid_,
+            "title": meta["title"],
+            "description": meta.get("description", ""),
+            "numberOfTracks": len(track_ids),
+            "numberOfVideos": 0,
+            "duration": sum(self.track_duration(t) for t in track_ids),
+            "type": "USER",
+            "image": None,
+            "squareImage": None,
+            "promotedArtists": [],
+            "creator": {"id": user_id},
+            "created": created.isoformat() + "Z",
+            "lastUpdated": created.isoformat() + "Z",
+            "publicPlaylist": False,
+            "popularity": 0,
+        }
+
+    def etag(self, index: int) -> str:
+        return f'"{index}-{self._versions[playlist_uuid(index)]}"'
+
+    def edit_playlist(self, index: int, title: str, description: str) -> None:
+        with self._lock:
+            self._meta_overrides[playlist_uuid(index)] = {
+                "title": title,
+                "description": description,
+            }
+            self._versions[playlist_uuid(index)] += 1
+
+    def add_tracks(self, index: int, track_ids: List[int], to_index: int) -> List[int]:
+        current = self.playlist_track_ids(index)
+        added = [t for t in track_ids if t not in current and self.track(t)]
+        to_index = max(0, min(to_index, len(current)))
+        with self._lock:
+            self._track_overrides[playlist_uuid(index)] = (
+                current[:to_index] + added + current[to_index:]
+            )
+            self._versions[playlist_uuid(index)] += 1
+        return added
+
+    def remove_indices(self, index: int, indices: List[int]) -> None:
+        current = self.playlist_track_ids(index)
+        drop = set(indices)
+        with self._lock:
+            self._track_overrides[playlist_uuid(index)] = [
+                t for i, t in enumerate(current) if i not in drop
+            ]
+            self._versions[playlist_uuid(index)] += 1
+
+
+class SyntheticLibrary(Library):
+    """
+    Deterministic library generated on the fly, so very large catalogs cost no
+    memory. Every ``mix_every``-th playlist is named like a Tidal mix.
+    """
+
+    def __init__(
+        self,
+        playlists: int = 10,
+        tracks_per_playlist: int = 100,
+        favorites: int = 100,
+        catalog_size: int = 1_000_000,
+        mix_every: int = 10,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.playlists = playlists
+        self.tracks_per_playlist = tracks_per_playlist
+        self.favorites = favorites
+        self.catalog_size = catalog_size
+        self.mix_every = mix_every
+        self.seed = seed
+
+    def playlist_count(self) -> int:
+        return self.playlists
+
+    def _playlist_meta(self, index: int) -> dict:
+        if self.mix_every and index % self.mix_every == self.mix_every - 1:
+            return {"title": f"My Mix {index}", "description": "Synthetic mix"}
+        return {"title": f"Playlist {index}", "description": f"Synthetic #{index}"}
+
+    def _track_id_at(self, position: int) -> int:
+        # Spread positions over the catalog; libraries bigger than it wrap around
+        return (position * 7919 + self.seed) % self.catalog_size + 1
+
+    def _playlist_track_ids(self, index: int) -> List[int]:
+        start = index * self.tracks_per_playlist
+        return [self._track_id_at(start + j) for j in range(self.tracks_per_playlist)]
+
+    def track(self, track_id: int) -> Optional[dict]:
+        if not 1 <= track_id <= self.catalog_size:
+            return None
+        return synthetic_track(track_id)
+
+    def track_duration(self, track_id: int) -> int:
+        return synthetic_duration(track_id)
+
+    def favorite_track_ids(self) -> List[int]:
+        return [self._track_id_at(-(i + 1)) for i in range(self.favorites)]
+
+    def search(self, query: str, limit: int) -> List[int]:
+        rng = random.Random(f"{self.seed}:{query.lower()}")
+        return [rng.randint(1, self.catalog_size) for _ in range(limit)]
+
+
+class FixtureLibrary(Library):
+    """
+    Library loaded from a JSON fixture (e.g. recorded from real Tidal):
+
+        {"tracks": [<track json>, ...],
+         "playlists": [{"title": ..., "description": ..., "tracks": [id, ...]}],
+         "favorites": [id, ...]}
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        with open(path) as f:
+            data = json.load(f)
+        self.tracks = {t["id"]: t for t in data["tracks"]}
+        self.playlists = data["playlists"]
+        self.favorites = data.get("favorites", [])
+
+    def playlist_count(self) -> int:
+        return len(self.playlists)
+
+    def _playlist_meta(self, index: int) -> dict:
+        return self.playlists[index]
+
+    def _playlist_track_ids(self, index: int) -> List[int]:
+        return list(self.playlists[index]["tracks"])
+
+    def track(self, track_id: int) -> Optional[dict]:
+        return self.tracks.get(track_id)
+
+    def favorite_track_ids(self) -> List[int]:
+        return list(self.favorites)
+
+    def search(self, query: str, limit: int) -> List[int]:
+        query = query.lower()
+        return [
+            t["id"]
+            for t in self.tracks.values()
+            if query in t["title"].lower() or query in t["artist"]["name"].lower()
+        ][:limit]
+
+
+def synthetic_duration(track_id: int) -> int:
+    return 120 + (track_id * 7919) % 300
+
+
+def synthetic_track(track_id: int) -> dict:
+    artist = {"id": 100000 + track_id % 5000, "name": f"Artist {track_id % 5000}"}
+    album_id = 200000 + track_id // 12
+    return {
+        "id": track_id,
+        "title": f"Track {track_id}",
+        "duration": synthetic_duration(track_id),
+        "streamReady": True,
+        "streamStartDate": "2020-01-01T00:00:00.000+0000",
+        "trackNumber": track_id % 12 + 1,
+        "volumeNumber": 1,
+        "explicit": False,
+        "popularity": track_id % 100,
+        "version": None,
+        "replayGain": -7.5,
+        "peak": 0.99,
+        "isrc": f"FAKE{track_id:08d}",
+        "copyright": "Synthetic",
+        "audioQuality": "LOSSLESS",
+        "audioModes": ["STEREO"],
+        "mediaMetadata": {"tags": ["LOSSLESS"]},
+        "artist": artist,
+        "artists": [artist],
+        "album": {
+            "id": album_id,
+            "title": f"Album {album_id}",
+            "cover": str(uuid.UUID(int=album_id)),
+            "videoCover": None,
+        },
+    }
+
+
+@dataclass
+class FakeTidalOptions:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Largest page returned regardless of the requested limit
+    max_page_size: int = 1000
+    # Probability of answering any request with 429
+    rate_429: float = 0.0
+    # Requests per second before answering 429 (0 disables)
+    rps: float = 0.0
+    retry_after: int = 1
+    seed: int = 0
+
+
+class FakeTidalServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        library: Library,
+        options: Optional[FakeTidalOptions] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        super().__init__((host, port), FakeTidalHandler)
+        self.library = library
+        self.options = options or FakeTidalOptions()
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._rng = random.Random(self.options.seed)
+        self._window: List[float] = []
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeTidalServer":
+        """Serve from a background thread (for in-process benchmarks)."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def record(self, route: str) -> None:
+        with self._stats_lock:
+            self.stats[route] += 1
+            self.stats["total"] += 1
+
+    def should_throttle(self) -> bool:
+        with self._stats_lock:
+            if self.options.rate_429 and self._rng.random() < self.options.rate_429:
+                return True
+            if self.options.rps:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.options.rps:
+                    return True
+                self._window.append(now)
+        return False
+
+    def delay(self) -> None:
+        latency = self.options.latency_ms
+        if self.options.jitter_ms:
+            with self._stats_lock:
+                latency += self._rng.uniform(0, self.options.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+
+class FakeTidalHandler(BaseHTTPRequestHandler):
+    server: FakeTidalServer
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("GET", r"/v1/sessions", "sessions"),
+        ("GET", r"/v1/users/(\d+)", "user"),
+        ("GET", r"/v1/users/(\d+)/subscription", "subscription"),
+        ("GET", r"/v1/users/(\d+)/playlists", "user_playlists"),
+        ("GET", r"/v1/users/(\d+)/favorites/tracks", "favorite_tracks"),
+        ("GET", r"/v1/tracks/(\d+)", "track"),
+        ("GET", r"/v1/search", "search"),
+        ("GET", r"/v1/playlists/([\w-]+)", "playlist"),
+        ("POST", r"/v1/playlists/([\w-]+)", "edit_playlist"),
+        ("GET", r"/v1/playlists/([\w-]+)/tracks", "playlist_tracks"),
+        ("POST", r"/v1/playlists/([\w-]+)/items", "add_items"),
+        ("DELETE", r"/v1/playlists/([\w-]+)/items/([\d,]+)", "remove_items"),
+        ("POST", r"/v1/oauth2/token", "token"),
+        ("GET", r"/_stats", "stats"),
+        ("POST", r"/_reset", "reset"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        parts = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        self.form = {k: v[-1] for k, v in parse_qs(body).items()}
+
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, parts.path)
+            if route_method == method and match:
+                break
+        else:
+            return self._send(404, {"status": 404, "userMessage": "Not found"})
+
+        if name not in ("stats", "reset"):
+            self.server.record(name)
+            self.server.delay()
+            if self.server.should_throttle():
+                self.server.record("throttled")
+                return self._send(
+                    429,
+                    {"status": 429, "userMessage": "Too many requests"},
+                    {"Retry-After": str(self.server.options.retry_after)},
+                )
+            if name != "token" and not self.headers.get("authorization"):
+                return self._send(401, {"status": 401, "userMessage": "Unauthorized"})
+        getattr(self, f"handle_{name}")(*match.groups())
+
+    def _send(self, status: int, payload, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    @property
+    def user_id(self) -> int:
+        token = (self.headers.get("authorization") or "").split(" ")[-1]
+        match = re.fullmatch(r"fake-(\d+)", token)
+        return int(match.group(1)) if match else DEFAULT_USER_ID
+
+    def _page(self, items: list) -> dict:
+        limit = min(
+            int(self.query.get("limit", 1000)), self.server.options.max_page_size
+        )
+        offset = int(self.query.get("offset", 0))
+        return {
+            "limit": limit,
+            "offset": offset,
+            "totalNumberOfItems": len(items),
+            "items": items[offset : offset + limit],
+        }
+
+    def _tracks(self, track_ids: List[int]) -> List[dict]:
+        library = self.server.library
+        return [t for t in (library.track(i) for i in track_ids) if t]
+
+    def _playlist_or_404(self, uuid_: str) -> Optional[int]:
+        index = self.server.library.playlist_index(uuid_)
+        if index is None:
+            self._send(404, {"status": 404, "userMessage": "Playlist not found"})
+        return index
+
+    def handle_sessions(self):
+        self._send(
+            200,
+            {
+                "sessionId": str(uuid.UUID(int=self.user_id)),
+                "userId": self.user_id,
+                "countryCode": "US",
+            },
+        )
+
+    def handle_user(self, user_id):
+        self._send(
+            200,
+            {
+                "id": int(user_id),
+                "username": f"user{user_id}",
+                "email": f"user{user_id}@example.com",
+                "firstName": "Fake",
+                "lastName": f"User {user_id}",
+            },
+        )
+
+    def handle_subscription(self, user_id):
+        self._send(200, {"status": "ACTIVE", "subscription": {"type": "HIFI"}})
+
+    def handle_user_playlists(self, user_id):
+        library = self.server.library
+        offset = int(self.query.get("offset", 0))
+        limit = min(
+            int(self.query.get("limit", 1000)), self.server.options.max_page_size
+        )
+        end = min(offset + limit, library.playlist_count())
+        self._send(
+            200,
+            {
+                "limit": limit,
+                "offset": offset,
+                "totalNumberOfItems": library.playlist_count(),
+                "items": [
+                    library.playlist(i, int(user_id)) for i in range(offset, end)
+                ],
+            },
+        )
+
+    def handle_favorite_tracks(self, user_id):
+        items = [
+            {"created": EPOCH.isoformat() + "Z", "item": track}
+            for track in self._tracks(self.server.library.favorite_track_ids())
+        ]
+        self._send(200, self._page(items))
+
+    def handle_track(self, track_id):
+        track = self.server.library.track(int(track_id))
+        if track is None:
+            return self._send(404, {"status": 404, "userMessage": "Track not found"})
+        self._send(200, track)
+
+    def handle_search(self):
+        limit = int(self.query.get("limit", 10))
+        track_ids = self.server.library.search(self.query.get("query", ""), limit)
+        empty = {"limit": limit, "offset": 0, "totalNumberOfItems": 0, "items": []}
+        self._send(
+            200,
+            {
+                "artists": empty,
+                "albums": empty,
+                "playlists": empty,
+                "videos": empty,
+                "tracks": {
+                    "limit": limit,
+                    "offset": 0,
+                    "totalNumberOfItems": len(track_ids),
+                    "items": self._tracks(track_ids),
+                },
+                "topHit": None,
+            },
+        )
+
+    def handle_playlist(self, uuid_):
+        index = self._playlist_or_404(uuid_)
+        if index is None:
+            return
+        library = self.server.library
+        self._send(
+            200, library.playlist(index, self.user_id), {"ETag": library.etag(index)}
+        )
+
+    def handle_edit_playlist(self, uuid_):
+        index = self._playlist_or_404(uuid_)
+        if index is None:
+            return
+        self.server.library.edit_playlist(
+            index, self.form.get("title", ""), self.form.get("description", "")
+        )
+        self._send(200, {})
+
+    def handle_playlist_tracks(self, uuid_):
+        index = self._playlist_or_404(uuid_)
+        if index is None:
+            return
+        library = self.server.library
+        items = self._tracks(library.playlist_track_ids(index))
+        self._send(200, self._page(items), {"ETag": library.etag(index)})
+
+    def handle_add_items(self, uuid_):
+        index = self._playlist_or_404(uuid_)
+        if index is None:
+            return
+        track_ids = [int(t) for t in self.form.get("trackIds", "").split(",") if t]
+        to_index = int(self.form.get("toIndex", 1 << 30))
+        added = self.server.library.add_tracks(index, track_ids, to_index)
+        self._send(200, {"addedItemIds": added})
+
+    def handle_remove_items(self, uuid_, indices):
+        index = self._playlist_or_404(uuid_)
+        if index is None:
+            return
+        self.server.library.remove_indices(index, [int(i) for i in indices.split(",")])
+        self._send(200, {})
+
+    def handle_token(self):
+        self._send(
+            200,
+            {
+                "access_token": f"fake-{DEFAULT_USER_ID}",
+                "refresh_token": f"fake-{DEFAULT_USER_ID}",
+                "token_type": "Bearer",
+                "expires_in": 86400,
+            },
+        )
+
+    def handle_stats(self):
+        with self.server._stats_lock:
+            self._send(200, dict(self.server.stats))
+
+    def handle_reset(self):
+        with self.server._stats_lock:
+            self.server.stats.clear()
+        self._send(200, {})
+
+
+def seed_tidal_token(session, user_id: int, tidal_user_id: int = DEFAULT_USER_ID):
+    """Store a TidalToken that logs ``user_id`` into the fake server."""
+    from app.models.tidal_token import TidalToken
+
+    session.add(
+        TidalToken(
+            user_id=user_id,
+            token_type="Bearer",
+            access_token=f"fake-{tidal_user_id}",
+            refresh_token=f"fake-{tidal_user_id}",
+            expiry_time=datetime.utcnow() + timedelta(days=1),
+        )
+    )
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixture", help="Serve a JSON fixture library instead")
+    parser.add_argument("--playlists", type=int, default=10)
+    parser.add_argument("--tracks-per-playlist", type=int, default=100)
+    parser.add_argument("--favorites", type=int, default=100)
+    parser.add_argument("--catalog-size", type=int, default=1_000_000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rps", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.fixture:
+        library: Library = FixtureLibrary(args.fixture)
+    else:
+        library = SyntheticLibrary(
+            playlists=args.playlists,
+            tracks_per_playlist=args.tracks_per_playlist,
+            favorites=args.favorites,
+            catalog_size=args.catalog_size,
+            seed=args.seed,
+        )
+    options = FakeTidalOptions(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        max_page_size=args.page_size,
+        rate_429=args.rate_429,
+        rps=args.rps,
+        seed=args.seed,
+    )
+    server = FakeTidalServer(library, options, args.host, args.port)
+    print(f"Fake Tidal API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Serialization benchmark for playlist read responses.
+
+Compares the default response path (ORM instances -> response model ->
+jsonable_encoder -> stdlib json) with the fast path (row tuples -> dicts ->
+orjson) for playlists of increasing size, on an in-memory SQLite database.
+
+Usage:
+    poetry run python -m benchmarks.serialization [--sizes 100 1000 10000]
+"""
+
+import argparse
+import json
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from app.api.responses import FastJSONResponse
+from app.models import Playlist, PlaylistSongLink, Song, User
+from app.schemas import PlaylistReadWithSongs
+from app.services.playlist_service import PlaylistService
+
+
+def seed(session: Session, song_count: int) -> int:
+    user = User(email=f"bench-{song_count}@example.com", password_hash="x")
+    session.add(user)
+    session.commit()
+    playlist = Playlist(user_id=user.id, name=f"Bench {song_count}")
+    session.add(playlist)
+    session.commit()
+
+    base = song_count * 10
+    songs = [
+        Song(
+            tidal_id=base + i,
+            title=f"Song {i}",
+            artist=f"Artist {i % 97}",
+            album=f"Album {i % 13}",
+            cover_url=f"https://resources.tidal.com/images/{i}/320x320.jpg",
+            duration=180 + i % 120,
+        )
+        for i in range(song_count)
+    ]
+    session.add_all(songs)
+    session.commit()
+    session.add_all(
+        PlaylistSongLink(playlist_id=playlist.id, song_id=song.id, order=i)
+        for i, song in enumerate(songs)
+    )
+    session.commit()
+    return user.id
+
+
+def default_path(session: Session, user_id: int) -> bytes:
+    playlists = session.exec(
+        select(Playlist)
+        .where(Playlist.user_id == user_id)
+        .options(selectinload(Playlist.songs))
+    ).all()
+    models = [PlaylistReadWithSongs.model_validate(p) for p in playlists]
+    return json.dumps(jsonable_encoder(models)).encode("utf-8")
+
+
+def fast_path(session: Session, user_id: int) -> bytes:
+    rows = PlaylistService(session).get_playlists_with_songs_rows(user_id)
+    return FastJSONResponse(rows).body
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(sizes: List[int], repeat: int) -> List[dict]:
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    results = []
+    with Session(engine) as session:
+        for size in sizes:
+            user_id = seed(session, size)
+            session.expunge_all()
+            default = best_of(
+                lambda: (default_path(session, user_id), session.expunge_all()),
+                repeat,
+            )
+            fast = best_of(
+                lambda: (fast_path(session, user_id), session.expunge_all()),
+                repeat,
+            )
+            results.append(
+                {
+                    "songs": size,
+                    "bytes": len(fast_path(session, user_id)),
+                    "default_ms": round(default * 1000, 2),
+                    "fast_ms": round(fast * 1000, 2),
+                    "speedup": round(default / fast, 2),
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"{'songs':>8} {'bytes':>10} {'default ms':>11} {'fast ms':>9} {'speedup':>8}"
+    )
+    for r in results:
+        print(
+            f"{r['songs']:>8} {r['bytes']:>10} {r['default_ms']:>11} "
+            f"{r['fast_ms']:>9} {r['speedup']:>7}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+End-to-end benchmark for SyncService against the offline Tidal stand-in.
+
+Each scenario runs in its own interpreter (so peak RSS is per scenario) on a
+fresh SQLite file: sync_playlists_data, sync_tracks and sync_mixes are run
+cold (empty DB) and then warm (nothing changed on the Tidal side). For every
+step we record wall time, SQL statements issued, rows written, peak RSS and
+Tidal calls made.
+
+Results are compared against a JSON baseline and the run fails (exit code 1)
+when any metric regresses beyond its tolerance.
+
+Usage:
+    poetry run python -m benchmarks.sync_bench --preset quick
+    poetry run python -m benchmarks.sync_bench --preset full --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# (playlists, tracks per playlist)
+PRESETS = {
+    "quick": [(10, 100)],
+    "standard": [(10, 100), (10, 1000), (50, 100)],
+    "full": [
+        (10, 100),
+        (10, 1000),
+        (10, 10000),
+        (100, 100),
+        (100, 1000),
+        (500, 100),
+    ],
+}
+
+# Allowed relative increase over the baseline before a metric counts as a regression
+DEFAULT_TOLERANCES = {
+    "wall_time_s": 0.30,
+    "peak_rss_mb": 0.20,
+    "db_statements": 0.05,
+    "rows_written": 0.05,
+    "tidal_calls": 0.05,
+}
+# Absolute slack, so tiny values don't fail on noise
+ABSOLUTE_SLACK = {"wall_time_s": 0.05, "peak_rss_mb": 5.0}
+
+STEPS = ["sync_playlists_data", "sync_tracks", "sync_mixes"]
+
+
+def scenario_id(playlists: int, tracks: int) -> str:
+    return f"{playlists}x{tracks}"
+
+
+def run_scenario(playlists: int, tracks: int, latency_ms: float, tidal_rps: float):
+    """Run one scenario in this process and return {step/phase: metrics}."""
+    import resource
+
+    from benchmarks.fake_tidal import (
+        FakeTidalOptions,
+        FakeTidalServer,
+        SyntheticLibrary,
+        seed_tidal_token,
+    )
+
+    library = SyntheticLibrary(
+        playlists=playlists, tracks_per_playlist=tracks, favorites=tracks
+    )
+    server = FakeTidalServer(library, FakeTidalOptions(latency_ms=latency_ms)).start()
+
+    db_dir = tempfile.mkdtemp(prefix="sync-bench-")
+    os.environ["TIDAL_API_URL"] = server.url
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_dir}/bench.db"
+
+    from sqlalchemy import event
+    from sqlmodel import Session, SQLModel
+
+    from app.core.db import engine
+    from app.models import User
+    from app.services.sync_service import SyncService
+    from app.services.tidal import rate_limiter, tidal_service
+
+    # Benchmark our code, not the client-side throttle, unless asked to
+    rate_limiter.max_calls = int(tidal_rps) if tidal_rps else 10**9
+
+    counters = {"statements": 0, "rows": 0}
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counters["statements"] += 1
+        verb = statement.lstrip().split(" ", 1)[0].upper()
+        if verb in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount > 0:
+            counters["rows"] += cursor.rowcount
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(email="bench@example.com", password_hash="x")
+        session.add(user)
+        session.commit()
+        user_id = user.id
+        seed_tidal_token(session, user_id)
+        tidal_service.load_session(user_id, session)
+
+    results = {}
+    for phase in ("cold", "warm"):
+        for step in STEPS:
+            counters.update(statements=0, rows=0)
+            calls_before = server.stats["total"]
+            with Session(engine) as session:
+                start = time.perf_counter()
+                getattr(SyncService(session), step)(user_id)
+                elapsed = time.perf_counter() - start
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            results[f"{step}/{phase}"] = {
+                "wall_time_s": round(elapsed, 3),
+                "db_statements": counters["statements"],
+                "rows_written": counters["rows"],
+                "peak_rss_mb": round(peak_kb / 1024, 1),
+                "tidal_calls": server.stats["total"] - calls_before,
+            }
+    server.stop()
+    return results
+
+
+def run_in_subprocess(playlists, tracks, latency_ms, tidal_rps) -> Dict[str, dict]:
+    spec = json.dumps([playlists, tracks, latency_ms, tidal_rps])
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.sync_bench", "--run-scenario", spec],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Scenario {scenario_id(playlists, tracks)} failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerances: dict) -> List[str]:
+    regressions = []
+    for key, metrics in results.items():
+        expected = baseline.get(key)
+        if not expected:
+            continue
+        for metric, value in metrics.items():
+            if metric not in expected:
+                continue
+            limit = expected[metric] * (1 + tolerances[metric])
+            limit += ABSOLUTE_SLACK.get(metric, 0)
+            if value > limit:
+                regressions.append(
+                    f"{key} {metric}: {value} > {expected[metric]} "
+                    f"(+{tolerances[metric]:.0%})"
+                )
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    header = (
+        f"{'scenario/step':<42} {'time s':>8} {'stmts':>8} {'rows':>8} "
+        f"{'rss MB':>8} {'tidal':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for key, m in results.items():
+        print(
+            f"{key:<42} {m['wall_time_s']:>8} {m['db_statements']:>8} "
+            f"{m['rows_written']:>8} {m['peak_rss_mb']:>8} {m['tidal_calls']:>6}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        metavar="PLAYLISTSxTRACKS",
+        help="Run custom scenarios instead of a preset, e.g. 20x500",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--tidal-rps",
+        type=float,
+        default=0.0,
+        help="Client-side Tidal rate limit (0 disables it for the benchmark)",
+    )
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, help="Override every metric's tolerance"
+    )
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(*json.loads(args.run_scenario))))
+        return 0
+
+    if args.scenario:
+        scenarios = [tuple(int(n) for n in s.split("x")) for s in args.scenario]
+        name = "custom"
+    else:
+        scenarios = PRESETS[args.preset]
+        name = args.preset
+    baseline_path = args.baseline or BASELINE_DIR / f"sync_{name}.json"
+
+    results = {}
+    for playlists, tracks in scenarios:
+        for key, metrics in run_in_subprocess(
+            playlists, tracks, args.latency_ms, args.tidal_rps
+        ).items():
+            results[f"{scenario_id(playlists, tracks)}/{key}"] = metrics
+    print_table(results)
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(
+            json.dumps(
+                {
+                    "environment": {
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "latency_ms": args.latency_ms,
+                        "tidal_rps": args.tidal_rps,
+                    },
+                    "results": results,
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+        print(f"\nBaseline written to {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline first")
+        return 0
+
+    tolerances = dict(DEFAULT_TOLERANCES)
+    if args.tolerance is not None:
+        tolerances = {metric: args.tolerance for metric in tolerances}
+    baseline = json.loads(baseline_path.read_text())["results"]
+    regressions = compare(results, baseline, tolerances)
+    if regressions:
+        print("\n✗ Regressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\n✓ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Import-time budget check for the API application.
+
+Imports ``app.main`` in a fresh interpreter and fails (exit code 1) if it takes
+longer than the budget or if modules that are meant to load lazily (tidalapi,
+requests) were pulled in at import time.
+
+Usage:
+    poetry run python check_import_time.py [--budget SECONDS]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", 1.5))
+LAZY_MODULES = ["tidalapi", "requests"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main  # noqa: F401
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [m for m in sys.argv[1:] if m in sys.modules],
+}))
+"""
+
+
+def measure() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, *LAZY_MODULES],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET)
+    args = parser.parse_args()
+
+    # Best of three runs so a cold disk cache doesn't fail the check
+    runs = [measure() for _ in range(3)]
+    elapsed = min(run["elapsed"] for run in runs)
+    loaded = runs[0]["loaded"]
+
+    print(f"import app.main: {elapsed:.3f}s (budget {args.budget:.3f}s)")
+    failed = False
+    if elapsed > args.budget:
+        print("✗ Import time exceeds budget")
+        failed = True
+    if loaded:
+        print(f"✗ Modules imported eagerly: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("✓ Import time within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+SQL statement budget check for the playlist API.
+
+Seeds a temporary SQLite database with a small and a large playlist, calls each
+endpoint against both through FastAPI's TestClient and fails (exit code 1) if
+any call issues more statements than its budget. Budgets don't depend on the
+playlist size, so an N+1 query shows up as a failure on the large playlist.
+
+Usage:
+    poetry run python check_query_budgets.py [--songs N] [--verbose]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+SMALL_PLAYLIST_SONGS = 5
+
+# (method, path template, max statements). {id} is the playlist id, {song} one
+# of its song ids; "{songs}" in the body is replaced by its reversed song ids and
+# "{other}" by the id of the other seeded playlist. Moves go last since they
+# empty the playlists.
+BUDGETS = [
+    ("GET", "/api/v1/playlists/", 2),
+    ("GET", "/api/v1/playlists/detailed", 3),
+    ("GET", "/api/v1/playlists/duplicates", 1),
+    ("GET", "/api/v1/playlists/{id}", 3),
+    ("PUT", "/api/v1/playlists/{id}", 6),
+    ("PUT", "/api/v1/playlists/{id}/songs/reorder", 8),
+    ("POST", "/api/v1/playlists/{id}/songs", 12),
+    ("DELETE", "/api/v1/playlists/{id}/songs/{song}", 10),
+    ("POST", "/api/v1/playlists/{id}/songs/move", 14),
+]
+
+BODIES = {
+    ("PUT", "/api/v1/playlists/{id}"): {"name": "Renamed"},
+    ("PUT", "/api/v1/playlists/{id}/songs/reorder"): "{songs}",
+    ("POST", "/api/v1/playlists/{id}/songs"): {
+        "tidal_id": 999999,
+        "title": "Budget",
+        "artist": "Check",
+        "album": "Queries",
+        "duration": 180,
+    },
+    ("POST", "/api/v1/playlists/{id}/songs/move"): {
+        "song_ids": "{songs}",
+        "target_playlist_id": "{other}",
+    },
+}
+
+
+def fill(body, values):
+    """Substitute placeholders in a request body (or one of its fields)."""
+    if isinstance(body, dict):
+        return {key: values.get(value, value) for key, value in body.items()}
+    return values.get(body, body)
+
+
+def seed(session, sizes):
+    from app.core.security import create_access_token, get_password_hash
+    from app.models import User
+    from app.services.playlist_service import PlaylistService
+
+    user = User(email="budget@example.com", password_hash=get_password_hash("x"))
+    session.add(user)
+    session.commit()
+    service = PlaylistService(session)
+    playlists = []
+    tidal_id = 1
+    for size in sizes:
+        playlist = service.create_playlist(user.id, f"{size} songs")
+        song_ids = []
+        for _ in range(size):
+            song = service.add_song(
+                playlist.id,
+                {
+                    "tidal_id": tidal_id,
+                    "title": f"Track {tidal_id}",
+                    "artist": "Artist",
+                    "album": "Album",
+                    "duration": 200,
+                },
+            )
+            song_ids.append(song.id)
+            tidal_id += 1
+        playlists.append((playlist.id, song_ids))
+    return create_access_token(user.id), playlists
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--songs", type=int, default=50, help="Songs in the large playlist"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = (
+        f"sqlite:///{tempfile.mkdtemp(prefix='query-budget-')}/budget.db"
+    )
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+
+    from app.core.db import engine
+    from app.core.query_budget import assert_max_queries
+    from app.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    failures = []
+    with TestClient(app) as client:
+        with Session(engine) as session:
+            token, playlists = seed(session, [SMALL_PLAYLIST_SONGS, args.songs])
+        headers = {"Authorization": f"Bearer {token}"}
+        # Warm the token/user caches so every call is measured the same way
+        client.get("/api/v1/playlists/", headers=headers)
+
+        for method, template, budget in BUDGETS:
+            for playlist_id, song_ids in playlists:
+                path = template.format(id=playlist_id, song=song_ids[-1])
+                other_id = next(pid for pid, _ in playlists if pid != playlist_id)
+                body = fill(
+                    BODIES.get((method, template)),
+                    {"{songs}": list(reversed(song_ids)), "{other}": other_id},
+                )
+                label = f"{method} {path} ({len(song_ids)} songs)"
+                try:
+                    with assert_max_queries(budget) as statements:
+                        response = client.request(
+                            method, path, json=body, headers=headers
+                        )
+                except AssertionError as e:
+                    failures.append(f"{label}: {e}")
+                    print(f"✗ {label}: over budget of {budget}")
+                    continue
+                if response.status_code >= 400:
+                    failures.append(f"{label}: HTTP {response.status_code}")
+                    print(f"✗ {label}: HTTP {response.status_code}")
+                    continue
+                print(f"✓ {label}: {len(statements)}/{budget} statements")
+
+    if failures:
+        print("\n✗ Query budget check failed")
+        if args.verbose:
+            for failure in failures:
+                print(f"\n{failure}")
+        return 1
+    print("\n✓ All endpoints within their query budgets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
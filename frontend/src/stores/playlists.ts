@@ -10,6 +10,7 @@ interface Song {
   artist: string;
   album: string;
   cover_url?: string;
+  duration?: number;
   is_available?: boolean;
 }
 
@@ -22,9 +23,31 @@ interface Playlist {
   created_at: string;
   updated_at: string;
   last_synced_at?: string;
+  song_count?: number;
+  total_duration?: number;
+  version?: number;
   songs?: Song[];
 }
 
+interface MoveResult {
+  moved: number[];
+  already_in_target: number[];
+  tidal_synced: boolean;
+}
+
+interface SyncResult {
+  message: string;
+  playlists_count: number;
+  changed_playlist_ids: number[];
+}
+
+interface RefreshResult {
+  refreshed: number[];
+  skipped: number;
+  not_found: number[];
+  failed: number[];
+}
+
 export const usePlaylistStore = defineStore("playlists", () => {
   const playlists = ref<Playlist[]>([]);
   const currentPlaylist = ref<Playlist | null>(null);
@@ -258,6 +281,53 @@ export const usePlaylistStore = defineStore("playlists", () => {
     }
   };
 
+  const moveSongs = async (
+    sourcePlaylistId: number,
+    targetPlaylistId: number,
+    songIds: number[]
+  ): Promise<MoveResult> => {
+    try {
+      const response = await axios.post(
+        `${import.meta.env.VITE_API_URL}/api/v1/playlists/${sourcePlaylistId}/songs/move`,
+        { song_ids: songIds, target_playlist_id: targetPlaylistId },
+        { headers: getHeaders() }
+      );
+      const result: MoveResult = response.data;
+
+      // Update local state: moved songs go to the end of the target
+      const removedIds = new Set([
+        ...result.moved,
+        ...result.already_in_target,
+      ]);
+      const addedIds = new Set(result.moved);
+      const sourceSongs =
+        playlists.value.find((p) => p.id === sourcePlaylistId)?.songs ??
+        (currentPlaylist.value?.id === sourcePlaylistId
+          ? currentPlaylist.value.songs
+          : undefined) ??
+        [];
+      const addedSongs = sourceSongs.filter((s) => s.id && addedIds.has(s.id));
+
+      for (const playlist of [
+        ...playlists.value,
+        ...(currentPlaylist.value ? [currentPlaylist.value] : []),
+      ]) {
+        if (!playlist.songs) continue;
+        if (playlist.id === targetPlaylistId) {
+          playlist.songs = [...playlist.songs, ...addedSongs];
+        } else if (playlist.id === sourcePlaylistId) {
+          playlist.songs = playlist.songs.filter(
+            (s) => !(s.id && removedIds.has(s.id))
+          );
+        }
+      }
+      return result;
+    } catch (err: any) {
+      error.value = err.response?.data?.detail || "Failed to move songs";
+      throw err;
+    }
+  };
+
   const reorderSongs = async (playlistId: number, songIds: number[]) => {
     try {
       await axios.put(
@@ -273,43 +343,115 @@ export const usePlaylistStore = defineStore("playlists", () => {
     }
   };
 
-  const refreshSong = async (songId: number) => {
+  const refreshSongs = async (
+    request: { playlistId?: number; songIds?: number[]; force?: boolean }
+  ): Promise<RefreshResult> => {
     try {
-      await axios.post(
-        `${import.meta.env.VITE_API_URL}/api/v1/songs/${songId}/refresh`,
-        {},
+      const response = await axios.post(
+        `${import.meta.env.VITE_API_URL}/api/v1/songs/refresh`,
+        {
+          playlist_id: request.playlistId ?? null,
+          song_ids: request.songIds ?? [],
+          force: request.force ?? false,
+        },
         { headers: getHeaders() }
       );
-      // We should probably update the song in the current playlist if it's there
-      if (currentPlaylist.value && currentPlaylist.value.songs) {
-        // We could fetch the song again or just fetch the playlist
-        // Fetching playlist is easier to ensure consistency
-        if (currentPlaylist.value.id) {
-          await fetchPlaylist(currentPlaylist.value.id);
-        }
+      const result: RefreshResult = response.data;
+      // Metadata and durations changed server-side, reload the open playlist
+      if (result.refreshed.length && currentPlaylist.value?.id) {
+        await fetchPlaylist(currentPlaylist.value.id);
       }
+      return result;
     } catch (err: any) {
-      error.value = err.response?.data?.detail || "Failed to refresh song";
+      error.value = err.response?.data?.detail || "Failed to refresh songs";
       throw err;
     }
   };
 
+  const refreshSong = async (songId: number) => {
+    // An explicit single-song refresh ignores the staleness window
+    const result = await refreshSongs({ songIds: [songId], force: true });
+    if (!result.refreshed.length) {
+      error.value = "Failed to refresh song";
+      throw new Error(error.value);
+    }
+  };
+
+  // Reads a sync's Server-Sent Events (EventSource can't send the auth header)
+  const streamSync = async (
+    syncType: "playlists" | "tracks" | "mixes",
+    onProgress?: (event: string, data: any) => void
+  ): Promise<SyncResult> => {
+    const response = await fetch(
+      `${import.meta.env.VITE_API_URL}/api/v1/sync/stream?sync_type=${syncType}`,
+      { method: "POST", headers: getHeaders() }
+    );
+    if (!response.ok || !response.body) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.detail || "Failed to sync data");
+    }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf("\n\n")) >= 0) {
+        const message = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+        let event = "message";
+        let data = "";
+        for (const line of message.split("\n")) {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        const payload = data ? JSON.parse(data) : {};
+        if (event === "done") return payload;
+        if (event === "error") throw new Error(payload.detail);
+        onProgress?.(event, payload);
+      }
+    }
+    throw new Error("Sync ended unexpectedly");
+  };
+
+  // Refetch just the given playlists, or the whole list when most changed
+  const refetchPlaylists = async (ids: number[]) => {
+    if (ids.length > 10) {
+      await fetchPlaylists();
+      return;
+    }
+    const fresh = await Promise.all(
+      ids.map((id) =>
+        axios
+          .get(`${import.meta.env.VITE_API_URL}/api/v1/playlists/${id}`, {
+            headers: getHeaders(),
+          })
+          .then((response) => response.data as Playlist)
+      )
+    );
+    for (const playlist of fresh) {
+      const index = playlists.value.findIndex((p) => p.id === playlist.id);
+      if (index >= 0) {
+        playlists.value[index] = playlist;
+      } else {
+        playlists.value.push(playlist);
+      }
+    }
+  };
+
   const syncData = async (
-    syncType: "playlists" | "tracks" | "mixes" = "playlists"
+    syncType: "playlists" | "tracks" | "mixes" = "playlists",
+    onProgress?: (event: string, data: any) => void
   ) => {
     loading.value = true;
     error.value = null;
     try {
-      const response = await axios.post(
-        `${import.meta.env.VITE_API_URL}/api/v1/sync/?sync_type=${syncType}`,
-        {},
-        { headers: getHeaders() }
-      );
-      // Refresh playlists after sync
-      await fetchPlaylists();
-      return response.data;
+      const result = await streamSync(syncType, onProgress);
+      await refetchPlaylists(result.changed_playlist_ids);
+      return result;
     } catch (err: any) {
-      error.value = err.response?.data?.detail || "Failed to sync data";
+      error.value = err.message || "Failed to sync data";
       throw err;
     } finally {
       loading.value = false;
@@ -350,8 +492,10 @@ export const usePlaylistStore = defineStore("playlists", () => {
     deletePlaylist,
     addSong,
     removeSong,
+    moveSongs,
     reorderSongs,
     refreshSong,
+    refreshSongs,
     syncData,
     syncPlaylist,
   };